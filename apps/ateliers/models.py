@@ -1,7 +1,8 @@
 from django.db import models
 from apps.collaborateurs.models import Collaborateur
+from apps.core.utils.tracking import FieldTrackerMixin
 
-class Atelier(models.Model):
+class Atelier(FieldTrackerMixin, models.Model):
     """
     Modèle représentant les ateliers de production.
     Chaque atelier a des spécialités et un responsable.
@@ -30,6 +31,9 @@ class Atelier(models.Model):
     # Date de création
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
 
+    # Champs comparés par les signaux (FieldTrackerMixin)
+    tracked_fields = ('nom_atelier', 'type_atelier', 'responsable_atelier')
+
     def __str__(self):
         """Retourne le nom de l'atelier"""
         return self.nom_atelier
@@ -1,7 +1,105 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth.backends import BaseBackend
 from django.contrib.auth.hashers import check_password
+from django.core import signing
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from apps.core.utils.cache_versions import bump_version, is_process_local, versioned_key
 from .models import Collaborateur
 
+USER_CACHE_KEY = 'collaborateurs:user'
+ROLE_CACHE_KEY = 'collaborateurs:role'
+SIGNING_SALT = 'apps.collaborateurs.backends'
+
+
+def _get_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300)
+
+
+def _invalidate(prefixe, pk):
+    if is_process_local(cache):
+        # Les autres workers ne verraient pas un delete : la version en base change
+        # pour tous les instantanés (vue après CACHE_VERSION_CHECK_INTERVAL au plus)
+        bump_version(prefixe)
+    else:
+        cache.delete(versioned_key(cache, prefixe, pk))
+
+
+class _SnapshotSerializer:
+    """Sérialiseur JSON acceptant les dates (pour signing.dumps)"""
+    
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), cls=DjangoJSONEncoder).encode('latin-1')
+    
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+def _dump_instance(instance):
+    """Sérialise les champs concrets d'une instance en chaîne signée"""
+    data = {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+    return signing.dumps(data, salt=SIGNING_SALT, serializer=_SnapshotSerializer)
+
+
+def _load_instance(model, signed_data):
+    """Reconstruit une instance depuis une chaîne signée (None si invalide)"""
+    try:
+        data = signing.loads(signed_data, salt=SIGNING_SALT, serializer=_SnapshotSerializer)
+    except signing.BadSignature:
+        return None
+    fields = model._meta.concrete_fields
+    values = [
+        None if data.get(field.attname) is None else field.to_python(data[field.attname])
+        for field in fields
+    ]
+    return model.from_db(DEFAULT_DB_ALIAS, [field.attname for field in fields], values)
+
+
+def cache_user(collaborateur):
+    """Met en cache le collaborateur et son rôle"""
+    timeout = _get_timeout()
+    cache.set(versioned_key(cache, USER_CACHE_KEY, collaborateur.pk), _dump_instance(collaborateur), timeout)
+    if collaborateur.user_role_id:
+        cache.set(
+            versioned_key(cache, ROLE_CACHE_KEY, collaborateur.user_role_id),
+            _dump_instance(collaborateur.user_role),
+            timeout,
+        )
+
+
+def get_cached_user(user_id):
+    """Retourne le collaborateur (avec son rôle) depuis le cache, ou None"""
+    from apps.core.models import Role
+    
+    signed_user = cache.get(versioned_key(cache, USER_CACHE_KEY, user_id))
+    if signed_user is None:
+        return None
+    collaborateur = _load_instance(Collaborateur, signed_user)
+    if collaborateur is None:
+        return None
+    
+    if collaborateur.user_role_id:
+        signed_role = cache.get(versioned_key(cache, ROLE_CACHE_KEY, collaborateur.user_role_id))
+        role = _load_instance(Role, signed_role) if signed_role is not None else None
+        if role is None:
+            return None
+        collaborateur.user_role = role
+    return collaborateur
+
+
+def invalidate_cached_user(user_id):
+    """Invalide le collaborateur en cache"""
+    _invalidate(USER_CACHE_KEY, user_id)
+
+
+def invalidate_cached_role(role_id):
+    """Invalide le rôle en cache"""
+    _invalidate(ROLE_CACHE_KEY, role_id)
+
+
 class CollaborateurBackend(BaseBackend):
     """
     Backend d'authentification personnalisé pour le modèle Collaborateur
@@ -30,9 +128,21 @@ class CollaborateurBackend(BaseBackend):
     
     def get_user(self, user_id):
         """
-        Récupère un utilisateur par son ID
+        Récupère un utilisateur par son ID, avec son rôle.
+        Un instantané signé est servi depuis le cache si AUTH_USER_CACHE_TIMEOUT > 0 ;
+        avec un cache local, ses clés sont versionnées en base (utils.cache_versions).
         """
+        use_cache = _get_timeout() > 0
+        if use_cache:
+            collaborateur = get_cached_user(user_id)
+            if collaborateur is not None:
+                return collaborateur
+        
         try:
-            return Collaborateur.objects.get(pk=user_id)
+            collaborateur = Collaborateur.objects.select_related('user_role').get(pk=user_id)
         except Collaborateur.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+        
+        if use_cache:
+            cache_user(collaborateur)
+        return collaborateur
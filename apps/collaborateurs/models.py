@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
+from apps.core.utils.tracking import FieldTrackerMixin
 
 
 class CollaborateurManager(BaseUserManager):
@@ -35,7 +36,7 @@ class CollaborateurManager(BaseUserManager):
         """Méthode requise pour l'authentification Django"""
         return self.get(email=email)
 
-class Collaborateur(AbstractBaseUser):
+class Collaborateur(FieldTrackerMixin, AbstractBaseUser):
     """
     Modèle représentant les collaborateurs de l'entreprise.
     Cette classe gère les informations personnelles et professionnelles
@@ -67,15 +68,38 @@ class Collaborateur(AbstractBaseUser):
     # Manager personnalisé
     objects = CollaborateurManager()
     
+    # Champs comparés par les signaux (FieldTrackerMixin)
+    tracked_fields = ('nom_collaborateur', 'prenom_collaborateur', 'email', 'is_active', 'user_role')
+    
     # Configuration pour l'authentification
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['nom_collaborateur', 'prenom_collaborateur']
     
+    def get_permission_mask(self):
+        """
+        Retourne le masque de bits des permissions du rôle du collaborateur.
+        Le masque est lu dans le cache partagé puis mémorisé sur l'instance :
+        l'utilisateur étant rechargé à chaque requête, aucune requête SQL n'est
+        faite pour les vérifications suivantes.
+        """
+        cache = getattr(self, '_permission_cache', None)
+        if cache is None or cache[0] != self.user_role_id:
+            from apps.core.utils.permission_cache import get_role_permission_mask
+            mask = get_role_permission_mask(self.user_role_id) if self.user_role_id else 0
+            cache = (self.user_role_id, mask)
+            self._permission_cache = cache
+        return cache[1]
+    
+    def get_permission_set(self):
+        """Retourne les couples (module, action) accordés au collaborateur"""
+        from apps.core.models import PERMISSION_BITS
+        mask = self.get_permission_mask()
+        return frozenset(pair for pair, bit in PERMISSION_BITS.items() if mask & bit)
+    
     def has_permission(self, module, action):
         """Vérifie si le collaborateur a une permission spécifique"""
-        if self.user_role:
-            return self.user_role.has_permission(module, action)
-        return False
+        from apps.core.models import PERMISSION_BITS
+        return bool(self.get_permission_mask() & PERMISSION_BITS.get((module, action), 0))
     
     def get_all_permissions(self):
         """Retourne toutes les permissions du collaborateur"""
@@ -1,5 +1,8 @@
+import math
+from datetime import timedelta
 from django.contrib import admin
-from .models import Affaire
+from django.utils import timezone
+from .models import Affaire, ProfilRequete, TacheNotification
 
 @admin.register(Affaire)
 class AffaireAdmin(admin.ModelAdmin):
@@ -14,4 +17,81 @@ class AffaireAdmin(admin.ModelAdmin):
     list_per_page = 25
     readonly_fields = ('created_at',)
     autocomplete_fields = ['responsable_affaire']
-    date_hierarchy = 'date_debut'
\ No newline at end of file
+    date_hierarchy = 'date_debut'
+
+
+def _percentile(sorted_values, percent):
+    """Percentile (rang le plus proche) d'une liste triée"""
+    if not sorted_values:
+        return 0
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+@admin.register(ProfilRequete)
+class ProfilRequeteAdmin(admin.ModelAdmin):
+    """
+    Mesures SQL enregistrées par QueryBudgetMiddleware.
+    La liste est précédée d'un classement des vues par durée SQL (p50/p95)
+    sur les 7 derniers jours.
+    """
+    list_display = ('vue', 'methode', 'nb_requetes', 'nb_doublons', 'duree_sql_ms', 'duree_totale_ms', 'date_creation')
+    list_filter = ('methode', 'date_creation')
+    search_fields = ('vue', 'chemin')
+    ordering = ('-date_creation',)
+    list_per_page = 50
+    date_hierarchy = 'date_creation'
+    readonly_fields = [field.name for field in ProfilRequete._meta.fields]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def get_classement_vues(self, jours=7):
+        """Classe les vues par p95 de durée SQL sur la période"""
+        mesures = {}
+        profils = ProfilRequete.objects.filter(
+            date_creation__gte=timezone.now() - timedelta(days=jours)
+        ).values_list('vue', 'duree_sql_ms', 'nb_requetes', 'nb_doublons')
+        for vue, duree_sql, nb_requetes, nb_doublons in profils.iterator():
+            mesure = mesures.setdefault(vue, {'durees': [], 'requetes': [], 'doublons': 0})
+            mesure['durees'].append(duree_sql)
+            mesure['requetes'].append(nb_requetes)
+            mesure['doublons'] += nb_doublons
+        
+        classement = []
+        for vue, mesure in mesures.items():
+            durees = sorted(mesure['durees'])
+            requetes = sorted(mesure['requetes'])
+            classement.append({
+                'vue': vue,
+                'nb_appels': len(durees),
+                'p50_ms': _percentile(durees, 50),
+                'p95_ms': _percentile(durees, 95),
+                'p50_requetes': _percentile(requetes, 50),
+                'p95_requetes': _percentile(requetes, 95),
+                'doublons_moyens': mesure['doublons'] / len(durees),
+            })
+        return sorted(classement, key=lambda item: item['p95_ms'], reverse=True)
+    
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['classement_vues'] = self.get_classement_vues()
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(TacheNotification)
+class TacheNotificationAdmin(admin.ModelAdmin):
+    """Suivi de la file des diffusions de notifications (run_notification_worker)"""
+    list_display = ('titre', 'role_name', 'statut', 'tentatives', 'nb_destinataires', 'date_creation', 'date_traitement')
+    list_filter = ('statut', 'role_name', 'date_creation')
+    search_fields = ('titre', 'message', 'erreur')
+    ordering = ('-date_creation',)
+    readonly_fields = ('nb_destinataires', 'date_creation', 'date_traitement', 'erreur')
+    actions = ['relancer']
+    
+    @admin.action(description="Relancer les tâches sélectionnées")
+    def relancer(self, request, queryset):
+        nb = queryset.exclude(statut='terminee').update(
+            statut='en_attente', tentatives=0, date_disponible=timezone.now()
+        )
+        self.message_user(request, f"{nb} tâche(s) remise(s) en attente.")
@@ -1,7 +1,6 @@
-from .models import Notification, Activite
-from django.db.models import Count, Q
-from django.utils import timezone
-from datetime import timedelta
+from .models import Notification, CompteurNotification, decode_permissions
+from .stats import get_dashboard_stats, get_activites_recentes
+from django.utils.functional import SimpleLazyObject
 
 def user_permissions(request):
     """Ajoute les permissions de l'utilisateur au contexte de tous les templates"""
@@ -44,79 +43,17 @@ def notifications_and_activities(request):
             notifications = Notification.objects.filter(
                 destinataire=collaborateur,
                 lu=False
-            ).order_by('-date_creation')[:10]
+            ).defer('search_vector').order_by('-date_creation')[:10]
             
             context.update({
                 'notifications_non_lues': notifications,
-                'nb_notifications_non_lues': notifications.count(),
+                'nb_notifications_non_lues': CompteurNotification.get_non_lues(collaborateur.pk),
             })
         
-        # Activités récentes pour le dashboard (dernières 15)
-        activites_recentes = Activite.objects.select_related(
-            'utilisateur', 'content_type'
-        ).order_by('-date_creation')[:15]
-        
-        context['activites_recentes'] = activites_recentes
-        
-        # Statistiques pour le dashboard
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
-        
-        try:
-            # CORRECTION: Import avec gestion d'erreur
-            from apps.lancements.models import Lancement
-            from apps.collaborateurs.models import Collaborateur
-            from apps.ateliers.models import Atelier
-            from .models import Affaire
-            
-            # Stats des lancements
-            lancements_stats = {
-                'total_lancements': Lancement.objects.count(),
-                'lancements_en_cours': Lancement.objects.filter(statut='en_cours').count(),
-                'lancements_termines': Lancement.objects.filter(statut='termine').count(),
-                'lancements_cette_semaine': Lancement.objects.filter(
-                    date_lancement__gte=week_ago
-                ).count(),
-            }
-            
-            # Stats des collaborateurs
-            collaborateurs_stats = {
-                'total_collaborateurs': Collaborateur.objects.count(),
-                'collaborateurs_actifs': Collaborateur.objects.filter(is_active=True).count(),
-            }
-            
-            # Stats des ateliers
-            ateliers_stats = {
-                'total_ateliers': Atelier.objects.count(),
-            }
-            
-            # Stats des affaires
-            affaires_stats = {
-                'total_affaires': Affaire.objects.count(),
-                'affaires_actives': Affaire.objects.filter(statut='en_cours').count(),
-            }
-            
-            context['stats_dashboard'] = {
-                **lancements_stats,
-                **collaborateurs_stats,
-                **ateliers_stats,
-                **affaires_stats,
-            }
-            
-        except ImportError as e:
-            # En cas d'erreur d'import (migrations non effectuées, etc.)
-            print(f"Erreur d'import dans context_processor: {e}")
-            context['stats_dashboard'] = {
-                'total_lancements': 0,
-                'lancements_en_cours': 0,
-                'lancements_termines': 0,
-                'lancements_cette_semaine': 0,
-                'total_collaborateurs': 0,
-                'collaborateurs_actifs': 0,
-                'total_ateliers': 0,
-                'total_affaires': 0,
-                'affaires_actives': 0,
-            }
+        # Activités récentes et statistiques : évaluées uniquement si un
+        # template les utilise, puis lues depuis le cache
+        context['activites_recentes'] = SimpleLazyObject(get_activites_recentes)
+        context['stats_dashboard'] = SimpleLazyObject(get_dashboard_stats)
     
     return context
 
@@ -128,10 +65,13 @@ def user_permissions(request):
     context = {}
     
     if request.user.is_authenticated and hasattr(request.user, 'user_role') and request.user.user_role:
-        permissions_dict = request.user.user_role.get_permissions_by_module()
-        context['user_permissions'] = permissions_dict
+        # Un seul entier par utilisateur, décodé pour les templates
+        permissions_mask = request.user.get_permission_mask()
+        context['user_permissions_mask'] = permissions_mask
+        context['user_permissions'] = decode_permissions(permissions_mask)
         context['user_role'] = request.user.user_role
     else:
+        context['user_permissions_mask'] = 0
         context['user_permissions'] = {}
         context['user_role'] = None
     
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.utils.archives import get_archive_dir, load_manifest, verify_archive
+from apps.core.utils.retention import get_activity_purge_queryset, purge_activities
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive les activités plus anciennes que ACTIVITIES_RETENTION_DAYS dans des fichiers JSONL '
+        'compressés (un par mois, sous MEDIA_ROOT) puis les supprime de la table'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compression',
+            choices=['gzip', 'zstd'],
+            default=getattr(settings, 'ACTIVITIES_ARCHIVE_COMPRESSION', 'gzip'),
+            help='Format de compression des fichiers (zstd nécessite le paquet zstandard)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Nombre de lignes supprimées par transaction après archivage (défaut: 5000)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Pause en secondes entre deux tranches de suppression (défaut: 0.1)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher le nombre d\'activités à archiver sans rien écrire',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Vérifier les sommes de contrôle des fichiers déjà archivés',
+        )
+
+    def progress(self, categorie, derniere_pk, nb_tranche, nb_total):
+        if self.verbosity >= 2 or categorie.startswith('archive'):
+            self.stdout.write(f'  {categorie} : {nb_tranche} ligne(s) ({nb_total} au total)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+
+        if options['verify']:
+            erreurs = 0
+            for entree in load_manifest():
+                if verify_archive(entree):
+                    self.stdout.write(f'- {entree["fichier"]} : OK')
+                else:
+                    erreurs += 1
+                    self.stdout.write(self.style.ERROR(f'- {entree["fichier"]} : somme de contrôle invalide'))
+            if erreurs:
+                self.stdout.write(self.style.ERROR(f'{erreurs} fichier(s) corrompu(s)'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Archive intègre'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Mode DRY-RUN activé - aucune écriture'))
+            self.stdout.write(f'{get_activity_purge_queryset().count()} activités seraient archivées dans {get_archive_dir()}')
+            return
+
+        self.stdout.write(f'Archivage des activités dans {get_archive_dir()}...')
+        nb_supprimees = purge_activities(
+            chunk_size=options['chunk_size'],
+            pause=options['sleep'],
+            progress=self.progress,
+            archive=True,
+            compression=options['compression'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{nb_supprimees} activités archivées et supprimées de la table'))
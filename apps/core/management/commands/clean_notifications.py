@@ -1,71 +1,98 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from apps.core.signals import nettoyer_anciennes_notifications, nettoyer_anciennes_activites
+from apps.core.utils.retention import (
+    get_notification_purge_querysets, get_activity_purge_queryset, get_profil_purge_queryset, purge_profils,
+)
 
 
 class Command(BaseCommand):
-    help = 'Nettoie les anciennes notifications et activités'
-    
+    help = (
+        'Nettoie les anciennes notifications et activités par tranches de clés primaires. '
+        'Chaque tranche est validée séparément : une exécution interrompue peut simplement être relancée.'
+    )
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--dry-run',
             action='store_true',
             help='Afficher ce qui serait supprimé sans effectuer la suppression',
         )
-    
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Nombre de lignes supprimées par transaction (défaut: 5000)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Pause en secondes entre deux tranches pour limiter la charge (défaut: 0.1)',
+        )
+
+    def progress(self, categorie, derniere_pk, nb_tranche, nb_total):
+        if self.verbosity < 2:
+            return
+        if derniere_pk is None:
+            # Partition d'activités supprimée d'un bloc
+            self.stdout.write(f'  {categorie} : {nb_tranche} ligne(s) ({nb_total} au total)')
+        else:
+            self.stdout.write(f'  {categorie} : {nb_tranche} ligne(s) jusqu\'à #{derniere_pk} ({nb_total} au total)')
+
     def handle(self, *args, **options):
-        self.stdout.write('Début du nettoyage...')
-        
+        self.verbosity = options['verbosity']
+        self.stdout.write(
+            'Début du nettoyage (conservation : '
+            f'{settings.NOTIFICATIONS_RETENTION_DAYS} j notifications lues, '
+            f'{settings.NOTIFICATIONS_UNREAD_RETENTION_DAYS} j non lues, '
+            f'{settings.ACTIVITIES_RETENTION_DAYS} j activités)...'
+        )
+
         if options['dry_run']:
             self.stdout.write(self.style.WARNING('Mode DRY-RUN activé - aucune suppression réelle'))
-            
+
             # Compter ce qui serait supprimé
-            from django.utils import timezone
-            from datetime import timedelta
-            from apps.core.models import Notification, Activite
-            
-            # Notifications
-            date_limite_lues = timezone.now() - timedelta(days=30)
-            date_limite_non_lues = timezone.now() - timedelta(days=90)
-            
-            count_lues = Notification.objects.filter(
-                lu=True,
-                date_lecture__lt=date_limite_lues
-            ).count()
-            
-            count_non_lues = Notification.objects.filter(
-                lu=False,
-                date_creation__lt=date_limite_non_lues
-            ).count()
-            
-            count_expirees = Notification.objects.filter(
-                date_expiration__lt=timezone.now()
-            ).count()
-            
-            # Activités
-            date_limite_activites = timezone.now() - timedelta(days=180)
-            count_activites = Activite.objects.filter(
-                date_creation__lt=date_limite_activites
-            ).count()
-            
+            counts = {
+                categorie: queryset.count()
+                for categorie, queryset in get_notification_purge_querysets().items()
+            }
+            count_activites = get_activity_purge_queryset().count()
+            count_profils = get_profil_purge_queryset().count()
+
             self.stdout.write(
                 f'Éléments qui seraient supprimés:\n'
-                f'- {count_lues} notifications lues anciennes\n'
-                f'- {count_non_lues} notifications non lues très anciennes\n'
-                f'- {count_expirees} notifications expirées\n'
-                f'- {count_activites} activités anciennes'
+                f'- {counts["notifications_lues_supprimees"]} notifications lues anciennes\n'
+                f'- {counts["notifications_non_lues_supprimees"]} notifications non lues très anciennes\n'
+                f'- {counts["notifications_expirees_supprimees"]} notifications expirées\n'
+                f'- {count_activites} activités anciennes\n'
+                f'- {count_profils} profils de requêtes anciens'
             )
-            
+
         else:
             # Effectuer le nettoyage réel
-            result_notifications = nettoyer_anciennes_notifications()
-            result_activites = nettoyer_anciennes_activites()
-            
+            options_purge = {
+                'chunk_size': options['chunk_size'],
+                'pause': options['sleep'],
+                'progress': self.progress,
+            }
+            try:
+                result_notifications = nettoyer_anciennes_notifications(**options_purge)
+                result_activites = nettoyer_anciennes_activites(**options_purge)
+                result_profils = purge_profils(**options_purge)
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING(
+                    'Nettoyage interrompu : les tranches déjà traitées sont conservées, relancez la commande pour terminer.'
+                ))
+                return
+
             self.stdout.write(
                 self.style.SUCCESS(
                     f'Nettoyage terminé:\n'
                     f'- {result_notifications["notifications_lues_supprimees"]} notifications lues supprimées\n'
                     f'- {result_notifications["notifications_non_lues_supprimees"]} notifications non lues supprimées\n'
                     f'- {result_notifications["notifications_expirees_supprimees"]} notifications expirées supprimées\n'
-                    f'- {result_activites} activités supprimées'
+                    f'- {result_activites} activités supprimées\n'
+                    f'- {result_profils} profils de requêtes supprimés'
                 )
             )
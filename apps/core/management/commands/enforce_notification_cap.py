@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.core.utils.retention import trim_all_notifications
+
+
+class Command(BaseCommand):
+    help = 'Supprime les notifications lues au-delà de MAX_NOTIFICATIONS_PER_USER (à planifier via cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre d\'utilisateurs traités par requête (défaut: 500)',
+        )
+
+    def handle(self, *args, **options):
+        cap = getattr(settings, 'MAX_NOTIFICATIONS_PER_USER', 100)
+        self.stdout.write(f'Application du plafond de {cap} notifications par utilisateur...')
+
+        nb_supprimees = trim_all_notifications(batch_size=options['batch_size'], cap=cap)
+
+        self.stdout.write(self.style.SUCCESS(f'{nb_supprimees} notification(s) lue(s) supprimée(s)'))
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.utils.partitions import (
+    convert_to_partitioned, drop_expired_partitions, ensure_partitions,
+    expired_partitions, is_partitioned, partitioning_enabled,
+)
+from apps.core.utils.retention import get_activity_retention_limit, purge_activities
+
+
+class Command(BaseCommand):
+    help = (
+        'Gère les partitions mensuelles de la table activite (PostgreSQL, ACTIVITE_PARTITIONING) : '
+        'crée les mois à venir et supprime ou détache les mois expirés. À planifier via cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--setup',
+            action='store_true',
+            help='Convertir la table activite existante en table partitionnée (opération unique)',
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=getattr(settings, 'ACTIVITE_PARTITIONS_AHEAD', 3),
+            help='Nombre de mois à venir à préparer',
+        )
+        parser.add_argument(
+            '--detach',
+            action='store_true',
+            help='Détacher les partitions expirées sans les supprimer (archivage manuel)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les partitions expirées sans les modifier',
+        )
+
+    def progress(self, categorie, derniere_pk, nb_tranche, nb_total):
+        if self.verbosity >= 2 or categorie.startswith(('archive', 'partition')):
+            self.stdout.write(f'  {categorie} : {nb_tranche} ligne(s) ({nb_total} au total)')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        # Avec l'archivage, une partition n'est supprimée qu'une fois ses lignes archivées et vérifiées
+        archiver = getattr(settings, 'ACTIVITIES_ARCHIVE_ENABLED', False) and not options['detach']
+
+        if not partitioning_enabled():
+            raise CommandError('Partitionnement désactivé : activez ACTIVITE_PARTITIONING (PostgreSQL uniquement).')
+
+        if not is_partitioned():
+            if not options['setup']:
+                raise CommandError('La table activite n\'est pas partitionnée : lancez d\'abord la commande avec --setup.')
+            self.stdout.write('Conversion de la table activite en table partitionnée...')
+            convert_to_partitioned(months_ahead=options['months_ahead'])
+            self.stdout.write(self.style.SUCCESS('Conversion terminée'))
+
+        limite = get_activity_retention_limit()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Mode DRY-RUN activé - aucune modification'))
+            for _, name in expired_partitions(limite):
+                action = 'détachée' if options['detach'] else 'archivée puis supprimée' if archiver else 'supprimée'
+                self.stdout.write(f'- {name} serait {action}')
+            return
+
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f'- Partition {name} prête')
+
+        if archiver:
+            # Même chemin que le nettoyage : archivage, vérification, puis suppression
+            nb = purge_activities(progress=self.progress, archive=True)
+            self.stdout.write(self.style.SUCCESS(f'{nb} activités archivées et supprimées'))
+            return
+
+        for name, nb in drop_expired_partitions(limite, detach_only=options['detach']):
+            action = 'détachée' if options['detach'] else 'supprimée'
+            self.stdout.write(f'- Partition {name} {action} ({nb} activités)')
+
+        self.stdout.write(self.style.SUCCESS('Partitions des activités à jour'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.core.models import CompteurNotification
+from apps.core.utils.notifications import bump_notification_version
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les compteurs de notifications (CompteurNotification) et corrige les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les écarts sans les corriger',
+        )
+
+    def handle(self, *args, **options):
+        reels = CompteurNotification.calculer()
+        stockes = {
+            pk: (total, non_lues)
+            for pk, total, non_lues in CompteurNotification.objects.values_list('pk', 'total', 'non_lues')
+        }
+
+        ecarts = {
+            pk: reels.get(pk, (0, 0))
+            for pk in set(reels) | set(stockes)
+            if reels.get(pk, (0, 0)) != stockes.get(pk)
+        }
+
+        for pk, (total, non_lues) in sorted(ecarts.items()):
+            total_stocke, non_lues_stocke = stockes.get(pk, ('-', '-'))
+            self.stdout.write(
+                f'- Utilisateur #{pk} : total {total_stocke} -> {total}, non lues {non_lues_stocke} -> {non_lues}'
+            )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Mode DRY-RUN : {len(ecarts)} compteur(s) à corriger'))
+            return
+
+        with transaction.atomic():
+            for pk, (total, non_lues) in ecarts.items():
+                CompteurNotification.objects.update_or_create(
+                    utilisateur_id=pk, defaults={'total': total, 'non_lues': non_lues}
+                )
+            bump_notification_version(*ecarts)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(ecarts)} compteur(s) corrigé(s)'))
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.core.utils.digest import creer_resumes
+from apps.core.utils.notification_jobs import claim_jobs, process_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Traite la file des diffusions de notifications par rôle (TacheNotification)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Traiter les tâches disponibles puis s\'arrêter',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Nombre de tâches réservées à chaque passage (défaut: 20)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Pause en secondes lorsque la file est vide (défaut: 2)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Démarrage du worker de notifications...')
+        intervalle_resumes = getattr(settings, 'NOTIFICATIONS_DIGEST_INTERVAL', 60)
+        dernier_passage_resumes = 0
+
+        try:
+            while True:
+                close_old_connections()
+                requeue_stale_jobs()
+
+                # Les résumés dus sont aussi produits par le worker
+                if time.monotonic() - dernier_passage_resumes >= intervalle_resumes:
+                    nb_resumes = creer_resumes()
+                    if nb_resumes:
+                        self.stdout.write(f'- {nb_resumes} résumé(s) de notifications créé(s)')
+                    dernier_passage_resumes = time.monotonic()
+
+                jobs = claim_jobs(options['batch_size'])
+                for job in jobs:
+                    if process_job(job):
+                        self.stdout.write(f'- Tâche #{job.pk} : {job.nb_destinataires} notification(s) "{job.titre}"')
+                    else:
+                        self.stdout.write(self.style.ERROR(f'- Tâche #{job.pk} ({job.statut}) : {job.erreur}'))
+
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Worker de notifications arrêté'))
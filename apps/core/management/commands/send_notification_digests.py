@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.utils.digest import creer_resumes
+
+
+class Command(BaseCommand):
+    help = 'Regroupe les notifications en attente en résumés selon les préférences des utilisateurs'
+
+    def handle(self, *args, **options):
+        nb_resumes = creer_resumes()
+        self.stdout.write(self.style.SUCCESS(f'{nb_resumes} résumé(s) de notifications créé(s)'))
@@ -1,14 +1,60 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.shortcuts import redirect
-from django.urls import resolve
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.http import JsonResponse
 from django.contrib import messages
 
+logger = logging.getLogger(__name__)
+
+
+def build_url_permission_table(url_patterns=None, namespace=None, in_apps=False):
+    """
+    Parcourt les URLconfs des applications (apps.*.urls) et retourne la table
+    {'namespace:url_name': (module, action)} des vues décorées par
+    permission_required.
+    """
+    if url_patterns is None:
+        url_patterns = get_resolver().url_patterns
+    
+    table = {}
+    for pattern in url_patterns:
+        if isinstance(pattern, URLResolver):
+            # include() range le module importé dans urlconf_name, pas son chemin
+            urlconf_name = getattr(pattern.urlconf_name, '__name__', pattern.urlconf_name)
+            if not isinstance(urlconf_name, str):
+                urlconf_name = ''
+            sub_namespace = namespace
+            if pattern.namespace:
+                sub_namespace = f"{namespace}:{pattern.namespace}" if namespace else pattern.namespace
+            table.update(build_url_permission_table(
+                pattern.url_patterns,
+                sub_namespace,
+                in_apps or urlconf_name.startswith('apps.'),
+            ))
+        elif isinstance(pattern, URLPattern) and in_apps and pattern.name:
+            required = getattr(pattern.callback, 'required_permission', None)
+            if required:
+                url_name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+                table[url_name] = required
+    return table
+
+
 class PermissionMiddleware:
     """Middleware pour vérifier les permissions automatiquement"""
     
     def __init__(self, get_response):
         self.get_response = get_response
         
-        # URLs qui nécessitent des permissions spécifiques
+        # URLs qui vérifient leurs permissions dans le corps de la vue
+        # (sans le décorateur permission_required)
         self.protected_urls = {
             'collaborateurs:list': ('collaborateurs', 'read'),
             'collaborateurs:create': ('collaborateurs', 'create'),
@@ -16,22 +62,112 @@ class PermissionMiddleware:
             'collaborateurs:delete': ('collaborateurs', 'delete'),
             'ateliers:list': ('ateliers', 'read'),
             'ateliers:create': ('ateliers', 'create'),
-            
-            # Ajoutez d'autres URLs selon vos besoins
         }
+        
+        # Table complète calculée une seule fois au démarrage
+        self.protected_urls.update(build_url_permission_table())
 
     def __call__(self, request):
-        # Vérifier les permissions avant la vue
-        if request.user.is_authenticated:
-            resolved = resolve(request.path_info)
-            url_name = f"{resolved.namespace}:{resolved.url_name}" if resolved.namespace else resolved.url_name
+        return self.get_response(request)
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Vérifie les permissions à partir de l'URL déjà résolue par Django"""
+        if not request.user.is_authenticated:
+            return None
+        
+        required = self.protected_urls.get(request.resolver_match.view_name)
+        if required and not request.user.has_permission(*required):
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({
+                    'error': True,
+                    'message': 'Permissions insuffisantes'
+                }, status=403)
             
-            if url_name in self.protected_urls:
-                module, action = self.protected_urls[url_name]
-                if not request.user.has_permission(module, action):
-                    messages.error(request, "Vous n'avez pas les permissions nécessaires.")
-                    return redirect('dashboard')
+            messages.error(request, "Vous n'avez pas les permissions nécessaires.")
+            return redirect('core:dashboard')
+        
+        return None
+
+
+class QueryBudgetMiddleware:
+    """
+    Instrumentation SQL par requête (optionnelle, QUERY_BUDGET_ENABLED).
+    
+    Compte les requêtes SQL, leur durée cumulée et les requêtes répétées
+    (même SQL, paramètres exclus : signe typique d'un N+1), ajoute un en-tête
+    Server-Timing (en DEBUG ou pour les membres du staff), journalise un avertissement si le budget de la vue
+    (QUERY_BUDGETS / QUERY_BUDGET_DEFAULT) est dépassé et enregistre un
+    ProfilRequete pour une fraction des requêtes (QUERY_BUDGET_SAMPLE_RATE).
+    """
+    
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.default_budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        self.sample_rate = getattr(settings, 'QUERY_BUDGET_SAMPLE_RATE', 0.01)
+    
+    def __call__(self, request):
+        fingerprints = Counter()
+        timings = {'sql': 0.0}
+        
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings['sql'] += time.perf_counter() - start
+                fingerprints[sql] += 1
+        
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_query))
+            response = self.get_response(request)
+        duree_totale_ms = (time.perf_counter() - start) * 1000
+        
+        duree_sql_ms = timings['sql'] * 1000
+        nb_requetes = sum(fingerprints.values())
+        repetees = [(sql, count) for sql, count in fingerprints.most_common() if count > 1]
+        nb_doublons = sum(count - 1 for _, count in repetees)
+        
+        match = getattr(request, 'resolver_match', None)
+        vue = match.view_name if match else request.path_info
+        
+        # Mesures internes : pas exposées aux clients anonymes en production
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = (
+                f'db;desc="SQL ({nb_requetes} req., {nb_doublons} doublons)";dur={duree_sql_ms:.1f}, '
+                f'total;dur={duree_totale_ms:.1f}'
+            )
+        
+        budget = self.budgets.get(vue, self.default_budget)
+        if budget is not None and nb_requetes > budget:
+            logger.warning(
+                f"Budget SQL dépassé pour {vue} : {nb_requetes} requêtes (budget {budget}), "
+                f"{duree_sql_ms:.1f} ms, {nb_doublons} doublons"
+            )
+        
+        if match and random.random() < self.sample_rate:
+            self._save_profile(request, vue, nb_requetes, nb_doublons, duree_sql_ms, duree_totale_ms, repetees)
         
-        response = self.get_response(request)
         return response
-    
\ No newline at end of file
+    
+    def _save_profile(self, request, vue, nb_requetes, nb_doublons, duree_sql_ms, duree_totale_ms, repetees):
+        """Enregistre la mesure (hors instrumentation)"""
+        from .models import ProfilRequete
+        try:
+            ProfilRequete.objects.create(
+                vue=vue[:200],
+                methode=request.method,
+                chemin=request.path_info[:500],
+                nb_requetes=nb_requetes,
+                nb_doublons=nb_doublons,
+                duree_sql_ms=duree_sql_ms,
+                duree_totale_ms=duree_totale_ms,
+                requetes_dupliquees=[{'sql': sql[:500], 'count': count} for sql, count in repetees[:5]],
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement du profil de requête: {e}")
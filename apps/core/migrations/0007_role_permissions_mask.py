@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+# Copie figée de PERMISSION_BITS à la date de la migration : une évolution
+# ultérieure de la table des bits ne doit pas changer ce que fait la migration
+MODULES = ['collaborateurs', 'ateliers', 'categories', 'affaires', 'lancements', 'rapports', 'administration']
+ACTIONS = ['create', 'read', 'update', 'delete', 'assign', 'export']
+PERMISSION_BITS = {
+    (module, action): 1 << (module_index * len(ACTIONS) + action_index)
+    for module_index, module in enumerate(MODULES)
+    for action_index, action in enumerate(ACTIONS)
+}
+
+
+def compute_permissions_masks(apps, schema_editor):
+    """Initialise le masque de permissions des rôles existants"""
+    Role = apps.get_model('core', 'Role')
+    for role in Role.objects.all():
+        mask = 0
+        for pair in role.permissions.values_list('module', 'action'):
+            mask |= PERMISSION_BITS.get(tuple(pair), 0)
+        Role.objects.filter(pk=role.pk).update(permissions_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_affaire_livrable_preferencenotification_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='permissions_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Masque des permissions'),
+        ),
+        migrations.RunPython(compute_permissions_masks, migrations.RunPython.noop),
+    ]
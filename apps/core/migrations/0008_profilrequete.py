@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_role_permissions_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilRequete',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vue', models.CharField(max_length=200, verbose_name='Vue')),
+                ('methode', models.CharField(max_length=10, verbose_name='Méthode HTTP')),
+                ('chemin', models.CharField(max_length=500, verbose_name='Chemin')),
+                ('nb_requetes', models.PositiveIntegerField(default=0, verbose_name='Requêtes SQL')),
+                ('nb_doublons', models.PositiveIntegerField(default=0, verbose_name='Requêtes dupliquées')),
+                ('duree_sql_ms', models.FloatField(default=0, verbose_name='Durée SQL (ms)')),
+                ('duree_totale_ms', models.FloatField(default=0, verbose_name='Durée totale (ms)')),
+                ('requetes_dupliquees', models.JSONField(blank=True, default=list, verbose_name='Requêtes répétées')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+            ],
+            options={
+                'verbose_name': 'Profil de requête',
+                'verbose_name_plural': 'Profils de requêtes',
+                'db_table': 'profil_requete',
+                'ordering': ['-date_creation'],
+                'indexes': [
+                    models.Index(fields=['date_creation'], name='profil_requ_date_cr_2e1f14_idx'),
+                    models.Index(fields=['vue', 'date_creation'], name='profil_requ_vue_5c3001_idx'),
+                ],
+            },
+        ),
+    ]
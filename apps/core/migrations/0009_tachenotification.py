@@ -0,0 +1,43 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0008_profilrequete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role_name', models.CharField(max_length=100, verbose_name='Rôle destinataire')),
+                ('type_notification', models.CharField(choices=[('info', 'Information'), ('success', 'Succès'), ('warning', 'Avertissement'), ('error', 'Erreur'), ('system', 'Système')], default='info', max_length=20, verbose_name='Type')),
+                ('titre', models.CharField(max_length=200, verbose_name='Titre')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('url_action', models.CharField(blank=True, max_length=200, null=True, verbose_name="URL d'action")),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echec', 'Échec')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('nb_destinataires', models.PositiveIntegerField(default=0, verbose_name='Destinataires')),
+                ('erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_disponible', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Disponible à partir de')),
+                ('date_traitement', models.DateTimeField(blank=True, null=True, verbose_name='Date de traitement')),
+                ('content_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Tâche de notification',
+                'verbose_name_plural': 'Tâches de notification',
+                'db_table': 'tache_notification',
+                'ordering': ['date_disponible', 'id'],
+                'indexes': [
+                    models.Index(fields=['statut', 'date_disponible'], name='tache_notif_statut_e0b47d_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0009_tachenotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='preferencenotification',
+            name='date_dernier_resume',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernier résumé'),
+        ),
+        migrations.CreateModel(
+            name='EvenementNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categorie', models.CharField(choices=[('lancements', 'Lancements'), ('affaires', 'Affaires'), ('systeme', 'Système')], max_length=20, verbose_name='Catégorie')),
+                ('type_notification', models.CharField(choices=[('info', 'Information'), ('success', 'Succès'), ('warning', 'Avertissement'), ('error', 'Erreur'), ('system', 'Système')], default='info', max_length=20, verbose_name='Type')),
+                ('titre', models.CharField(max_length=200, verbose_name='Titre')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('url_action', models.CharField(blank=True, max_length=200, null=True, verbose_name="URL d'action")),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+                ('content_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('destinataire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements_notification', to=settings.AUTH_USER_MODEL, verbose_name='Destinataire')),
+            ],
+            options={
+                'verbose_name': 'Événement en attente de résumé',
+                'verbose_name_plural': 'Événements en attente de résumé',
+                'db_table': 'evenement_notification',
+                'ordering': ['date_creation'],
+                'indexes': [
+                    models.Index(fields=['destinataire', 'date_creation'], name='evenement_n_destina_471470_idx'),
+                ],
+            },
+        ),
+    ]
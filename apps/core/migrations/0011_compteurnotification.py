@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remplir_compteurs(apps, schema_editor):
+    """Initialise les compteurs à partir des notifications existantes"""
+    Notification = apps.get_model('core', 'Notification')
+    CompteurNotification = apps.get_model('core', 'CompteurNotification')
+    lignes = Notification.objects.values('destinataire_id').annotate(
+        total=models.Count('id'),
+        non_lues=models.Count('id', filter=models.Q(lu=False)),
+    ).order_by()
+    CompteurNotification.objects.bulk_create(
+        [CompteurNotification(utilisateur_id=ligne['destinataire_id'], total=ligne['total'], non_lues=ligne['non_lues'])
+         for ligne in lignes],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0010_digest_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurNotification',
+            fields=[
+                ('utilisateur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compteur_notifications', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+                ('non_lues', models.IntegerField(default=0, verbose_name='Non lues')),
+            ],
+            options={
+                'verbose_name': 'Compteur de notifications',
+                'verbose_name_plural': 'Compteurs de notifications',
+                'db_table': 'compteur_notification',
+            },
+        ),
+        migrations.RunPython(remplir_compteurs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Copie figée du SQL des triggers (apps.core.utils.search) : la migration ne
+# doit pas changer quand le module évolue
+ACTIVITE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION activite_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('french', coalesce(NEW.description, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS activite_search_vector_trigger ON activite;
+CREATE TRIGGER activite_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF description ON activite
+    FOR EACH ROW EXECUTE FUNCTION activite_search_vector_update();
+"""
+
+NOTIFICATION_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION notification_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('french', coalesce(NEW.titre, '')), 'A') ||
+        setweight(to_tsvector('french', coalesce(NEW.message, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS notification_search_vector_trigger ON notification;
+CREATE TRIGGER notification_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF titre, message ON notification
+    FOR EACH ROW EXECUTE FUNCTION notification_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_notification_destinataire_date_creation'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='activite',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=ACTIVITE_TRIGGER_SQL + """
+                UPDATE activite SET search_vector = to_tsvector('french', coalesce(description, ''));
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS activite_search_vector_trigger ON activite;
+                DROP FUNCTION IF EXISTS activite_search_vector_update();
+            """,
+        ),
+        migrations.RunSQL(
+            sql=NOTIFICATION_TRIGGER_SQL + """
+                UPDATE notification SET search_vector =
+                    setweight(to_tsvector('french', coalesce(titre, '')), 'A') ||
+                    setweight(to_tsvector('french', coalesce(message, '')), 'B');
+            """,
+            reverse_sql="""
+                DROP TRIGGER IF EXISTS notification_search_vector_trigger ON notification;
+                DROP FUNCTION IF EXISTS notification_search_vector_update();
+            """,
+        ),
+        migrations.AddIndex(
+            model_name='activite',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='activite_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='activite',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='activite_description_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='notification_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['titre'], name='notification_titre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['message'], name='notification_message_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
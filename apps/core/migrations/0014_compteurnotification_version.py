@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compteurnotification',
+            name='version',
+            field=models.BigIntegerField(default=0, verbose_name='Version'),
+        ),
+    ]
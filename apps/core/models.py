@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from apps.collaborateurs.models import Collaborateur
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
+from datetime import timedelta
 
 
 class Affaire(models.Model):
@@ -126,6 +129,31 @@ class Permission(models.Model):
         return f"{self.get_module_display()} - {self.get_action_display()}"
 
 
+# Position de chaque couple (module, action) dans un masque de permissions
+PERMISSION_BITS = {
+    (module, action): 1 << (module_index * len(Permission.ACTION_CHOICES) + action_index)
+    for module_index, (module, _) in enumerate(Permission.MODULE_CHOICES)
+    for action_index, (action, _) in enumerate(Permission.ACTION_CHOICES)
+}
+
+
+def encode_permissions(pairs):
+    """Encode des couples (module, action) en un masque de bits"""
+    mask = 0
+    for pair in pairs:
+        mask |= PERMISSION_BITS.get(tuple(pair), 0)
+    return mask
+
+
+def decode_permissions(mask):
+    """Décode un masque de bits en dictionnaire {module: [actions]} pour les templates"""
+    permissions_dict = {}
+    for (module, action), bit in PERMISSION_BITS.items():
+        if mask & bit:
+            permissions_dict.setdefault(module, []).append(action)
+    return permissions_dict
+
+
 class Role(models.Model):
     """Modèle pour définir les rôles utilisateur"""
     
@@ -134,6 +162,10 @@ class Role(models.Model):
     is_active = models.BooleanField(default=True, verbose_name="Actif")
     is_system_role = models.BooleanField(default=False, verbose_name="Rôle système")
     permissions = models.ManyToManyField(Permission, blank=True, verbose_name="Permissions")
+    
+    # Copie dénormalisée de `permissions` sous forme de masque de bits (voir PERMISSION_BITS)
+    permissions_mask = models.BigIntegerField(default=0, editable=False, verbose_name="Masque des permissions")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -144,18 +176,41 @@ class Role(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        # permissions_mask n'est écrit que par refresh_permissions_masks : une
+        # instance périmée (admin, formulaire) ne doit pas écraser un masque recalculé
+        if not self._state.adding and not args and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'permissions_mask'
+            ]
+        super().save(*args, **kwargs)
+    
     def get_permissions_by_module(self):
         """Retourne les permissions groupées par module"""
-        permissions_dict = {}
-        for perm in self.permissions.all():
-            if perm.module not in permissions_dict:
-                permissions_dict[perm.module] = []
-            permissions_dict[perm.module].append(perm.action)
-        return permissions_dict
+        return decode_permissions(self.permissions_mask)
     
     def has_permission(self, module, action):
         """Vérifie si le rôle a une permission spécifique"""
-        return self.permissions.filter(module=module, action=action).exists() 
+        return bool(self.permissions_mask & PERMISSION_BITS.get((module, action), 0))
+    
+    @classmethod
+    def refresh_permissions_masks(cls, role_ids=None):
+        """
+        Recalcule le masque de permissions des rôles indiqués (tous par défaut)
+        à partir de la table de liaison. Utilise update() pour ne pas modifier
+        updated_at ni redéclencher les signaux post_save.
+        """
+        roles = cls.objects.all() if role_ids is None else cls.objects.filter(pk__in=role_ids)
+        masks = {role_id: 0 for role_id in roles.values_list('pk', flat=True)}
+        links = cls.permissions.through.objects.filter(role_id__in=masks).values_list(
+            'role_id', 'permission__module', 'permission__action'
+        )
+        for role_id, module, action in links:
+            masks[role_id] |= PERMISSION_BITS.get((module, action), 0)
+        for role_id, mask in masks.items():
+            cls.objects.filter(pk=role_id).update(permissions_mask=mask)
+        return masks
     
 class Notification(models.Model):
     """
@@ -217,6 +272,9 @@ class Notification(models.Model):
         verbose_name="Date d'expiration"
     )
     
+    # Recherche plein texte (titre + message), calculée par trigger (voir utils.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         db_table = 'notification'
         verbose_name = 'Notification'
@@ -224,8 +282,13 @@ class Notification(models.Model):
         ordering = ['-date_creation']
         indexes = [
             models.Index(fields=['destinataire', 'lu']),
+            # Pagination par curseur de la liste d'un utilisateur
+            models.Index(fields=['destinataire', 'date_creation']),
             models.Index(fields=['date_creation']),
             models.Index(fields=['type_notification']),
+            GinIndex(fields=['search_vector'], name='notification_search_gin'),
+            GinIndex(fields=['titre'], name='notification_titre_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['message'], name='notification_message_trgm', opclasses=['gin_trgm_ops']),
         ]
     
     def __str__(self):
@@ -234,9 +297,17 @@ class Notification(models.Model):
     def marquer_comme_lu(self):
         """Marque la notification comme lue"""
         if not self.lu:
+            from .utils.notifications import publish_unread_count
             self.lu = True
             self.date_lecture = timezone.now()
-            self.save(update_fields=['lu', 'date_lecture'])
+            with transaction.atomic():
+                # UPDATE conditionnel : deux clics simultanés ne décrémentent qu'une fois
+                modifiee = Notification.objects.filter(pk=self.pk, lu=False).update(
+                    lu=True, date_lecture=self.date_lecture
+                )
+                if modifiee:
+                    CompteurNotification.ajuster({self.destinataire_id: (0, -1)})
+                    publish_unread_count(self.destinataire_id)
     
     @property
     def is_expired(self):
@@ -262,6 +333,108 @@ class Notification(models.Model):
         return timesince(self.date_creation)
 
 
+class CompteurNotification(models.Model):
+    """
+    Compteurs dénormalisés des notifications d'un utilisateur (badge de la navbar,
+    statistiques de la liste). Tenus à jour par NotificationService, les signaux
+    de Notification et marquer_comme_lu ; réparés par reconcile_notification_counters.
+    """
+    utilisateur = models.OneToOneField(
+        Collaborateur,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='compteur_notifications',
+        verbose_name="Utilisateur"
+    )
+    total = models.IntegerField(default=0, verbose_name="Total")
+    non_lues = models.IntegerField(default=0, verbose_name="Non lues")
+    # Incrémentée dans la transaction de chaque changement : sert d'ETag au polling
+    version = models.BigIntegerField(default=0, verbose_name="Version")
+    
+    class Meta:
+        db_table = 'compteur_notification'
+        verbose_name = 'Compteur de notifications'
+        verbose_name_plural = 'Compteurs de notifications'
+    
+    def __str__(self):
+        return f"{self.utilisateur_id} - {self.non_lues}/{self.total}"
+    
+    @classmethod
+    def calculer(cls, utilisateur_ids=None):
+        """Recompte les notifications depuis la table : {utilisateur_id: (total, non_lues)}"""
+        queryset = Notification.objects.all()
+        if utilisateur_ids is not None:
+            queryset = queryset.filter(destinataire_id__in=utilisateur_ids)
+        return {
+            row['destinataire_id']: (row['total'], row['non_lues'])
+            for row in queryset.values('destinataire_id').annotate(
+                total=models.Count('id'),
+                non_lues=models.Count('id', filter=models.Q(lu=False)),
+            ).order_by()
+        }
+    
+    @classmethod
+    def ajuster(cls, deltas):
+        """
+        Applique des variations {utilisateur_id: (delta_total, delta_non_lues)}
+        avec un UPDATE par variation distincte ; incrémente aussi la version.
+        À appeler après la modification des notifications, dans sa transaction.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta != (0, 0)}
+        if not deltas:
+            return
+        # Les lignes manquantes sont initialisées depuis la table, variation
+        # déduite : elle est appliquée ensuite à toutes les lignes, y compris à
+        # celles qu'une transaction concurrente aurait créées en premier
+        # (ignore_conflicts), sans quoi elle serait perdue
+        existants = set(cls.objects.filter(pk__in=deltas).values_list('pk', flat=True))
+        manquants = [pk for pk in deltas if pk not in existants]
+        if manquants:
+            comptes = cls.calculer(manquants)
+            nouveaux = []
+            for pk in manquants:
+                total, non_lues = comptes.get(pk, (0, 0))
+                delta_total, delta_non_lues = deltas[pk]
+                nouveaux.append(cls(utilisateur_id=pk, total=total - delta_total, non_lues=non_lues - delta_non_lues))
+            cls.objects.bulk_create(nouveaux, ignore_conflicts=True)
+        
+        groupes = {}
+        for pk, delta in deltas.items():
+            groupes.setdefault(delta, []).append(pk)
+        for (delta_total, delta_non_lues), pks in groupes.items():
+            cls.objects.filter(pk__in=pks).update(
+                total=models.F('total') + delta_total,
+                non_lues=models.F('non_lues') + delta_non_lues,
+                version=models.F('version') + 1,
+            )
+    
+    @classmethod
+    def get_compteurs(cls, utilisateur_id):
+        """Retourne (total, non_lues) en une lecture, en créant la ligne si besoin"""
+        compteurs = cls.objects.filter(pk=utilisateur_id).values_list('total', 'non_lues').first()
+        if compteurs is None:
+            compteurs = cls.calculer([utilisateur_id]).get(utilisateur_id, (0, 0))
+            cls.objects.get_or_create(
+                utilisateur_id=utilisateur_id,
+                defaults={'total': compteurs[0], 'non_lues': compteurs[1]},
+            )
+        return compteurs
+    
+    @classmethod
+    def get_version(cls, utilisateur_id):
+        """Version courante des notifications de l'utilisateur, en créant la ligne si besoin"""
+        version = cls.objects.filter(pk=utilisateur_id).values_list('version', flat=True).first()
+        if version is None:
+            # Une version plus ancienne que la réalité ne coûte qu'une réponse 200 de plus
+            cls.get_compteurs(utilisateur_id)
+            version = 0
+        return version
+    
+    @classmethod
+    def get_non_lues(cls, utilisateur_id):
+        return max(cls.get_compteurs(utilisateur_id)[1], 0)
+
+
 class Activite(models.Model):
     """
     Modèle pour enregistrer les activités/historique du système
@@ -325,6 +498,9 @@ class Activite(models.Model):
     # Timestamp
     date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date")
     
+    # Recherche plein texte (description), calculée par trigger (voir utils.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         db_table = 'activite'
         verbose_name = 'Activité'
@@ -335,6 +511,8 @@ class Activite(models.Model):
             models.Index(fields=['utilisateur', 'date_creation']),
             models.Index(fields=['module', 'action']),
             models.Index(fields=['content_type', 'object_id']),
+            GinIndex(fields=['search_vector'], name='activite_search_gin'),
+            GinIndex(fields=['description'], name='activite_description_trgm', opclasses=['gin_trgm_ops']),
         ]
     
     def __str__(self):
@@ -364,8 +542,22 @@ class Activite(models.Model):
     @classmethod
     def log_activity(cls, utilisateur, action, module, description, objet=None, request=None, donnees_avant=None, donnees_après=None):
         """
-        Méthode utilitaire pour enregistrer une activité
+        Méthode utilitaire pour enregistrer une activité.
+        L'écriture est différée (voir utils.activity_writer) : l'instance
+        retournée n'est enregistrée qu'au commit ou en fin de requête.
         """
+        from .utils.activity_writer import enqueue_activity
+
+        activite = cls.build_activity(
+            utilisateur, action, module, description, objet=objet, request=request,
+            donnees_avant=donnees_avant, donnees_après=donnees_après,
+        )
+        enqueue_activity(activite)
+        return activite
+    
+    @classmethod
+    def build_activity(cls, utilisateur, action, module, description, objet=None, request=None, donnees_avant=None, donnees_après=None):
+        """Construit une activité sans l'enregistrer"""
         activity_data = {
             'utilisateur': utilisateur,
             'action': action,
@@ -385,7 +577,7 @@ class Activite(models.Model):
             activity_data['adresse_ip'] = cls.get_client_ip(request)
             activity_data['user_agent'] = request.META.get('HTTP_USER_AGENT', '')
         
-        return cls.objects.create(**activity_data)
+        return cls(**activity_data)
     
     @staticmethod
     def get_client_ip(request):
@@ -441,8 +633,213 @@ class PreferenceNotification(models.Model):
         verbose_name="Fin période silencieuse"
     )
     
+    # Dernier résumé envoyé (voir utils.digest)
+    date_dernier_resume = models.DateTimeField(null=True, blank=True, verbose_name="Dernier résumé")
+    
+    # Intervalle entre deux résumés selon la fréquence choisie
+    PERIODES_RESUME = {
+        'hourly': timedelta(hours=1),
+        'daily': timedelta(days=1),
+        'weekly': timedelta(weeks=1),
+    }
+    
     class Meta:
         db_table = 'preference_notification'
         verbose_name = 'Préférence de notification'
         verbose_name_plural = 'Préférences de notification'
-    
\ No newline at end of file
+    
+    def __str__(self):
+        return f"Préférences de {self.utilisateur.get_full_name()}"
+    
+    def accepte_categorie(self, categorie):
+        """Vérifie si l'utilisateur accepte les notifications de cette catégorie"""
+        return getattr(self, f'notifications_{categorie}', True)
+    
+    def est_periode_silencieuse(self, moment=None):
+        """Vérifie si le moment (heure locale) tombe dans la période silencieuse"""
+        if not self.heure_debut_silencieux or not self.heure_fin_silencieux:
+            return False
+        heure = timezone.localtime(moment).time()
+        debut, fin = self.heure_debut_silencieux, self.heure_fin_silencieux
+        if debut <= fin:
+            return debut <= heure < fin
+        # Période à cheval sur minuit (ex. 22h - 7h)
+        return heure >= debut or heure < fin
+    
+    def resume_du(self, moment=None):
+        """Vérifie si un résumé peut être envoyé maintenant"""
+        moment = moment or timezone.now()
+        if self.est_periode_silencieuse(moment):
+            return False
+        periode = self.PERIODES_RESUME.get(self.frequence_resume)
+        if periode is None or self.date_dernier_resume is None:
+            return True
+        return moment - self.date_dernier_resume >= periode
+
+
+
+class EvenementNotification(models.Model):
+    """
+    Notification de faible priorité mise en attente pour un résumé
+    (voir PreferenceNotification.frequence_resume et utils.digest)
+    """
+    CATEGORIES = [
+        ('lancements', 'Lancements'),
+        ('affaires', 'Affaires'),
+        ('systeme', 'Système'),
+    ]
+    
+    destinataire = models.ForeignKey(
+        Collaborateur,
+        on_delete=models.CASCADE,
+        related_name='evenements_notification',
+        verbose_name="Destinataire"
+    )
+    categorie = models.CharField(max_length=20, choices=CATEGORIES, verbose_name="Catégorie")
+    type_notification = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_TYPES,
+        default='info',
+        verbose_name="Type"
+    )
+    titre = models.CharField(max_length=200, verbose_name="Titre")
+    message = models.TextField(verbose_name="Message")
+    url_action = models.CharField(max_length=200, blank=True, null=True, verbose_name="URL d'action")
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date")
+    
+    class Meta:
+        db_table = 'evenement_notification'
+        verbose_name = 'Événement en attente de résumé'
+        verbose_name_plural = 'Événements en attente de résumé'
+        ordering = ['date_creation']
+        indexes = [
+            models.Index(fields=['destinataire', 'date_creation']),
+        ]
+    
+    def __str__(self):
+        return f"{self.titre} - {self.destinataire_id}"
+
+
+class ProfilRequete(models.Model):
+    """
+    Mesure SQL d'une requête HTTP, enregistrée par QueryBudgetMiddleware
+    lorsque l'instrumentation est activée (QUERY_BUDGET_ENABLED)
+    """
+    vue = models.CharField(max_length=200, verbose_name="Vue")
+    methode = models.CharField(max_length=10, verbose_name="Méthode HTTP")
+    chemin = models.CharField(max_length=500, verbose_name="Chemin")
+    
+    # Mesures
+    nb_requetes = models.PositiveIntegerField(default=0, verbose_name="Requêtes SQL")
+    nb_doublons = models.PositiveIntegerField(default=0, verbose_name="Requêtes dupliquées")
+    duree_sql_ms = models.FloatField(default=0, verbose_name="Durée SQL (ms)")
+    duree_totale_ms = models.FloatField(default=0, verbose_name="Durée totale (ms)")
+    
+    # Empreintes des requêtes répétées : [{'sql': ..., 'count': ...}]
+    requetes_dupliquees = models.JSONField(default=list, blank=True, verbose_name="Requêtes répétées")
+    
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date")
+    
+    class Meta:
+        db_table = 'profil_requete'
+        verbose_name = 'Profil de requête'
+        verbose_name_plural = 'Profils de requêtes'
+        ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['date_creation']),
+            models.Index(fields=['vue', 'date_creation']),
+        ]
+    
+    def __str__(self):
+        return f"{self.vue} - {self.nb_requetes} requêtes ({self.duree_sql_ms:.1f} ms)"
+
+
+class TacheNotification(models.Model):
+    """
+    Diffusion différée d'une notification à tous les membres d'un rôle.
+    Créée au commit de la transaction déclencheuse et traitée par la
+    commande run_notification_worker.
+    """
+    STATUTS = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echec', 'Échec'),
+    ]
+    
+    # Contenu de la notification à diffuser
+    role_name = models.CharField(max_length=100, verbose_name="Rôle destinataire")
+    type_notification = models.CharField(
+        max_length=20,
+        choices=Notification.NOTIFICATION_TYPES,
+        default='info',
+        verbose_name="Type"
+    )
+    titre = models.CharField(max_length=200, verbose_name="Titre")
+    message = models.TextField(verbose_name="Message")
+    url_action = models.CharField(max_length=200, blank=True, null=True, verbose_name="URL d'action")
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    
+    # Suivi du traitement
+    statut = models.CharField(max_length=20, choices=STATUTS, default='en_attente', verbose_name="Statut")
+    tentatives = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    nb_destinataires = models.PositiveIntegerField(default=0, verbose_name="Destinataires")
+    erreur = models.TextField(blank=True, verbose_name="Dernière erreur")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_disponible = models.DateTimeField(default=timezone.now, verbose_name="Disponible à partir de")
+    date_traitement = models.DateTimeField(null=True, blank=True, verbose_name="Date de traitement")
+    
+    class Meta:
+        db_table = 'tache_notification'
+        verbose_name = 'Tâche de notification'
+        verbose_name_plural = 'Tâches de notification'
+        ordering = ['date_disponible', 'id']
+        indexes = [
+            models.Index(fields=['statut', 'date_disponible']),
+        ]
+    
+    def __str__(self):
+        return f"{self.titre} → {self.role_name} ({self.get_statut_display()})"
+
+
+class VersionCache(models.Model):
+    """
+    Version d'invalidation d'une famille d'entrées de cache (voir utils.cache_versions).
+    Stockée en base pour être vue par tous les processus, même avec un cache local.
+    """
+    cle = models.CharField(max_length=100, primary_key=True, verbose_name="Clé")
+    version = models.BigIntegerField(default=0, verbose_name="Version")
+    
+    class Meta:
+        db_table = 'version_cache'
+        verbose_name = 'Version de cache'
+        verbose_name_plural = 'Versions de cache'
+    
+    def __str__(self):
+        return f"{self.cle} - {self.version}"
+    
+    @classmethod
+    def lire(cls, cle):
+        """Version courante (0 si la clé n'a jamais été invalidée)"""
+        return cls.objects.filter(pk=cle).values_list('version', flat=True).first() or 0
+    
+    @classmethod
+    def changer(cls, cle, version):
+        """Enregistre une nouvelle version, en créant la ligne si besoin"""
+        if not cls.objects.filter(pk=cle).update(version=version):
+            cls.objects.bulk_create([cls(cle=cle, version=version)], ignore_conflicts=True)
+            # Ligne créée entre-temps par un autre processus
+            cls.objects.filter(pk=cle, version__lt=version).update(version=version)
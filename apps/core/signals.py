@@ -1,25 +1,96 @@
 # apps/core/signals.py - VERSION CORRIGÉE COMPLÈTE
 
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.conf import settings
+from django.db import transaction
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.contrib.contenttypes.models import ContentType
-from .models import Notification, Activite, Affaire
+from .models import Notification, CompteurNotification, Activite, Affaire, Role, Permission, PreferenceNotification
+from .utils.permission_cache import invalidate_role_permissions
+from .stats import invalidate_dashboard_stats, invalidate_activites_recentes
+from .utils.activity_writer import activity_buffer, enqueue_change
+from .utils.digest import invalidate_preferences, trier_notifications
+from .utils.notification_jobs import enqueue_role_notification
+from .utils.notifications import bump_notification_version, publish_notifications
+from .utils.retention import trim_notifications, purge_notifications, purge_activities
 from apps.collaborateurs.models import Collaborateur
-import threading
+from apps.collaborateurs.backends import invalidate_cached_user, invalidate_cached_role
+from contextvars import ContextVar
+from decimal import Decimal
 
-# Variable pour stocker les données avant modification
-_thread_locals = threading.local()
+# Requête courante, propre à chaque contexte d'exécution (thread ou tâche ASGI)
+_current_request = ContextVar('current_request', default=None)
 
 
 def get_current_request():
     """Récupère la requête courante depuis le middleware"""
-    return getattr(_thread_locals, 'request', None)
+    return _current_request.get()
 
 
 def set_current_request(request):
-    """Stocke la requête courante pour les signaux"""
-    _thread_locals.request = request
+    """Stocke la requête courante pour les signaux ; retourne le jeton pour reset_current_request"""
+    return _current_request.set(request)
+
+
+def reset_current_request(token):
+    _current_request.reset(token)
+
+
+def get_donnees_modifiees(instance, changements):
+    """
+    donnees_avant / donnees_après des champs modifiés (FieldTrackerMixin).
+    Les clés étrangères sont affichées par le nom de l'objet lié : seul
+    l'objet lié initial d'une clé modifiée nécessite une requête.
+    """
+    avant, apres = {}, {}
+    for champ, (ancienne, nouvelle) in changements.items():
+        if instance._meta.get_field(champ).is_relation:
+            ancienne = str(instance.get_initial_related(champ)) if ancienne is not None else None
+            nouvelle = str(getattr(instance, champ)) if nouvelle is not None else None
+        elif isinstance(ancienne, Decimal) or isinstance(nouvelle, Decimal):
+            ancienne = float(ancienne) if ancienne is not None else None
+            nouvelle = float(nouvelle) if nouvelle is not None else None
+        avant[champ], apres[champ] = ancienne, nouvelle
+    return avant, apres
+
+
+def decrire_modifications(avant, apres, libelles):
+    """Liste 'Libellé: avant → après' des champs décrits par `libelles`"""
+    return [
+        f"{libelle}: {avant.get(champ)} → {apres[champ]}"
+        for champ, libelle in libelles.items() if champ in apres
+    ]
+
+
+def decrire_modification_lancement(instance, avant, apres):
+    changes = decrire_modifications(avant, apres, {
+        'statut': 'Statut', 'collaborateur': 'Collaborateur', 'atelier': 'Atelier',
+    })
+    if changes:
+        return f"Modification du lancement {instance.num_lanc}: {', '.join(changes)}"
+    return None
+
+
+def decrire_modification_collaborateur(instance, avant, apres):
+    changes = decrire_modifications(avant, apres, {
+        'nom_collaborateur': 'Nom', 'prenom_collaborateur': 'Prénom', 'email': 'Email',
+    })
+    if 'is_active' in apres:
+        changes.append(f"Compte {'activé' if apres['is_active'] else 'désactivé'}")
+    changes += decrire_modifications(avant, apres, {'user_role': 'Rôle'})
+    if changes:
+        return f"Modification du collaborateur {instance.get_full_name()}: {', '.join(changes)}"
+    return None
+
+
+def decrire_modification_atelier(instance, avant, apres):
+    changes = decrire_modifications(avant, apres, {
+        'nom_atelier': 'Nom', 'type_atelier': 'Type', 'responsable_atelier': 'Responsable',
+    })
+    if changes:
+        return f"Modification de l'atelier {instance.nom_atelier}: {', '.join(changes)}"
+    return None
 
 
 class NotificationService:
@@ -27,40 +98,88 @@ class NotificationService:
     
     @staticmethod
     def creer_notification_pour_role(role_name, type_notif, titre, message, url_action=None, objet=None):
-        """Crée des notifications pour tous les utilisateurs ayant un rôle spécifique"""
-        try:
-            from apps.core.models import Role
-            role = Role.objects.get(name=role_name)
-            collaborateurs = Collaborateur.objects.filter(user_role=role, is_active=True)
-            
-            notifications = []
-            for collaborateur in collaborateurs:
-                notification = Notification(
-                    destinataire=collaborateur,
-                    type_notification=type_notif,
-                    titre=titre,
-                    message=message,
-                    url_action=url_action
-                )
-                
-                if objet:
-                    notification.content_type = ContentType.objects.get_for_model(objet)
-                    notification.object_id = objet.pk
-                
-                notifications.append(notification)
-            
-            if notifications:  # CORRECTION: Vérifier avant bulk_create
-                Notification.objects.bulk_create(notifications)
-            return len(notifications)
-        except Exception as e:
-            print(f"Erreur lors de la création des notifications pour le rôle {role_name}: {e}")
+        """
+        Programme des notifications pour tous les utilisateurs ayant un rôle spécifique.
+        La diffusion n'a lieu qu'après le commit de la transaction courante :
+        via la file TacheNotification (NOTIFICATION_JOBS_ENABLED, par défaut), sinon directement.
+        """
+        content_type = ContentType.objects.get_for_model(objet) if objet else None
+        object_id = objet.pk if objet else None
+        
+        def planifier():
+            try:
+                if getattr(settings, 'NOTIFICATION_JOBS_ENABLED', True):
+                    enqueue_role_notification(
+                        role_name, type_notif, titre, message, url_action,
+                        content_type=content_type, object_id=object_id,
+                    )
+                else:
+                    NotificationService.diffuser_notification_role(
+                        role_name, type_notif, titre, message, url_action,
+                        content_type_id=content_type.pk if content_type else None, object_id=object_id,
+                    )
+            except Exception as e:
+                print(f"Erreur lors de la création des notifications pour le rôle {role_name}: {e}")
+        
+        transaction.on_commit(planifier)
+    
+    @staticmethod
+    def diffuser_notification_role(role_name, type_notif, titre, message, url_action=None,
+                                   content_type_id=None, object_id=None):
+        """
+        Crée les notifications de tous les membres actifs du rôle, selon leurs
+        préférences, et retourne le nombre de notifications créées immédiatement
+        """
+        from apps.core.models import Role
+        role = Role.objects.filter(name=role_name).first()
+        if role is None:
             return 0
+        destinataires = Collaborateur.objects.filter(
+            user_role=role, is_active=True
+        ).values_list('pk', flat=True)
+        
+        notifications = [
+            Notification(
+                destinataire_id=destinataire_id,
+                type_notification=type_notif,
+                titre=titre,
+                message=message,
+                url_action=url_action,
+                content_type_id=content_type_id,
+                object_id=object_id,
+            )
+            for destinataire_id in destinataires
+        ]
+        return NotificationService.creer_notifications(notifications)
+    
+    @staticmethod
+    def creer_notifications(notifications):
+        """
+        Enregistre en un seul INSERT des notifications non enregistrées (un seul
+        destinataire chacune), selon les préférences ; retourne le nombre créé
+        """
+        notifications = trier_notifications(notifications)
+        
+        if notifications:  # CORRECTION: Vérifier avant bulk_create
+            Notification.objects.bulk_create(notifications)
+            # bulk_create n'envoie pas post_save
+            compteurs = {}
+            for notification in notifications:
+                total, non_lues = compteurs.get(notification.destinataire_id, (0, 0))
+                compteurs[notification.destinataire_id] = (total + 1, non_lues + 1)
+            CompteurNotification.ajuster(compteurs)
+            trim_notifications(list(compteurs))
+            publish_notifications(notifications)
+        return len(notifications)
     
     @staticmethod
     def creer_notification_individuelle(utilisateur, type_notif, titre, message, url_action=None, objet=None):
-        """Crée une notification pour un utilisateur spécifique"""
+        """
+        Crée une notification pour un utilisateur spécifique, selon ses préférences
+        (retourne None si elle est écartée ou mise en attente pour un résumé)
+        """
         try:
-            notification = Notification.objects.create(
+            notification = Notification(
                 destinataire=utilisateur,
                 type_notification=type_notif,
                 titre=titre,
@@ -71,8 +190,13 @@ class NotificationService:
             if objet:
                 notification.content_type = ContentType.objects.get_for_model(objet)
                 notification.object_id = objet.pk
-                notification.save()
             
+            if not trier_notifications([notification]):
+                return None
+            
+            notification.save()
+            trim_notifications([notification.destinataire_id])
+            publish_notifications([notification])
             return notification
         except Exception as e:
             print(f"Erreur lors de la création de la notification: {e}")
@@ -122,26 +246,6 @@ def log_user_logout(sender, request, user, **kwargs):
 
 # ========== SIGNAUX POUR LES LANCEMENTS ==========
 
-@receiver(pre_save, sender='lancements.Lancement')  # CORRECTION: Utilisation du string pour éviter l'import circulaire
-def store_lancement_before_save(sender, instance, **kwargs):
-    """Stocke les données avant modification d'un lancement"""
-    if instance.pk:
-        try:
-            from apps.lancements.models import Lancement
-            old_instance = Lancement.objects.get(pk=instance.pk)
-            _thread_locals.old_lancement = {
-                'num_lanc': old_instance.num_lanc,
-                'statut': old_instance.statut,
-                'atelier': str(old_instance.atelier),
-                'collaborateur': str(old_instance.collaborateur),
-                'poids_debitage': float(old_instance.poids_debitage) if old_instance.poids_debitage else 0,
-                'poids_assemblage': float(old_instance.poids_assemblage) if old_instance.poids_assemblage else 0,
-            }
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde des données avant modification: {e}")
-            _thread_locals.old_lancement = None
-
-
 @receiver(post_save, sender='lancements.Lancement')
 def handle_lancement_save(sender, instance, created, **kwargs):
     """Gère la création/modification des lancements"""
@@ -203,56 +307,38 @@ def handle_lancement_save(sender, instance, created, **kwargs):
                     print(f"Erreur lors du calcul du poids total: {e}")
         
         else:
-            # Lancement modifié
-            old_data = getattr(_thread_locals, 'old_lancement', {})
-            changes = []
+            # Lancement modifié : comparaison avec les valeurs chargées, sans relecture
+            changements = instance.changed_fields(kwargs.get('update_fields'))
+            if not changements:
+                return
+            avant, apres = get_donnees_modifiees(instance, changements)
             
-            # Détecter les changements significatifs
-            if old_data.get('statut') != instance.statut:
-                changes.append(f"Statut: {old_data.get('statut')} → {instance.statut}")
-                
-                # Notification spéciale pour changement de statut
-                if instance.statut == 'termine':
-                    NotificationService.creer_notification_pour_role(
-                        role_name='Manager',
-                        type_notif='success',
-                        titre='Lancement terminé',
-                        message=f'Le lancement {instance.num_lanc} a été marqué comme terminé',
-                        url_action=f'/lancements/{instance.pk}/',
-                        objet=instance
-                    )
+            # Journalisé en fin de requête, fusionné avec les autres modifications du lancement
+            enqueue_change(
+                instance, 'lancements', avant, apres, decrire_modification_lancement,
+                utilisateur=utilisateur, request=request
+            )
             
-            if old_data.get('collaborateur') != str(instance.collaborateur):
-                changes.append(f"Collaborateur: {old_data.get('collaborateur')} → {instance.collaborateur}")
-                
-                # Notification au nouveau collaborateur
-                if hasattr(instance, 'collaborateur') and instance.collaborateur:
-                    NotificationService.creer_notification_individuelle(
-                        utilisateur=instance.collaborateur,
-                        type_notif='info',
-                        titre='Lancement réassigné',
-                        message=f'Le lancement {instance.num_lanc} vous a été réassigné',
-                        url_action=f'/lancements/{instance.pk}/',
-                        objet=instance
-                    )
+            # Notification spéciale pour changement de statut
+            if 'statut' in changements and instance.statut == 'termine':
+                NotificationService.creer_notification_pour_role(
+                    role_name='Manager',
+                    type_notif='success',
+                    titre='Lancement terminé',
+                    message=f'Le lancement {instance.num_lanc} a été marqué comme terminé',
+                    url_action=f'/lancements/{instance.pk}/',
+                    objet=instance
+                )
             
-            if changes:
-                Activite.log_activity(
-                    utilisateur=utilisateur,
-                    action='update',
-                    module='lancements',
-                    description=f"Modification du lancement {instance.num_lanc}: {', '.join(changes)}",
-                    objet=instance,
-                    request=request,
-                    donnees_avant=old_data,
-                    donnees_après={
-                        'num_lanc': instance.num_lanc,
-                        'statut': instance.statut,
-                        'atelier': str(instance.atelier) if hasattr(instance, 'atelier') else '',
-                        'collaborateur': str(instance.collaborateur) if hasattr(instance, 'collaborateur') else '',
-                        'poids_debitage': float(instance.poids_debitage) if hasattr(instance, 'poids_debitage') and instance.poids_debitage else 0,
-                        'poids_assemblage': float(instance.poids_assemblage) if hasattr(instance, 'poids_assemblage') and instance.poids_assemblage else 0,
-                    }
+            # Notification au nouveau collaborateur
+            if 'collaborateur' in changements and instance.collaborateur_id:
+                NotificationService.creer_notification_individuelle(
+                    utilisateur=instance.collaborateur,
+                    type_notif='info',
+                    titre='Lancement réassigné',
+                    message=f'Le lancement {instance.num_lanc} vous a été réassigné',
+                    url_action=f'/lancements/{instance.pk}/',
+                    objet=instance
                 )
     
     except Exception as e:
@@ -440,52 +526,26 @@ class ActivityMiddleware:
         self.get_response = get_response
     
     def __call__(self, request):
-        set_current_request(request)
+        token = set_current_request(request)
         try:
-            response = self.get_response(request)
+            # Les activités de la requête sont écrites en un seul lot à la fin
+            with activity_buffer():
+                response = self.get_response(request)
         finally:
-            set_current_request(None)
+            reset_current_request(token)
         return response
 
 
 # ========== NETTOYAGE AUTOMATIQUE ==========
 
-def nettoyer_anciennes_notifications():
-    """Nettoie les notifications anciennes (à exécuter via cron ou celery)"""
+def nettoyer_anciennes_notifications(chunk_size=5000, pause=0, progress=None):
+    """
+    Nettoie les notifications anciennes (à exécuter via cron ou celery).
+    Durées lues dans NOTIFICATIONS_RETENTION_DAYS (lues) et
+    NOTIFICATIONS_UNREAD_RETENTION_DAYS (non lues) ; suppression par tranches.
+    """
     try:
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Supprimer les notifications lues de plus de 30 jours
-        date_limite_lues = timezone.now() - timedelta(days=30)
-        notifications_lues = Notification.objects.filter(
-            lu=True,
-            date_lecture__lt=date_limite_lues
-        )
-        count_lues = notifications_lues.count()
-        notifications_lues.delete()
-        
-        # Supprimer les notifications non lues de plus de 90 jours
-        date_limite_non_lues = timezone.now() - timedelta(days=90)
-        notifications_non_lues = Notification.objects.filter(
-            lu=False,
-            date_creation__lt=date_limite_non_lues
-        )
-        count_non_lues = notifications_non_lues.count()
-        notifications_non_lues.delete()
-        
-        # Supprimer les notifications expirées
-        notifications_expirees = Notification.objects.filter(
-            date_expiration__lt=timezone.now()
-        )
-        count_expirees = notifications_expirees.count()
-        notifications_expirees.delete()
-        
-        return {
-            'notifications_lues_supprimees': count_lues,
-            'notifications_non_lues_supprimees': count_non_lues,
-            'notifications_expirees_supprimees': count_expirees
-        }
+        return purge_notifications(chunk_size=chunk_size, pause=pause, progress=progress)
     
     except Exception as e:
         print(f"Erreur lors du nettoyage des notifications: {e}")
@@ -496,48 +556,24 @@ def nettoyer_anciennes_notifications():
         }
 
 
-def nettoyer_anciennes_activites():
-    """Nettoie les activités anciennes"""
+def nettoyer_anciennes_activites(chunk_size=5000, pause=0, progress=None):
+    """Nettoie les activités plus anciennes que ACTIVITIES_RETENTION_DAYS, par tranches"""
     try:
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Garder seulement les activités des 6 derniers mois
-        date_limite = timezone.now() - timedelta(days=180)
-        activites_anciennes = Activite.objects.filter(date_creation__lt=date_limite)
-        count = activites_anciennes.count()
-        activites_anciennes.delete()
-        
-        return count
+        return purge_activities(chunk_size=chunk_size, pause=pause, progress=progress)
     
     except Exception as e:
         print(f"Erreur lors du nettoyage des activités: {e}")
         return 0
-# ========== SIGNAUX POUR LES MODIFICATIONS DE COLLABORATEURS ==========
 
-@receiver(pre_save, sender=Collaborateur)
-def store_collaborateur_before_save(sender, instance, **kwargs):
-    """Stocke les données avant modification d'un collaborateur"""
-    if instance.pk:
-        try:
-            old_instance = Collaborateur.objects.get(pk=instance.pk)
-            _thread_locals.old_collaborateur = {
-                'nom_collaborateur': old_instance.nom_collaborateur,
-                'prenom_collaborateur': old_instance.prenom_collaborateur,
-                'email': old_instance.email,
-                'is_active': old_instance.is_active,
-                'user_role': str(old_instance.user_role) if old_instance.user_role else None,
-                'poste': getattr(old_instance, 'poste', None),
-                'telephone': getattr(old_instance, 'telephone', None),
-            }
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde des données collaborateur: {e}")
-            _thread_locals.old_collaborateur = None
 
+# ========== SIGNAUX POUR LES MODIFICATIONS DE COLLABORATEURS ==========
 
 @receiver(post_save, sender=Collaborateur)
 def handle_collaborateur_update(sender, instance, created, **kwargs):
     """Gère les modifications de collaborateurs (complément du signal existant)"""
+    # L'instantané utilisé par CollaborateurBackend.get_user n'est plus à jour
+    invalidate_cached_user(instance.pk)
+    
     if not created:  # Modification uniquement
         try:
             request = get_current_request()
@@ -546,24 +582,20 @@ def handle_collaborateur_update(sender, instance, created, **kwargs):
             if request and hasattr(request, 'user') and request.user.is_authenticated:
                 utilisateur = request.user if isinstance(request.user, Collaborateur) else getattr(request.user, 'collaborateur', None)
             
-            old_data = getattr(_thread_locals, 'old_collaborateur', {})
-            changes = []
-            
-            # Détecter les changements significatifs
-            if old_data.get('nom_collaborateur') != instance.nom_collaborateur:
-                changes.append(f"Nom: {old_data.get('nom_collaborateur')} → {instance.nom_collaborateur}")
-            
-            if old_data.get('prenom_collaborateur') != instance.prenom_collaborateur:
-                changes.append(f"Prénom: {old_data.get('prenom_collaborateur')} → {instance.prenom_collaborateur}")
+            # Comparaison avec les valeurs chargées (un save(update_fields=['last_login']) ne change rien)
+            changements = instance.changed_fields(kwargs.get('update_fields'))
+            if not changements:
+                return
+            avant, apres = get_donnees_modifiees(instance, changements)
             
-            if old_data.get('email') != instance.email:
-                changes.append(f"Email: {old_data.get('email')} → {instance.email}")
+            # Journalisé en fin de requête, fusionné avec les autres modifications du collaborateur
+            enqueue_change(
+                instance, 'collaborateurs', avant, apres, decrire_modification_collaborateur,
+                utilisateur=utilisateur, request=request
+            )
             
-            if old_data.get('is_active') != instance.is_active:
-                status = "activé" if instance.is_active else "désactivé"
-                changes.append(f"Compte {status}")
-                
-                # Notification spéciale pour changement de statut
+            # Notification spéciale pour changement de statut
+            if 'is_active' in changements:
                 if instance.is_active:
                     NotificationService.creer_notification_individuelle(
                         utilisateur=instance,
@@ -579,34 +611,13 @@ def handle_collaborateur_update(sender, instance, created, **kwargs):
                         message=f'Le compte de {instance.get_full_name()} a été désactivé',
                     )
             
-            if old_data.get('user_role') != str(instance.user_role):
-                changes.append(f"Rôle: {old_data.get('user_role')} → {instance.user_role}")
-                
-                # Notification au collaborateur pour changement de rôle
-                if instance.user_role:
-                    NotificationService.creer_notification_individuelle(
-                        utilisateur=instance,
-                        type_notif='info',
-                        titre='Rôle mis à jour',
-                        message=f'Votre rôle a été mis à jour : {instance.user_role.name}',
-                    )
-            
-            if changes:
-                Activite.log_activity(
-                    utilisateur=utilisateur,
-                    action='update',
-                    module='collaborateurs',
-                    description=f"Modification du collaborateur {instance.get_full_name()}: {', '.join(changes)}",
-                    objet=instance,
-                    request=request,
-                    donnees_avant=old_data,
-                    donnees_après={
-                        'nom_collaborateur': instance.nom_collaborateur,
-                        'prenom_collaborateur': instance.prenom_collaborateur,
-                        'email': instance.email,
-                        'is_active': instance.is_active,
-                        'user_role': str(instance.user_role) if instance.user_role else None,
-                    }
+            # Notification au collaborateur pour changement de rôle
+            if 'user_role' in changements and instance.user_role:
+                NotificationService.creer_notification_individuelle(
+                    utilisateur=instance,
+                    type_notif='info',
+                    titre='Rôle mis à jour',
+                    message=f'Votre rôle a été mis à jour : {instance.user_role.name}',
                 )
         
         except Exception as e:
@@ -616,6 +627,8 @@ def handle_collaborateur_update(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=Collaborateur)
 def handle_collaborateur_delete(sender, instance, **kwargs):
     """Gère la suppression des collaborateurs"""
+    invalidate_cached_user(instance.pk)
+    
     try:
         request = get_current_request()
         utilisateur = None
@@ -645,25 +658,6 @@ def handle_collaborateur_delete(sender, instance, **kwargs):
 
 # ========== SIGNAUX POUR LES ATELIERS (COMPLÉTER) ==========
 
-@receiver(pre_save, sender='ateliers.Atelier')
-def store_atelier_before_save(sender, instance, **kwargs):
-    """Stocke les données avant modification d'un atelier"""
-    if instance.pk:
-        try:
-            from apps.ateliers.models import Atelier
-            old_instance = Atelier.objects.get(pk=instance.pk)
-            _thread_locals.old_atelier = {
-                'nom_atelier': old_instance.nom_atelier,
-                'type_atelier': old_instance.type_atelier,
-                'responsable_atelier': str(old_instance.responsable_atelier) if old_instance.responsable_atelier else None,
-                'localisation': getattr(old_instance, 'localisation', None),
-                'capacite': getattr(old_instance, 'capacite', None),
-            }
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde des données atelier: {e}")
-            _thread_locals.old_atelier = None
-
-
 @receiver(post_save, sender='ateliers.Atelier')
 def handle_atelier_update(sender, instance, created, **kwargs):
     """Gère les créations/modifications d'ateliers"""
@@ -686,41 +680,27 @@ def handle_atelier_update(sender, instance, created, **kwargs):
                     objet=instance
                 )
         else:
-            # Modification
-            old_data = getattr(_thread_locals, 'old_atelier', {})
-            changes = []
-            
-            if old_data.get('nom_atelier') != instance.nom_atelier:
-                changes.append(f"Nom: {old_data.get('nom_atelier')} → {instance.nom_atelier}")
+            # Modification : comparaison avec les valeurs chargées, sans relecture
+            changements = instance.changed_fields(kwargs.get('update_fields'))
+            if not changements:
+                return
+            avant, apres = get_donnees_modifiees(instance, changements)
             
-            if old_data.get('responsable_atelier') != str(instance.responsable_atelier):
-                changes.append(f"Responsable: {old_data.get('responsable_atelier')} → {instance.responsable_atelier}")
-                
-                # Notification au nouveau responsable
-                if hasattr(instance, 'responsable_atelier') and instance.responsable_atelier:
-                    NotificationService.creer_notification_individuelle(
-                        utilisateur=instance.responsable_atelier,
-                        type_notif='info',
-                        titre='Responsabilité d\'atelier assignée',
-                        message=f'Vous êtes maintenant responsable de l\'atelier {instance.nom_atelier}',
-                        url_action=f'/ateliers/{instance.pk}/',
-                        objet=instance
-                    )
+            # Journalisé en fin de requête, fusionné avec les autres modifications de l'atelier
+            enqueue_change(
+                instance, 'ateliers', avant, apres, decrire_modification_atelier,
+                utilisateur=utilisateur, request=request
+            )
             
-            if changes:
-                Activite.log_activity(
-                    utilisateur=utilisateur,
-                    action='update',
-                    module='ateliers',
-                    description=f"Modification de l'atelier {instance.nom_atelier}: {', '.join(changes)}",
-                    objet=instance,
-                    request=request,
-                    donnees_avant=old_data,
-                    donnees_après={
-                        'nom_atelier': instance.nom_atelier,
-                        'type_atelier': instance.type_atelier,
-                        'responsable_atelier': str(instance.responsable_atelier) if instance.responsable_atelier else None,
-                    }
+            # Notification au nouveau responsable
+            if 'responsable_atelier' in changements and instance.responsable_atelier_id:
+                NotificationService.creer_notification_individuelle(
+                    utilisateur=instance.responsable_atelier,
+                    type_notif='info',
+                    titre='Responsabilité d\'atelier assignée',
+                    message=f'Vous êtes maintenant responsable de l\'atelier {instance.nom_atelier}',
+                    url_action=f'/ateliers/{instance.pk}/',
+                    objet=instance
                 )
     
     except Exception as e:
@@ -964,4 +944,91 @@ def handle_role_change(sender, instance, created, **kwargs):
             )
         
         except Exception as e:
-            print(f"Erreur dans handle_role_change: {e}")
\ No newline at end of file
+            print(f"Erreur dans handle_role_change: {e}")
+
+
+# ========== SYNCHRONISATION DU MASQUE ET DU CACHE DES PERMISSIONS ==========
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def handle_role_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recalcule le masque des rôles concernés et invalide le cache"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            masks = Role.refresh_permissions_masks([instance.pk])
+        else:
+            # Modification depuis la permission : pk_set contient les rôles (None pour clear)
+            masks = Role.refresh_permissions_masks(pk_set if action != 'post_clear' else None)
+        for role_id in masks:
+            invalidate_cached_role(role_id)
+        invalidate_role_permissions()
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def handle_permission_change(sender, instance, **kwargs):
+    """Recalcule les masques quand une permission est modifiée ou supprimée"""
+    for role_id in Role.refresh_permissions_masks():
+        invalidate_cached_role(role_id)
+    invalidate_role_permissions()
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def handle_role_save_or_delete(sender, instance, **kwargs):
+    """Invalide le cache quand un rôle est modifié ou supprimé"""
+    invalidate_cached_role(instance.pk)
+    invalidate_role_permissions()
+
+
+# ========== INVALIDATION DES STATISTIQUES DU DASHBOARD ==========
+
+@receiver(post_save, sender='lancements.Lancement')
+@receiver(post_delete, sender='lancements.Lancement')
+@receiver(post_save, sender='ateliers.Atelier')
+@receiver(post_delete, sender='ateliers.Atelier')
+@receiver(post_save, sender=Affaire)
+@receiver(post_delete, sender=Affaire)
+@receiver(post_save, sender=Collaborateur)
+@receiver(post_delete, sender=Collaborateur)
+def handle_dashboard_stats_change(sender, instance, **kwargs):
+    """Invalide les statistiques du dashboard quand les données comptées changent"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) == {'last_login'}:
+        # Connexion d'un utilisateur : aucun compteur n'est affecté
+        return
+    invalidate_dashboard_stats()
+
+
+@receiver(post_save, sender=Activite)
+@receiver(post_delete, sender=Activite)
+def handle_activite_change(sender, instance, **kwargs):
+    """Invalide la liste des activités récentes"""
+    invalidate_activites_recentes()
+
+
+@receiver(post_save, sender=PreferenceNotification)
+@receiver(post_delete, sender=PreferenceNotification)
+def handle_preference_notification_change(sender, instance, **kwargs):
+    """Invalide les préférences en cache utilisées par trier_notifications"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) == {'date_dernier_resume'}:
+        # Envoi d'un résumé : date relue en base par creer_resumes, hors cache
+        return
+    invalidate_preferences(instance.utilisateur_id)
+
+
+# ========== VERSION ET COMPTEURS DES NOTIFICATIONS ==========
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def handle_notification_change(sender, instance, **kwargs):
+    """Tient à jour les compteurs et la version des notifications du destinataire"""
+    # Création ou suppression individuelle (les traitements en masse ajustent eux-mêmes)
+    created = kwargs.get('created')
+    if created or created is None:
+        sens = 1 if created else -1
+        CompteurNotification.ajuster({
+            instance.destinataire_id: (sens, 0 if instance.lu else sens)
+        })
+    else:
+        bump_notification_version(instance.destinataire_id)
@@ -0,0 +1,144 @@
+"""
+Statistiques des lancements et statistiques globales du tableau de bord.
+
+Les valeurs sont mises en cache pour une courte durée
+(DASHBOARD_STATS_CACHE_TIMEOUT) et invalidées par les signaux post_save /
+post_delete des modèles concernés (voir apps/core/signals.py).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+STATS_CACHE_KEY = 'core:dashboard:stats'
+ACTIVITES_CACHE_KEY = 'core:dashboard:activites'
+
+
+def _get_timeout():
+    return getattr(settings, 'DASHBOARD_STATS_CACHE_TIMEOUT', 60)
+
+
+def get_lancement_counters(queryset=None, since=None):
+    """
+    Calcule en une seule requête (agrégation conditionnelle) les compteurs
+    d'un ensemble de lancements : total, répartition par statut et par type
+    de production, poids cumulés. Si `since` est fourni, ajoute le nombre de
+    lancements dont la date de lancement est postérieure ou égale.
+    """
+    if queryset is None:
+        from apps.lancements.models import Lancement
+        queryset = Lancement.objects.all()
+    
+    aggregates = {
+        'total': Count('pk'),
+        'planifies': Count('pk', filter=Q(statut='planifie')),
+        'en_cours': Count('pk', filter=Q(statut='en_cours')),
+        'termines': Count('pk', filter=Q(statut='termine')),
+        'en_attente': Count('pk', filter=Q(statut='en_attente')),
+        'assemblage': Count('pk', filter=Q(type_production='assemblage')),
+        'debitage': Count('pk', filter=Q(type_production='debitage')),
+        'poids_assemblage': Sum('poids_assemblage', filter=Q(type_production='assemblage')),
+        'poids_debitage_1': Sum('poids_debitage_1', filter=Q(type_production='debitage')),
+        'poids_debitage_2': Sum('poids_debitage_2', filter=Q(type_production='debitage')),
+    }
+    if since is not None:
+        aggregates['depuis'] = Count('pk', filter=Q(date_lancement__gte=since))
+    
+    counters = queryset.order_by().aggregate(**aggregates)
+    
+    # Même logique que Lancement.get_poids_total()
+    for key in ('poids_assemblage', 'poids_debitage_1', 'poids_debitage_2'):
+        counters[key] = float(counters[key] or 0)
+    counters['poids_debitage'] = counters['poids_debitage_1'] + counters['poids_debitage_2']
+    counters['poids_total'] = counters['poids_assemblage'] + counters['poids_debitage']
+    return counters
+
+
+def compute_dashboard_stats():
+    """Calcule les statistiques globales du tableau de bord (une requête par table)"""
+    today = timezone.now().date()
+    week_ago = today - timedelta(days=7)
+    
+    try:
+        from apps.collaborateurs.models import Collaborateur
+        from apps.ateliers.models import Atelier
+        from .models import Affaire
+        
+        lancements = get_lancement_counters(since=week_ago)
+        collaborateurs = Collaborateur.objects.order_by().aggregate(
+            total=Count('pk'),
+            actifs=Count('pk', filter=Q(is_active=True)),
+        )
+        affaires = Affaire.objects.order_by().aggregate(
+            total=Count('pk'),
+            actives=Count('pk', filter=Q(statut='en_cours')),
+        )
+        
+        return {
+            # Stats des lancements
+            'total_lancements': lancements['total'],
+            'lancements_en_cours': lancements['en_cours'],
+            'lancements_termines': lancements['termines'],
+            'lancements_cette_semaine': lancements['depuis'],
+            # Stats des collaborateurs
+            'total_collaborateurs': collaborateurs['total'],
+            'collaborateurs_actifs': collaborateurs['actifs'],
+            # Stats des ateliers
+            'total_ateliers': Atelier.objects.count(),
+            # Stats des affaires
+            'total_affaires': affaires['total'],
+            'affaires_actives': affaires['actives'],
+        }
+    
+    except ImportError as e:
+        # En cas d'erreur d'import (migrations non effectuées, etc.)
+        print(f"Erreur d'import dans les statistiques du dashboard: {e}")
+        return {
+            'total_lancements': 0,
+            'lancements_en_cours': 0,
+            'lancements_termines': 0,
+            'lancements_cette_semaine': 0,
+            'total_collaborateurs': 0,
+            'collaborateurs_actifs': 0,
+            'total_ateliers': 0,
+            'total_affaires': 0,
+            'affaires_actives': 0,
+        }
+
+
+def get_dashboard_stats():
+    """Retourne les statistiques globales depuis le cache (une lecture)"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(STATS_CACHE_KEY, stats, _get_timeout())
+    return stats
+
+
+def get_activites_recentes():
+    """Retourne les 15 dernières activités depuis le cache"""
+    activites = cache.get(ACTIVITES_CACHE_KEY)
+    if activites is None:
+        from .models import Activite
+        queryset = Activite.objects.select_related(
+            'utilisateur', 'content_type'
+        ).defer('search_vector').order_by('-date_creation')
+        # Borne sur date_creation : seules les partitions récentes sont lues (ACTIVITE_PARTITIONING)
+        depuis = timezone.now() - timedelta(days=31)
+        activites = list(queryset.filter(date_creation__gte=depuis)[:15])
+        if len(activites) < 15:
+            activites = list(queryset[:15])
+        cache.set(ACTIVITES_CACHE_KEY, activites, _get_timeout())
+    return activites
+
+
+def invalidate_dashboard_stats():
+    """Invalide les statistiques en cache"""
+    cache.delete(STATS_CACHE_KEY)
+
+
+def invalidate_activites_recentes():
+    """Invalide les activités récentes en cache"""
+    cache.delete(ACTIVITES_CACHE_KEY)
@@ -1,3 +1,709 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.messages import get_messages
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.ateliers.models import Atelier, Categorie
+from apps.collaborateurs.backends import USER_CACHE_KEY, CollaborateurBackend
+from apps.collaborateurs.models import Collaborateur
+from apps.core.middleware import build_url_permission_table
+from apps.core.models import (
+    PERMISSION_BITS, Activite, Affaire, CompteurNotification, EvenementNotification, Notification, Permission,
+    PreferenceNotification, Role, VersionCache,
+)
+from apps.core.signals import (
+    get_current_request, get_donnees_modifiees, reset_current_request, set_current_request,
+)
+from apps.core.utils import cache_versions
+from apps.core.utils.activity_writer import activity_buffer
+from apps.core.utils.digest import creer_resumes, trier_notifications
+from apps.core.utils import partitions, retention
+from apps.core.utils.pagination import KeysetPaginator
+from apps.core.utils.permission_cache import VERSION_KEY, get_role_permission_mask
+from apps.lancements.models import Lancement
+
+
+def creer_lancement(collaborateur, **kwargs):
+    """Lancement minimal avec son affaire, son atelier et sa catégorie"""
+    valeurs = {
+        'num_lanc': 'LC-TEST-001',
+        'date_reception': date(2025, 1, 15),
+        'sous_livrable': 'Poutres',
+        'poids_assemblage': Decimal('10'),
+        'affaire': Affaire.objects.create(code_affaire='AFF-100'),
+        'atelier': Atelier.objects.create(nom_atelier='Atelier Sud', type_atelier='assemblage'),
+        'categorie': Categorie.objects.create(nom_categorie='Charpente'),
+        'collaborateur': collaborateur,
+    }
+    valeurs.update(kwargs)
+    return Lancement.objects.create(**valeurs)
+
+
+class PermissionMiddlewareTests(TestCase):
+    """Table URL → permission et refus dans process_view"""
+
+    def setUp(self):
+        # Rôle sans aucune permission
+        role = Role.objects.create(name='Sans droits')
+        self.user = Collaborateur.objects.create_user('lecteur@example.com', 'Martin', 'Paul', 'secret')
+        self.user.user_role = role
+        self.user.save()
+
+    def test_table_des_vues_decorees(self):
+        table = build_url_permission_table()
+        self.assertEqual(table['lancements:list'], ('lancements', 'read'))
+        self.assertEqual(table['lancements:create'], ('lancements', 'create'))
+        self.assertNotIn('admin:index', table)
+
+    def test_refus_avant_la_vue(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('lancements:create'))
+        self.assertRedirects(response, reverse('core:dashboard'), fetch_redirect_response=False)
+        # Message du middleware, pas celui du décorateur permission_required
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertEqual(messages, ["Vous n'avez pas les permissions nécessaires."])
+
+    def test_refus_ajax(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('lancements:list'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['message'], 'Permissions insuffisantes')
+
+
+class NotificationEtagTests(TestCase):
+    """ETag du polling des notifications, dérivé de CompteurNotification.version"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('etag@example.com', 'Durand', 'Léa', 'secret')
+        self.client.force_login(self.user)
+        self.url = reverse('core:notifications_json')
+
+    def test_304_tant_que_rien_ne_change(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_nouvel_etag_apres_creation(self):
+        etag = self.client.get(self.url)['ETag']
+        Notification.objects.create(destinataire=self.user, titre='Test', message='Nouvelle notification')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['count'], 1)
+
+
+class ActivityBufferTests(TestCase):
+    """Fusion des modifications par instance dans le tampon d'activités"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('suivi@example.com', 'Roux', 'Julie', 'secret')
+        self.lancement = creer_lancement(self.user)
+
+    def modifications(self):
+        return Activite.objects.filter(action='update', module='lancements')
+
+    def changer_statut(self, *statuts):
+        for statut in statuts:
+            self.lancement.statut = statut
+            self.lancement.save()
+
+    def test_modifications_fusionnees(self):
+        # Le tampon englobe les callbacks on_commit exécutés à la sortie du bloc interne
+        with activity_buffer(), self.captureOnCommitCallbacks(execute=True):
+            self.changer_statut('en_cours', 'termine')
+        activite = self.modifications().get()
+        self.assertEqual(activite.donnees_avant, {'statut': 'planifie'})
+        self.assertEqual(activite.donnees_après, {'statut': 'termine'})
+
+    def test_aller_retour_sans_activite(self):
+        with activity_buffer(), self.captureOnCommitCallbacks(execute=True):
+            self.changer_statut('en_cours', 'planifie')
+        self.assertFalse(self.modifications().exists())
+
+    def test_savepoint_annule_non_journalise(self):
+        with activity_buffer(), self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.changer_statut('en_cours')
+                    raise RuntimeError('annulation')
+            except RuntimeError:
+                pass
+        self.assertFalse(self.modifications().exists())
+
+
+class CurrentRequestTests(TestCase):
+    """Requête courante des signaux (ContextVar)"""
+
+    def test_reset_restaure_la_requete_englobante(self):
+        externe, interne = object(), object()
+        jeton_externe = set_current_request(externe)
+        try:
+            jeton = set_current_request(interne)
+            self.assertIs(get_current_request(), interne)
+            reset_current_request(jeton)
+            self.assertIs(get_current_request(), externe)
+        finally:
+            reset_current_request(jeton_externe)
+        self.assertIsNone(get_current_request())
+
+    def test_isolee_par_thread(self):
+        jeton = set_current_request(object())
+        vue = []
+        try:
+            thread = threading.Thread(target=lambda: vue.append(get_current_request()))
+            thread.start()
+            thread.join()
+        finally:
+            reset_current_request(jeton)
+        self.assertEqual(vue, [None])
+
+
+class FieldTrackerTests(TestCase):
+    """Suivi des modifications sans relecture (FieldTrackerMixin)"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('tracker@example.com', 'Leroy', 'Hugo', 'secret')
+        self.lancement = creer_lancement(self.user)
+
+    def test_last_login_ne_journalise_rien(self):
+        self.user.nom_collaborateur = 'Non enregistré'
+        self.user.last_login = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.user.changed_fields(['last_login']), {})
+        self.assertFalse(Activite.objects.filter(action='update', module='collaborateurs').exists())
+
+    def test_ancien_nom_d_une_cle_etrangere_en_une_requete(self):
+        ancien = self.lancement.atelier
+        self.lancement.atelier = Atelier.objects.create(nom_atelier='Atelier Est', type_atelier='debitage')
+        with self.assertNumQueries(1):
+            avant, apres = get_donnees_modifiees(self.lancement, self.lancement.changed_fields())
+        self.assertEqual((avant, apres), ({'atelier': str(ancien)}, {'atelier': 'Atelier Est'}))
+
+    def test_associations_seulement_si_les_cles_changent(self):
+        with mock.patch.object(Lancement, 'create_associations') as create_associations:
+            self.lancement.sous_livrable = 'Poutres renforcées'
+            self.lancement.save()
+            create_associations.assert_not_called()
+
+            self.lancement.categorie = Categorie.objects.create(nom_categorie='Serrurerie')
+            self.lancement.save()
+            create_associations.assert_called_once_with()
+
+    def test_refresh_from_db_reprend_l_instantane(self):
+        Lancement.objects.filter(pk=self.lancement.pk).update(statut='en_cours')
+        self.lancement.refresh_from_db()
+        self.assertEqual(self.lancement.changed_fields(), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lancement.save()
+        self.assertFalse(Activite.objects.filter(action='update', module='lancements').exists())
+
+
+class PermissionCacheTests(TestCase):
+    """Masques de permissions en cache local, versionnés en base"""
+
+    def setUp(self):
+        cache.clear()
+        cache_versions._versions.clear()
+        self.role = Role.objects.create(name='Lecteur')
+        self.permission = Permission.objects.create(name='Lire les lancements', module='lancements', action='read')
+
+    def test_aucune_requete_une_fois_en_cache(self):
+        get_role_permission_mask(self.role.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_role_permission_mask(self.role.pk), 0)
+
+    def test_invalidation_immediate_dans_le_processus(self):
+        get_role_permission_mask(self.role.pk)
+        self.role.permissions.add(self.permission)
+        self.assertEqual(get_role_permission_mask(self.role.pk), PERMISSION_BITS[('lancements', 'read')])
+
+    @override_settings(CACHE_VERSION_CHECK_INTERVAL=0)
+    def test_invalidation_par_un_autre_processus(self):
+        get_role_permission_mask(self.role.pk)
+        # Modification faite ailleurs : masque en base et version changés sans toucher ce processus
+        Role.objects.filter(pk=self.role.pk).update(permissions_mask=PERMISSION_BITS[('lancements', 'read')])
+        VersionCache.changer(VERSION_KEY, cache_versions.get_version(VERSION_KEY) + 1)
+        self.assertEqual(get_role_permission_mask(self.role.pk), PERMISSION_BITS[('lancements', 'read')])
+
+
+class UserSnapshotTests(TestCase):
+    """Instantané signé du collaborateur servi par CollaborateurBackend.get_user"""
+
+    def setUp(self):
+        cache.clear()
+        cache_versions._versions.clear()
+        self.backend = CollaborateurBackend()
+        self.user = Collaborateur.objects.create_user('snapshot@example.com', 'Petit', 'Anne', 'secret')
+        self.user.user_role = Role.objects.create(name='Opérateur')
+        self.user.save()
+
+    def test_instantane_sans_requete(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            collaborateur = self.backend.get_user(self.user.pk)
+        self.assertEqual(collaborateur.email, 'snapshot@example.com')
+        self.assertEqual(collaborateur.user_role.name, 'Opérateur')
+
+    def test_desactivation_invalide_l_instantane(self):
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.backend.get_user(self.user.pk).is_active)
+
+    @override_settings(CACHE_VERSION_CHECK_INTERVAL=0)
+    def test_desactivation_par_un_autre_processus(self):
+        self.backend.get_user(self.user.pk)
+        Collaborateur.objects.filter(pk=self.user.pk).update(is_active=False)
+        VersionCache.changer(USER_CACHE_KEY, cache_versions.get_version(USER_CACHE_KEY) + 1)
+        self.assertFalse(self.backend.get_user(self.user.pk).is_active)
+
+
+@override_settings(NOTIFICATIONS_DIGEST_ENABLED=True, NOTIFICATIONS_IMMEDIATE_TYPES=('warning', 'error'))
+class DigestTests(TestCase):
+    """Préférences de notification : catégories, période silencieuse et fréquence des résumés"""
+
+    def setUp(self):
+        cache.clear()
+        cache_versions._versions.clear()
+        self.user = Collaborateur.objects.create_user('digest@example.com', 'Garnier', 'Inès', 'secret')
+        self.content_type = ContentType.objects.get_for_model(Lancement)
+
+    def moment(self, heure, minute=0):
+        return timezone.make_aware(datetime(2025, 1, 15, heure, minute))
+
+    def notification(self, type_notification='info', objet=True):
+        return Notification(
+            destinataire=self.user,
+            type_notification=type_notification,
+            titre='Lancement modifié',
+            message='Le lancement LC-2025-001 a été modifié',
+            content_type=self.content_type if objet else None,
+            object_id=1 if objet else None,
+        )
+
+    def preferences(self, **kwargs):
+        return PreferenceNotification.objects.create(utilisateur=self.user, **kwargs)
+
+    def test_periode_silencieuse_a_cheval_sur_minuit(self):
+        pref = self.preferences(heure_debut_silencieux=time(22), heure_fin_silencieux=time(7))
+        self.assertTrue(pref.est_periode_silencieuse(self.moment(23)))
+        self.assertTrue(pref.est_periode_silencieuse(self.moment(6, 59)))
+        self.assertFalse(pref.est_periode_silencieuse(self.moment(7)))
+        self.assertFalse(pref.est_periode_silencieuse(self.moment(12)))
+
+    def test_periode_silencieuse_dans_la_journee(self):
+        pref = self.preferences(heure_debut_silencieux=time(12), heure_fin_silencieux=time(14))
+        self.assertTrue(pref.est_periode_silencieuse(self.moment(13)))
+        self.assertFalse(pref.est_periode_silencieuse(self.moment(14)))
+        self.assertFalse(pref.est_periode_silencieuse(self.moment(11, 59)))
+
+    def test_sans_preferences_tout_est_immediat(self):
+        notification = self.notification()
+        self.assertEqual(trier_notifications([notification]), [notification])
+        self.assertFalse(EvenementNotification.objects.exists())
+
+    def test_preferences_en_cache(self):
+        self.preferences(frequence_resume='immediate')
+        trier_notifications([self.notification()])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(trier_notifications([self.notification()])), 1)
+
+    def test_modification_des_preferences_invalide_le_cache(self):
+        pref = self.preferences(frequence_resume='immediate')
+        trier_notifications([self.notification()])
+        pref.notifications_lancements = False
+        pref.save()
+        self.assertEqual(trier_notifications([self.notification()]), [])
+
+    def test_categorie_desactivee(self):
+        self.preferences(frequence_resume='immediate', notifications_lancements=False)
+        self.assertEqual(trier_notifications([self.notification(type_notification='error')]), [])
+        # Sans objet lié, la notification relève de la catégorie système
+        self.assertEqual(len(trier_notifications([self.notification(objet=False)])), 1)
+        self.assertFalse(EvenementNotification.objects.exists())
+
+    def test_types_prioritaires_toujours_immediats(self):
+        self.preferences(frequence_resume='daily')
+        self.assertEqual(len(trier_notifications([self.notification(type_notification='warning')])), 1)
+        self.assertFalse(EvenementNotification.objects.exists())
+
+    def test_frequence_quotidienne_met_en_attente(self):
+        self.preferences(frequence_resume='daily')
+        self.assertEqual(trier_notifications([self.notification()]), [])
+        evenement = EvenementNotification.objects.get()
+        self.assertEqual((evenement.destinataire_id, evenement.categorie), (self.user.pk, 'lancements'))
+
+    def test_immediate_en_periode_silencieuse_met_en_attente(self):
+        self.preferences(frequence_resume='immediate', heure_debut_silencieux=time(22), heure_fin_silencieux=time(7))
+        with mock.patch('django.utils.timezone.now', return_value=self.moment(23)):
+            self.assertEqual(trier_notifications([self.notification()]), [])
+        self.assertEqual(EvenementNotification.objects.count(), 1)
+
+    def test_resume_du_selon_la_frequence(self):
+        maintenant = self.moment(12)
+        pref = self.preferences(frequence_resume='daily', date_dernier_resume=maintenant - timedelta(hours=2))
+        self.assertFalse(pref.resume_du(maintenant))
+        pref.date_dernier_resume = maintenant - timedelta(days=1)
+        self.assertTrue(pref.resume_du(maintenant))
+        pref.frequence_resume = 'hourly'
+        pref.date_dernier_resume = maintenant - timedelta(minutes=30)
+        self.assertFalse(pref.resume_du(maintenant))
+        pref.heure_debut_silencieux, pref.heure_fin_silencieux = time(11), time(13)
+        pref.date_dernier_resume = None
+        self.assertFalse(pref.resume_du(maintenant))
+
+    def test_creer_resumes(self):
+        pref = self.preferences(frequence_resume='daily')
+        trier_notifications([self.notification(), self.notification(objet=False)])
+        maintenant = timezone.now()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(creer_resumes(maintenant), 1)
+        resume = Notification.objects.get(destinataire=self.user)
+        self.assertEqual(resume.titre, 'Résumé : 2 notifications')
+        self.assertIn('Lancements : 1', resume.message)
+        self.assertFalse(EvenementNotification.objects.exists())
+        pref.refresh_from_db()
+        self.assertEqual(pref.date_dernier_resume, maintenant)
+
+        # Résumé quotidien déjà envoyé : le suivant attend le lendemain
+        trier_notifications([self.notification()])
+        self.assertEqual(creer_resumes(maintenant + timedelta(hours=1)), 0)
+        self.assertEqual(EvenementNotification.objects.count(), 1)
+
+
+class CompteurNotificationTests(TestCase):
+    """Compteurs dénormalisés des notifications (ajuster et reconcile_notification_counters)"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('compteur@example.com', 'Roux', 'Théo', 'secret')
+
+    def inserer(self, nb, lu=False):
+        """Notifications insérées sans signaux, comme par NotificationService.creer_notifications"""
+        Notification.objects.bulk_create([
+            Notification(destinataire=self.user, titre=f'Notification {i}', message='Test', lu=lu)
+            for i in range(nb)
+        ])
+
+    def test_ajuster_ligne_existante(self):
+        CompteurNotification.objects.create(utilisateur=self.user, total=5, non_lues=2)
+        CompteurNotification.ajuster({self.user.pk: (3, 1)})
+        compteur = CompteurNotification.objects.get(pk=self.user.pk)
+        self.assertEqual((compteur.total, compteur.non_lues, compteur.version), (8, 3, 1))
+
+    def test_ajuster_ignore_les_variations_nulles(self):
+        with self.assertNumQueries(0):
+            CompteurNotification.ajuster({self.user.pk: (0, 0)})
+
+    def test_ligne_manquante_initialisee_depuis_la_table(self):
+        self.inserer(2, lu=True)
+        self.inserer(3)
+        # Les 3 non lues viennent d'être insérées : la variation n'est pas comptée deux fois
+        CompteurNotification.ajuster({self.user.pk: (3, 3)})
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (5, 3))
+
+    def test_ligne_creee_par_une_transaction_concurrente(self):
+        self.inserer(2)
+        calculer = CompteurNotification.calculer
+
+        def concurrente(utilisateur_ids):
+            # Une autre transaction crée la ligne sans voir nos insertions non validées
+            CompteurNotification.objects.create(utilisateur_id=self.user.pk, total=0, non_lues=0)
+            return calculer(utilisateur_ids)
+
+        with mock.patch.object(CompteurNotification, 'calculer', side_effect=concurrente):
+            CompteurNotification.ajuster({self.user.pk: (2, 2)})
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (2, 2))
+
+    def test_reconcile_corrige_les_ecarts(self):
+        self.inserer(4)
+        CompteurNotification.objects.create(utilisateur=self.user, total=1, non_lues=7)
+        sortie = io.StringIO()
+        call_command('reconcile_notification_counters', stdout=sortie)
+        self.assertIn('total 1 -> 4, non lues 7 -> 4', sortie.getvalue())
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (4, 4))
+
+    def test_reconcile_dry_run(self):
+        self.inserer(4)
+        CompteurNotification.objects.create(utilisateur=self.user, total=1, non_lues=7)
+        call_command('reconcile_notification_counters', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (1, 7))
+
+
+class KeysetPaginatorTests(TestCase):
+    """Pagination par curseur sur (date_creation, id)"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('pages@example.com', 'Blanc', 'Zoé', 'secret')
+        debut = timezone.now() - timedelta(days=1)
+        self.notifications = []
+        for i in range(5):
+            notification = Notification.objects.create(destinataire=self.user, titre=f'N{i}', message='Test')
+            Notification.objects.filter(pk=notification.pk).update(date_creation=debut + timedelta(minutes=i))
+            self.notifications.append(notification.pk)
+        # Du plus récent au plus ancien
+        self.notifications.reverse()
+
+    def paginator(self):
+        return KeysetPaginator(Notification.objects.filter(destinataire=self.user), 2)
+
+    def pks(self, page):
+        return [notification.pk for notification in page]
+
+    def test_curseur_aller_retour(self):
+        paginator = self.paginator()
+        notification = Notification.objects.get(pk=self.notifications[0])
+        direction, date_creation, pk = paginator.decode_cursor(paginator.encode_cursor(notification, 'n'))
+        self.assertEqual((direction, date_creation, pk), ('n', notification.date_creation, notification.pk))
+
+    def test_curseur_falsifie_ou_invalide(self):
+        paginator = self.paginator()
+        curseur = paginator.encode_cursor(Notification.objects.get(pk=self.notifications[0]), 'n')
+        donnees, signature = curseur.rsplit(':', 1)
+        falsifie = f"{donnees}:{'A' if signature[0] != 'A' else 'B'}{signature[1:]}"
+        self.assertIsNone(paginator.decode_cursor(falsifie))
+        self.assertIsNone(paginator.decode_cursor('pas-un-curseur'))
+        self.assertIsNone(paginator.decode_cursor(signing.dumps(['x', timezone.now().isoformat(), 1], salt='core.pagination')))
+        # Curseur rejeté : première page
+        self.assertEqual(self.pks(paginator.page('pas-un-curseur')), self.notifications[:2])
+
+    def test_pages_suivantes_et_precedentes(self):
+        paginator = self.paginator()
+        premiere = paginator.page()
+        self.assertEqual(self.pks(premiere), self.notifications[:2])
+        self.assertTrue(premiere.has_next())
+        self.assertFalse(premiere.has_previous())
+        self.assertIsNone(premiere.previous_cursor)
+
+        deuxieme = paginator.page(premiere.next_cursor)
+        self.assertEqual(self.pks(deuxieme), self.notifications[2:4])
+        self.assertTrue(deuxieme.has_previous())
+
+        derniere = paginator.page(deuxieme.next_cursor)
+        self.assertEqual(self.pks(derniere), self.notifications[4:])
+        self.assertFalse(derniere.has_next())
+        self.assertIsNone(derniere.next_cursor)
+
+        retour = paginator.page(derniere.previous_cursor)
+        self.assertEqual(self.pks(retour), self.notifications[2:4])
+        self.assertTrue(retour.has_next())
+        self.assertTrue(retour.has_previous())
+
+        debut = paginator.page(retour.previous_cursor)
+        self.assertEqual(self.pks(debut), self.notifications[:2])
+        self.assertFalse(debut.has_previous())
+
+    def test_dates_identiques_departagees_par_id(self):
+        Notification.objects.filter(destinataire=self.user).update(date_creation=timezone.now())
+        paginator = self.paginator()
+        vues, page = [], paginator.page()
+        while True:
+            vues += self.pks(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(vues, sorted(self.notifications, reverse=True))
+
+    def test_curseur_precedent_sans_ligne_ramene_a_la_premiere_page(self):
+        paginator = self.paginator()
+        deuxieme = paginator.page(paginator.page().next_cursor)
+        curseur = deuxieme.previous_cursor
+        # Les notifications plus récentes ont été supprimées entre-temps
+        Notification.objects.filter(pk__in=self.notifications[:3]).delete()
+        page = paginator.page(curseur)
+        self.assertEqual(self.pks(page), self.notifications[3:5])
+        self.assertFalse(page.has_previous())
+
+    def test_curseur_suivant_sans_ligne_ramene_a_la_premiere_page(self):
+        paginator = self.paginator()
+        derniere = paginator.page(paginator.page(paginator.page().next_cursor).next_cursor)
+        curseur = paginator.encode_cursor(derniere.object_list[-1], 'n')
+        self.assertEqual(self.pks(paginator.page(curseur)), self.notifications[:2])
+
+
+class TrimNotificationsTests(TestCase):
+    """Plafond MAX_NOTIFICATIONS_PER_USER (trim_notifications)"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('plafond@example.com', 'Fontaine', 'Marc', 'secret')
+        debut = timezone.now() - timedelta(days=1)
+        # Deux non lues anciennes puis cinq lues, de la plus ancienne à la plus récente
+        self.pks = []
+        for i in range(7):
+            notification = Notification.objects.create(
+                destinataire=self.user, titre=f'N{i}', message='Test', lu=i >= 2
+            )
+            Notification.objects.filter(pk=notification.pk).update(date_creation=debut + timedelta(minutes=i))
+            self.pks.append(notification.pk)
+
+    def test_lues_au_dela_du_plafond_supprimees(self):
+        self.assertEqual(retention.trim_notifications([self.user.pk], cap=3), 2)
+        restantes = set(Notification.objects.filter(destinataire=self.user).values_list('pk', flat=True))
+        self.assertEqual(restantes, {self.pks[0], self.pks[1], self.pks[4], self.pks[5], self.pks[6]})
+
+    def test_non_lues_jamais_supprimees(self):
+        retention.trim_notifications([self.user.pk], cap=1)
+        self.assertEqual(Notification.objects.filter(destinataire=self.user, lu=False).count(), 2)
+        self.assertEqual(Notification.objects.filter(destinataire=self.user, lu=True).count(), 1)
+
+    def test_compteur_ajuste(self):
+        retention.trim_notifications([self.user.pk], cap=3)
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (5, 2))
+        self.assertEqual(CompteurNotification.calculer([self.user.pk])[self.user.pk], (5, 2))
+
+    def test_sous_le_plafond_rien_n_est_fait(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(retention.trim_notifications([self.user.pk], cap=10), 0)
+
+    def test_suppression_par_tranches(self):
+        with mock.patch.object(retention, 'TRIM_DELETE_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as requetes:
+                self.assertEqual(retention.trim_notifications([self.user.pk], cap=1), 4)
+        deletes = [q['sql'] for q in requetes.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 2)
+
+
+@override_settings(
+    NOTIFICATIONS_RETENTION_DAYS=30, NOTIFICATIONS_UNREAD_RETENTION_DAYS=90,
+    ACTIVITIES_RETENTION_DAYS=180, ACTIVITIES_ARCHIVE_ENABLED=False, ACTIVITE_PARTITIONING=False,
+)
+class RetentionPurgeTests(TestCase):
+    """Durées de conservation appliquées par tranches (purge_chunked)"""
+
+    def setUp(self):
+        self.user = Collaborateur.objects.create_user('purge@example.com', 'Bonnet', 'Lucie', 'secret')
+        self.now = timezone.now()
+
+    def notification(self, lu=False, age=0, lecture=None, expiration=None):
+        notification = Notification.objects.create(
+            destinataire=self.user, titre='Test', message='Test', lu=lu,
+            date_lecture=self.now - timedelta(days=lecture) if lecture is not None else None,
+            date_expiration=self.now + timedelta(days=expiration) if expiration is not None else None,
+        )
+        Notification.objects.filter(pk=notification.pk).update(date_creation=self.now - timedelta(days=age))
+        return notification.pk
+
+    def activites(self, nb, age):
+        pks = []
+        for i in range(nb):
+            activite = Activite.objects.create(action='create', module='system', description=f'Activité {i}')
+            Activite.objects.filter(pk=activite.pk).update(date_creation=self.now - timedelta(days=age))
+            pks.append(activite.pk)
+        return pks
+
+    def test_purge_exacte_par_categorie(self):
+        conservees = {
+            self.notification(lu=True, age=40, lecture=10),
+            self.notification(lu=False, age=60),
+            self.notification(expiration=5),
+        }
+        self.notification(lu=True, age=60, lecture=31)
+        self.notification(lu=False, age=91)
+        self.notification(lu=False, age=1, expiration=-1)
+
+        resultats = retention.purge_notifications(chunk_size=2)
+        self.assertEqual(resultats, {
+            'notifications_lues_supprimees': 1,
+            'notifications_non_lues_supprimees': 1,
+            'notifications_expirees_supprimees': 1,
+        })
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), conservees)
+        # Compteur cohérent avec la table
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (3, 2))
+        self.assertEqual(CompteurNotification.calculer([self.user.pk])[self.user.pk], (3, 2))
+
+    def test_compteur_manquant_recompte_sans_la_tranche(self):
+        self.notification(lu=False, age=91)
+        self.notification(lu=False, age=1)
+        CompteurNotification.objects.all().delete()
+        retention.purge_notifications()
+        self.assertEqual(CompteurNotification.get_compteurs(self.user.pk), (1, 1))
+
+    def test_tranches(self):
+        expirees = self.activites(5, age=200)
+        recentes = self.activites(2, age=10)
+        progression = []
+        total = retention.purge_chunked(
+            retention.get_activity_purge_queryset(), chunk_size=2,
+            progress=lambda pk, nb, cumul: progression.append((pk, nb, cumul)),
+        )
+        self.assertEqual(total, 5)
+        self.assertEqual(progression, [(expirees[1], 2, 2), (expirees[3], 2, 4), (expirees[4], 1, 5)])
+        self.assertEqual(set(Activite.objects.values_list('pk', flat=True)), set(recentes))
+
+    def test_reprise_apres_interruption(self):
+        self.activites(5, age=200)
+        appels = []
+
+        def interrompue(tranche):
+            appels.append(tranche)
+            if len(appels) == 2:
+                raise RuntimeError('Connexion perdue')
+            return retention._raw_delete(tranche)
+
+        with self.assertRaises(RuntimeError):
+            retention.purge_chunked(retention.get_activity_purge_queryset(), chunk_size=2, delete=interrompue)
+        # La première tranche est validée, la deuxième annulée
+        self.assertEqual(retention.get_activity_purge_queryset().count(), 3)
+
+        self.assertEqual(retention.purge_chunked(retention.get_activity_purge_queryset(), chunk_size=2), 3)
+        self.assertFalse(retention.get_activity_purge_queryset().exists())
+
+    def test_purge_activites(self):
+        self.activites(3, age=200)
+        recentes = self.activites(1, age=179)
+        self.assertEqual(retention.purge_activities(chunk_size=2), 3)
+        self.assertEqual(list(Activite.objects.values_list('pk', flat=True)), recentes)
+
+
+class PartitionNamingTests(SimpleTestCase):
+    """Noms et bornes des partitions mensuelles de la table activite"""
+
+    def test_mois(self):
+        self.assertEqual(partitions.month_start(date(2025, 2, 17)), date(2025, 2, 1))
+        self.assertEqual(partitions.add_months(date(2025, 11, 1), 2), date(2026, 1, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), 12), date(2026, 1, 1))
+
+    def test_nom(self):
+        self.assertEqual(partitions.partition_name(date(2025, 3, 1)), 'activite_2025_03')
+        self.assertEqual(partitions.partition_name(date(2025, 12, 1)), 'activite_2025_12')
+
+    @override_settings(TIME_ZONE='Europe/Paris')
+    def test_bornes_a_minuit_heure_locale(self):
+        debut, fin = partitions.partition_bounds(date(2025, 3, 1))
+        # Changement d'heure le 30 mars : +1 h puis +2 h par rapport à UTC
+        self.assertEqual(debut, datetime(2025, 2, 28, 23, tzinfo=dt_timezone.utc))
+        self.assertEqual(fin, datetime(2025, 3, 31, 22, tzinfo=dt_timezone.utc))
+
+    def test_lignes_de_la_partition_par_defaut_deplacees(self):
+        cursor = mock.Mock()
+        # Partition absente, partition par défaut présente et contenant des lignes du mois
+        cursor.fetchone.side_effect = [(False,), (True,), (True,)]
+        self.assertEqual(partitions._create_partition(cursor, date(2025, 3, 1)), 'activite_2025_03')
+        sql = [appel.args[0] for appel in cursor.execute.call_args_list]
+        self.assertIn('LOCK TABLE "activite_default"', sql[2])
+        self.assertTrue(sql[4].startswith('CREATE TABLE "activite_2025_03" (LIKE "activite"'))
+        self.assertIn('DELETE FROM "activite_default"', sql[5])
+        self.assertTrue(sql[6].startswith('ALTER TABLE "activite" ATTACH PARTITION "activite_2025_03"'))
+
+    def test_creation_directe_sans_ligne_a_deplacer(self):
+        cursor = mock.Mock()
+        cursor.fetchone.side_effect = [(False,), (True,), (False,)]
+        partitions._create_partition(cursor, date(2025, 3, 1))
+        sql = cursor.execute.call_args_list[-1].args[0]
+        self.assertTrue(sql.startswith('CREATE TABLE "activite_2025_03" PARTITION OF "activite"'))
@@ -40,6 +40,7 @@ urlpatterns = [
     # ========== URLS AJAX POUR NOTIFICATIONS ==========
     path('notifications/', views.NotificationsListView.as_view(), name='notifications_list'),
     path('notifications/json/', views.get_notifications_json, name='notifications_json'),
+    path('notifications/stream/', views.notifications_stream, name='notifications_stream'),
     
     path('notifications/<int:notification_id>/mark-read/', 
          views.marquer_notification_lue_alt, name='notification_mark_read'),
@@ -49,6 +50,7 @@ urlpatterns = [
     # Activités système
     path('activites/', views.ActivitesListView.as_view(), name='activites_list'),
     path('activites/json/', views.get_activites_recentes_json, name='activites_json'),
+    path('activites/archives/', views.activites_archivees, name='activites_archives'),
     
     # Utilitaires de développement
     path('notifications/test/', views.creer_notification_test, name='notification_test'),
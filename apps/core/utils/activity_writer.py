@@ -0,0 +1,246 @@
+"""
+Écriture différée du journal d'activités.
+
+Activite.log_activity ne fait plus d'INSERT dans la transaction de l'appelant :
+l'activité est construite en mémoire puis remise à l'écrivain au commit de la
+transaction (les activités d'une transaction annulée sont donc perdues, comme
+avec l'ancien INSERT). Selon ACTIVITY_LOG_MODE :
+
+- 'sync' : enregistrement immédiat, ligne par ligne (ancien comportement) ;
+- 'buffered' : les activités sont regroupées pendant la requête (ou un bloc
+  activity_buffer()) et insérées en un seul bulk_create à la fin ;
+- 'thread' : les lots sont confiés à un thread d'arrière-plan qui écrit toutes
+  les ACTIVITY_LOG_FLUSH_INTERVAL secondes via une file bornée. Si la file est
+  pleine, l'appelant écrit lui-même le lot pour ne rien perdre.
+
+Les modifications d'objets (enqueue_change) sont regroupées par instance dans
+le tampon : plusieurs enregistrements du même objet pendant une requête ne
+donnent qu'une activité (première valeur avant, dernière valeur après).
+Le tampon est une ContextVar : chaque requête (WSGI ou ASGI) et chaque thread
+a le sien ; une activité d'un savepoint annulé n'y entre jamais (on_commit).
+"""
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_buffer = ContextVar('activity_buffer', default=None)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_mode():
+    return getattr(settings, 'ACTIVITY_LOG_MODE', 'buffered')
+
+
+def write_activities(activities):
+    """Insère un lot d'activités en une requête"""
+    if not activities:
+        return
+    from apps.core.models import Activite
+    from apps.core.stats import invalidate_activites_recentes
+    try:
+        Activite.objects.bulk_create(
+            activities, batch_size=getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 500)
+        )
+        # bulk_create n'envoie pas post_save
+        invalidate_activites_recentes()
+    except Exception:
+        logger.exception("Erreur lors de l'écriture de %d activité(s)", len(activities))
+
+
+class ActivityWriterThread(threading.Thread):
+    """Thread d'arrière-plan qui vide périodiquement la file des activités"""
+
+    def __init__(self):
+        super().__init__(name='activity-writer', daemon=True)
+        self.queue = queue.Queue(maxsize=getattr(settings, 'ACTIVITY_LOG_QUEUE_SIZE', 10000))
+        self.flush_interval = getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2.0)
+        self.batch_size = getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 500)
+
+    def put(self, activities):
+        """Ajoute des activités à la file ; retourne celles qui n'ont pas pu y entrer"""
+        for index, activity in enumerate(activities):
+            try:
+                self.queue.put_nowait(activity)
+            except queue.Full:
+                return activities[index:]
+        return []
+
+    def drain(self):
+        """Retire de la file jusqu'à batch_size activités"""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first] + self.drain()
+            write_activities(batch)
+            # La connexion du thread ne doit pas dépasser CONN_MAX_AGE
+            close_old_connections()
+
+    def flush(self):
+        """Vide la file de façon synchrone (arrêt du processus)"""
+        batch = self.drain()
+        while batch:
+            write_activities(batch)
+            batch = self.drain()
+
+
+def get_writer():
+    """Retourne le thread d'écriture, démarré à la première utilisation"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = ActivityWriterThread()
+                writer.start()
+                atexit.register(writer.flush)
+                _writer = writer
+    return _writer
+
+
+class ChangeEntry:
+    """Modification en attente d'un objet ; describe(instance, avant, apres) rédige la description"""
+
+    def __init__(self, instance, module, avant, apres, describe, utilisateur=None, request=None):
+        self.instance = instance
+        self.module = module
+        self.avant = dict(avant)
+        self.apres = dict(apres)
+        self.describe = describe
+        self.utilisateur = utilisateur
+        self.request = request
+
+    @property
+    def key(self):
+        return (self.instance._meta.label, self.instance.pk)
+
+    def merge(self, suivante):
+        """Fusionne une modification ultérieure du même objet"""
+        for champ, valeur in suivante.avant.items():
+            self.avant.setdefault(champ, valeur)
+        self.apres.update(suivante.apres)
+        self.instance = suivante.instance
+        self.utilisateur = suivante.utilisateur or self.utilisateur
+        self.request = suivante.request or self.request
+
+    def to_activity(self):
+        """Activité non enregistrée, ou None si les modifications s'annulent"""
+        from apps.core.models import Activite
+
+        champs = [champ for champ in self.apres if self.avant.get(champ) != self.apres[champ]]
+        avant = {champ: self.avant.get(champ) for champ in champs}
+        apres = {champ: self.apres[champ] for champ in champs}
+        description = self.describe(self.instance, avant, apres) if champs else None
+        if not description:
+            return None
+        return Activite.build_activity(
+            utilisateur=self.utilisateur,
+            action='update',
+            module=self.module,
+            description=description,
+            objet=self.instance,
+            request=self.request,
+            donnees_avant=avant,
+            donnees_après=apres,
+        )
+
+
+class ActivityBuffer:
+    """Activités et modifications (par instance) collectées dans un bloc activity_buffer()"""
+
+    def __init__(self):
+        self.activities = []
+        self.changes = {}
+
+    def add_change(self, entry):
+        courante = self.changes.get(entry.key)
+        if courante is None:
+            self.changes[entry.key] = entry
+        else:
+            courante.merge(entry)
+
+    def drain(self):
+        activities = self.activities + [entry.to_activity() for entry in self.changes.values()]
+        self.activities, self.changes = [], {}
+        return [activity for activity in activities if activity is not None]
+
+
+def _dispatch(activities):
+    if _get_mode() == 'thread':
+        activities = get_writer().put(activities)
+    write_activities(activities)
+
+
+def _collect(activity):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.activities.append(activity)
+    else:
+        _dispatch([activity])
+
+
+def _collect_change(entry):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.add_change(entry)
+        return
+    activity = entry.to_activity()
+    if activity is not None:
+        _dispatch([activity])
+
+
+def enqueue_activity(activity):
+    """Confie une activité non enregistrée à l'écrivain, au commit de la transaction"""
+    if _get_mode() == 'sync':
+        activity.save()
+        return
+    # Hors bloc atomic, on_commit exécute la fonction immédiatement
+    transaction.on_commit(lambda: _collect(activity))
+
+
+def enqueue_change(instance, module, avant, apres, describe, utilisateur=None, request=None):
+    """
+    Journalise la modification d'un objet (champs avant/après) au commit de la
+    transaction ; les modifications d'une même instance sont fusionnées dans le tampon.
+    """
+    entry = ChangeEntry(instance, module, avant, apres, describe, utilisateur, request)
+    if _get_mode() == 'sync':
+        activity = entry.to_activity()
+        if activity is not None:
+            activity.save()
+        return
+    transaction.on_commit(lambda: _collect_change(entry))
+
+
+@contextmanager
+def activity_buffer():
+    """Regroupe les activités journalisées dans le bloc et les écrit à la sortie"""
+    if _buffer.get() is not None:
+        # Bloc imbriqué : le bloc englobant se charge de l'écriture
+        yield
+        return
+    buffer = ActivityBuffer()
+    token = _buffer.set(buffer)
+    try:
+        yield
+    finally:
+        _buffer.reset(token)
+        _dispatch(buffer.drain())
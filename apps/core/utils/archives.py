@@ -0,0 +1,224 @@
+"""
+Archivage à froid des activités expirées.
+
+archive_activities lit les activités antérieures à la limite de conservation
+avec un curseur côté serveur (QuerySet.iterator) et les écrit en JSONL
+compressé (gzip, ou zstd si le paquet zstandard est installé), un fichier par
+mois sous ACTIVITIES_ARCHIVE_DIR. Chaque fichier est relu et
+vérifié (nombre de lignes, SHA-256) puis inscrit dans manifest.json ; les
+lignes ne sont supprimées de la table qu'ensuite.
+
+iter_archived_activities relit un fichier de l'archive à la demande, ligne
+par ligne, sans jamais le charger entièrement. Le répertoire est privé (hors
+MEDIA_ROOT) : les archives contiennent adresses IP et valeurs avant/après,
+elles ne se consultent que par la vue activites_archivees.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle
+    zstandard = None
+
+EXTENSIONS = {
+    'gzip': '.jsonl.gz',
+    'zstd': '.jsonl.zst',
+}
+
+CHAMPS = [
+    'id', 'utilisateur_id', 'action', 'module', 'description',
+    'content_type__app_label', 'content_type__model', 'object_id',
+    'adresse_ip', 'user_agent', 'donnees_avant', 'donnees_après', 'date_creation',
+]
+
+
+def get_archive_dir():
+    return getattr(
+        settings, 'ACTIVITIES_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'private', 'archives', 'activites')
+    )
+
+
+def _manifest_path():
+    return os.path.join(get_archive_dir(), 'manifest.json')
+
+
+def load_manifest():
+    """Fichiers archivés, du plus récent au plus ancien"""
+    try:
+        with open(_manifest_path(), encoding='utf-8') as fichier:
+            return json.load(fichier)
+    except FileNotFoundError:
+        return []
+
+
+def _save_manifest(entrees):
+    chemin = _manifest_path()
+    with open(chemin + '.tmp', 'w', encoding='utf-8') as fichier:
+        json.dump(entrees, fichier, ensure_ascii=False, indent=2)
+        fichier.flush()
+        os.fsync(fichier.fileno())
+    os.replace(chemin + '.tmp', chemin)
+
+
+def _open(chemin, mode, compression):
+    """Ouvre un fichier JSONL compressé en mode texte ('r' ou 'w')"""
+    if compression == 'gzip':
+        return gzip.open(chemin, mode + 't', encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImproperlyConfigured("La compression zstd nécessite le paquet 'zstandard'.")
+        brut = open(chemin, mode + 'b')
+        if mode == 'w':
+            flux = zstandard.ZstdCompressor().stream_writer(brut, closefd=True)
+        else:
+            flux = zstandard.ZstdDecompressor().stream_reader(brut, closefd=True)
+        return io.TextIOWrapper(flux, encoding='utf-8')
+    raise ImproperlyConfigured(f"Compression inconnue : {compression}")
+
+
+def _compression_of(chemin):
+    for compression, extension in EXTENSIONS.items():
+        if chemin.endswith(extension):
+            return compression
+    raise ImproperlyConfigured(f"Format d'archive inconnu : {chemin}")
+
+
+def _sha256(chemin):
+    empreinte = hashlib.sha256()
+    with open(chemin, 'rb') as fichier:
+        for bloc in iter(lambda: fichier.read(1024 * 1024), b''):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+class _Shard:
+    """Fichier mensuel en cours d'écriture"""
+
+    def __init__(self, mois, compression, horodatage):
+        self.mois = mois
+        self.compression = compression
+        self.relatif = os.path.join(
+            mois[:4], f"activites_{mois.replace('-', '_')}_{horodatage}{EXTENSIONS[compression]}"
+        )
+        self.chemin = os.path.join(get_archive_dir(), self.relatif)
+        os.makedirs(os.path.dirname(self.chemin), exist_ok=True)
+        self.flux = _open(self.chemin + '.part', 'w', compression)
+        self.nb_lignes = 0
+        self.premier_id = self.dernier_id = None
+        self.date_debut = self.date_fin = None
+
+    def ecrire(self, ligne):
+        self.flux.write(json.dumps(ligne, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        self.nb_lignes += 1
+        self.premier_id = ligne['id'] if self.premier_id is None else min(self.premier_id, ligne['id'])
+        self.dernier_id = ligne['id'] if self.dernier_id is None else max(self.dernier_id, ligne['id'])
+        self.date_debut = self.date_debut or ligne['date_creation']
+        self.date_fin = ligne['date_creation']
+
+    def fermer(self):
+        """Ferme, vérifie le contenu et rend le fichier définitif ; retourne l'entrée du manifeste"""
+        self.flux.close()
+        with _open(self.chemin + '.part', 'r', self.compression) as relu:
+            nb_relues = sum(1 for _ in relu)
+        if nb_relues != self.nb_lignes:
+            raise IOError(f"Archive {self.relatif} incomplète : {nb_relues}/{self.nb_lignes} lignes relues")
+        with open(self.chemin + '.part', 'rb') as fichier:
+            os.fsync(fichier.fileno())
+        os.replace(self.chemin + '.part', self.chemin)
+        return {
+            'fichier': self.relatif,
+            'mois': self.mois,
+            'compression': self.compression,
+            'nb_lignes': self.nb_lignes,
+            'premier_id': self.premier_id,
+            'dernier_id': self.dernier_id,
+            'date_debut': self.date_debut.isoformat(),
+            'date_fin': self.date_fin.isoformat(),
+            'sha256': _sha256(self.chemin),
+            'date_archivage': timezone.now().isoformat(),
+        }
+
+
+def archive_activities(limite, compression=None, chunk_size=2000, progress=None):
+    """
+    Écrit les activités antérieures à `limite` dans l'archive.
+    Retourne (entrées ajoutées au manifeste, plus grand id archivé).
+    La suppression des lignes reste à la charge de l'appelant.
+    """
+    from apps.core.models import Activite
+
+    compression = compression or getattr(settings, 'ACTIVITIES_ARCHIVE_COMPRESSION', 'gzip')
+    horodatage = timezone.now().strftime('%Y%m%d%H%M%S')
+    queryset = Activite.objects.filter(date_creation__lt=limite).order_by('date_creation', 'id').values(*CHAMPS)
+
+    entrees, shard, dernier_id = [], None, None
+    try:
+        # iterator() utilise un curseur côté serveur sous PostgreSQL
+        for ligne in queryset.iterator(chunk_size=chunk_size):
+            mois = timezone.localtime(ligne['date_creation']).strftime('%Y-%m')
+            if shard is None or shard.mois != mois:
+                if shard is not None:
+                    entrees.append(shard.fermer())
+                    if progress:
+                        progress(entrees[-1])
+                shard = _Shard(mois, compression, horodatage)
+            app_label = ligne.pop('content_type__app_label')
+            model = ligne.pop('content_type__model')
+            ligne['content_type'] = f"{app_label}.{model}" if app_label else None
+            shard.ecrire(ligne)
+            dernier_id = ligne['id'] if dernier_id is None else max(dernier_id, ligne['id'])
+        if shard is not None:
+            entrees.append(shard.fermer())
+            if progress:
+                progress(entrees[-1])
+            shard = None
+    finally:
+        if shard is not None:
+            # Échec en cours d'écriture : le fichier partiel n'est pas conservé
+            shard.flux.close()
+            os.remove(shard.chemin + '.part')
+
+    if entrees:
+        _save_manifest(entrees[::-1] + load_manifest())
+    return entrees, dernier_id
+
+
+def get_archive_entry(fichier):
+    """Entrée du manifeste pour un fichier (None si inconnu : pas d'accès hors de l'archive)"""
+    return next((entree for entree in load_manifest() if entree['fichier'] == fichier), None)
+
+
+def verify_archive(entree):
+    """Vérifie la somme de contrôle d'un fichier archivé"""
+    return _sha256(os.path.join(get_archive_dir(), entree['fichier'])) == entree['sha256']
+
+
+def iter_archived_activities(fichier, module=None, action=None, utilisateur_id=None, search=None):
+    """Parcourt paresseusement les activités d'un fichier de l'archive en appliquant les filtres"""
+    entree = get_archive_entry(fichier)
+    if entree is None:
+        raise FileNotFoundError(fichier)
+
+    chemin = os.path.join(get_archive_dir(), entree['fichier'])
+    search = search.lower() if search else None
+    with _open(chemin, 'r', _compression_of(chemin)) as flux:
+        for texte in flux:
+            ligne = json.loads(texte)
+            if module and ligne['module'] != module:
+                continue
+            if action and ligne['action'] != action:
+                continue
+            if utilisateur_id and str(ligne['utilisateur_id']) != str(utilisateur_id):
+                continue
+            if search and search not in (ligne['description'] or '').lower():
+                continue
+            yield ligne
@@ -0,0 +1,63 @@
+"""
+Invalidation des caches propres au processus.
+
+Un cache en mémoire locale (LocMemCache) n'est pas partagé : un cache.delete()
+n'atteint pas les autres workers. Pour ces caches, les clés sont préfixées par
+une version stockée en base (VersionCache) : invalider revient à changer la
+version, et chaque processus relit celle-ci au plus toutes les
+CACHE_VERSION_CHECK_INTERVAL secondes. Une modification est donc vue partout
+après ce délai au plus, sans requête SQL à chaque requête HTTP.
+
+Les versions sont des horodatages (time_ns) : une version annulée (rollback)
+ou relue en retard n'est jamais réutilisée pour des données différentes.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+_versions = {}
+_lock = threading.Lock()
+
+
+def is_process_local(cache):
+    """Vrai si le backend de cache est propre au processus (invalidation non partagée)"""
+    return isinstance(cache, LocMemCache)
+
+
+def get_version(cle):
+    """Version de la clé, relue en base au plus toutes les CACHE_VERSION_CHECK_INTERVAL secondes"""
+    from apps.core.models import VersionCache
+
+    maintenant = time.monotonic()
+    version, lue_a = _versions.get(cle, (0, None))
+    if lue_a is not None and maintenant - lue_a < getattr(settings, 'CACHE_VERSION_CHECK_INTERVAL', 5):
+        return version
+    # Une version changée localement mais pas encore validée en base reste valable
+    version = max(version, VersionCache.lire(cle))
+    with _lock:
+        _versions[cle] = (version, maintenant)
+    return version
+
+
+def bump_version(cle):
+    """
+    Invalide toutes les entrées de la clé : immédiatement dans ce processus,
+    au commit de la transaction pour les autres
+    """
+    from apps.core.models import VersionCache
+
+    version = time.time_ns()
+    with _lock:
+        _versions[cle] = (max(version, _versions.get(cle, (0, None))[0]), time.monotonic())
+    # Hors de la transaction de l'appelant : pas de verrou sur la ligne jusqu'au commit
+    transaction.on_commit(lambda: VersionCache.changer(cle, version))
+
+
+def versioned_key(cache, cle, suffixe):
+    """Clé de cache `cle:suffixe`, préfixée par la version en base si le cache est local"""
+    if is_process_local(cache):
+        return f'{cle}:{get_version(cle)}:{suffixe}'
+    return f'{cle}:{suffixe}'
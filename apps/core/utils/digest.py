@@ -0,0 +1,198 @@
+"""
+Résumés de notifications selon les préférences des utilisateurs.
+
+Avant d'écrire une notification, trier_notifications applique la
+PreferenceNotification du destinataire :
+
+- catégorie désactivée (notifications_lancements, _affaires, _systeme) :
+  la notification est écartée ;
+- type prioritaire (NOTIFICATIONS_IMMEDIATE_TYPES) ou fréquence 'immediate'
+  hors période silencieuse : la notification est créée tout de suite ;
+- sinon elle est mise en attente (EvenementNotification) et creer_resumes la
+  regroupe en une seule notification à la fréquence choisie, hors période
+  silencieuse.
+
+Un utilisateur sans préférences enregistrées reçoit tout immédiatement.
+Les préférences (ou leur absence) sont mises en cache par utilisateur pour ne
+pas ajouter de requête à chaque notification.
+
+Les résumés sont produits par run_notification_worker (processus requis, voir
+NOTIFICATION_JOBS_ENABLED) ou par la commande send_notification_digests à
+planifier via cron. NOTIFICATIONS_DIGEST_ENABLED suit par défaut
+NOTIFICATION_JOBS_ENABLED : sans worker, rien n'est mis en attente.
+"""
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.utils.cache_versions import bump_version, is_process_local, versioned_key
+
+PREFERENCES_CACHE_KEY = 'core:preferences'
+# Valeur mise en cache pour un utilisateur sans préférences
+SANS_PREFERENCES = ''
+
+CATEGORIES_PAR_MODELE = {
+    'lancement': 'lancements',
+    'affaire': 'affaires',
+}
+
+
+def get_categorie(content_type_id=None):
+    """Catégorie de préférence d'une notification d'après son objet lié"""
+    if content_type_id:
+        model = ContentType.objects.get_for_id(content_type_id).model
+        return CATEGORIES_PAR_MODELE.get(model, 'systeme')
+    return 'systeme'
+
+
+def _lire_preferences(destinataire_ids):
+    from apps.core.models import PreferenceNotification
+    return {
+        pref.utilisateur_id: pref
+        for pref in PreferenceNotification.objects.filter(utilisateur_id__in=set(destinataire_ids))
+    }
+
+
+def _get_preferences(destinataire_ids):
+    """Préférences des destinataires depuis le cache, les manquantes en une requête"""
+    cles = {versioned_key(cache, PREFERENCES_CACHE_KEY, pk): pk for pk in set(destinataire_ids)}
+    preferences = {cles[cle]: pref for cle, pref in cache.get_many(list(cles)).items()}
+    manquants = [pk for pk in cles.values() if pk not in preferences]
+    if manquants:
+        lues = _lire_preferences(manquants)
+        cache.set_many(
+            {versioned_key(cache, PREFERENCES_CACHE_KEY, pk): lues.get(pk, SANS_PREFERENCES) for pk in manquants},
+            getattr(settings, 'NOTIFICATIONS_PREFERENCES_CACHE_TIMEOUT', 3600),
+        )
+        preferences.update(lues)
+    return {pk: pref for pk, pref in preferences.items() if pref != SANS_PREFERENCES}
+
+
+def invalidate_preferences(utilisateur_id):
+    """Invalide les préférences en cache d'un utilisateur"""
+    if is_process_local(cache):
+        bump_version(PREFERENCES_CACHE_KEY)
+    else:
+        cache.delete(versioned_key(cache, PREFERENCES_CACHE_KEY, utilisateur_id))
+
+
+def trier_notifications(notifications):
+    """
+    Applique les préférences à des notifications non enregistrées.
+    Met en attente celles destinées à un résumé et retourne celles à créer immédiatement.
+    """
+    if not notifications or not getattr(settings, 'NOTIFICATIONS_DIGEST_ENABLED', False):
+        return notifications
+
+    from apps.core.models import EvenementNotification
+    types_immediats = getattr(settings, 'NOTIFICATIONS_IMMEDIATE_TYPES', ('warning', 'error'))
+    preferences = _get_preferences(n.destinataire_id for n in notifications)
+    now = timezone.now()
+
+    immediates, evenements = [], []
+    for notification in notifications:
+        pref = preferences.get(notification.destinataire_id)
+        if pref is None:
+            immediates.append(notification)
+            continue
+
+        categorie = get_categorie(notification.content_type_id)
+        if not pref.accepte_categorie(categorie):
+            continue
+
+        if notification.type_notification in types_immediats or (
+            pref.frequence_resume in ('immediate', 'none') and not pref.est_periode_silencieuse(now)
+        ):
+            immediates.append(notification)
+        else:
+            evenements.append(EvenementNotification(
+                destinataire_id=notification.destinataire_id,
+                categorie=categorie,
+                type_notification=notification.type_notification,
+                titre=notification.titre,
+                message=notification.message,
+                url_action=notification.url_action,
+                content_type_id=notification.content_type_id,
+                object_id=notification.object_id,
+            ))
+
+    if evenements:
+        EvenementNotification.objects.bulk_create(evenements)
+    return immediates
+
+
+def _construire_resume(destinataire_id, evenements):
+    from apps.core.models import EvenementNotification, Notification
+
+    if len(evenements) == 1:
+        # Un seul événement : inutile de le présenter comme un résumé
+        evenement = evenements[0]
+        return Notification(
+            destinataire_id=destinataire_id,
+            type_notification=evenement.type_notification,
+            titre=evenement.titre,
+            message=evenement.message,
+            url_action=evenement.url_action,
+            content_type_id=evenement.content_type_id,
+            object_id=evenement.object_id,
+        )
+
+    libelles = dict(EvenementNotification.CATEGORIES)
+    compteurs = {}
+    for evenement in evenements:
+        compteurs[evenement.categorie] = compteurs.get(evenement.categorie, 0) + 1
+
+    max_lignes = getattr(settings, 'NOTIFICATIONS_DIGEST_MAX_LINES', 10)
+    lignes = [', '.join(f"{libelles[cat]} : {nb}" for cat, nb in compteurs.items())]
+    lignes += [f"- {evenement.titre}" for evenement in evenements[-max_lignes:]]
+    if len(evenements) > max_lignes:
+        lignes.append(f"... et {len(evenements) - max_lignes} autre(s)")
+
+    return Notification(
+        destinataire_id=destinataire_id,
+        type_notification='info',
+        titre=f"Résumé : {len(evenements)} notifications",
+        message='\n'.join(lignes),
+        url_action=reverse('core:notifications_list'),
+    )
+
+
+def creer_resumes(moment=None):
+    """Transforme les événements en attente en notifications de résumé ; retourne le nombre créé"""
+    from apps.core.models import EvenementNotification
+    from apps.core.utils.notifications import publish_notifications
+
+    moment = moment or timezone.now()
+    destinataire_ids = list(
+        EvenementNotification.objects.values_list('destinataire_id', flat=True).distinct()
+    )
+    # Lecture directe : date_dernier_resume n'est pas tenue à jour dans le cache
+    preferences = _lire_preferences(destinataire_ids)
+
+    nb_resumes = 0
+    for destinataire_id in destinataire_ids:
+        pref = preferences.get(destinataire_id)
+        if pref is not None and not pref.resume_du(moment):
+            continue
+
+        with transaction.atomic():
+            evenements = list(
+                EvenementNotification.objects.select_for_update(skip_locked=True)
+                .filter(destinataire_id=destinataire_id, date_creation__lte=moment)
+            )
+            if not evenements:
+                continue
+
+            resume = _construire_resume(destinataire_id, evenements)
+            resume.save()
+            EvenementNotification.objects.filter(pk__in=[e.pk for e in evenements]).delete()
+            if pref is not None:
+                pref.date_dernier_resume = moment
+                pref.save(update_fields=['date_dernier_resume'])
+
+        publish_notifications([resume])
+        nb_resumes += 1
+    return nb_resumes
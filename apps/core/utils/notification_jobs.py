@@ -0,0 +1,85 @@
+"""
+File d'attente des diffusions de notifications par rôle.
+
+Les tâches sont des lignes TacheNotification : elles survivent aux
+redémarrages et sont réservées avec SELECT ... FOR UPDATE SKIP LOCKED, ce qui
+permet de lancer plusieurs workers (commande run_notification_worker).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+def enqueue_role_notification(role_name, type_notif, titre, message, url_action=None,
+                              content_type=None, object_id=None):
+    """Enregistre une tâche de diffusion pour les membres actifs d'un rôle"""
+    from apps.core.models import TacheNotification
+    return TacheNotification.objects.create(
+        role_name=role_name,
+        type_notification=type_notif,
+        titre=titre,
+        message=message,
+        url_action=url_action,
+        content_type=content_type,
+        object_id=object_id,
+    )
+
+
+def requeue_stale_jobs():
+    """Remet en attente les tâches restées 'en_cours' après l'arrêt brutal d'un worker"""
+    from apps.core.models import TacheNotification
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'NOTIFICATION_JOBS_LOCK_TIMEOUT', 300))
+    return TacheNotification.objects.filter(
+        statut='en_cours', date_traitement__lt=limite
+    ).update(statut='en_attente')
+
+
+def claim_jobs(limit):
+    """Réserve jusqu'à `limit` tâches disponibles pour ce worker"""
+    from apps.core.models import TacheNotification
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            TacheNotification.objects.select_for_update(skip_locked=True)
+            .filter(statut='en_attente', date_disponible__lte=now)
+            .values_list('id', flat=True)[:limit]
+        )
+        TacheNotification.objects.filter(id__in=ids).update(
+            statut='en_cours', tentatives=F('tentatives') + 1, date_traitement=now
+        )
+    return list(TacheNotification.objects.filter(id__in=ids))
+
+
+def process_job(job):
+    """Diffuse une tâche ; en cas d'erreur, elle est reprogrammée avec un délai croissant"""
+    from apps.core.signals import NotificationService
+    try:
+        # Diffusion et clôture de la tâche dans la même transaction : pas de doublon en cas de reprise
+        with transaction.atomic():
+            job.nb_destinataires = NotificationService.diffuser_notification_role(
+                role_name=job.role_name,
+                type_notif=job.type_notification,
+                titre=job.titre,
+                message=job.message,
+                url_action=job.url_action,
+                content_type_id=job.content_type_id,
+                object_id=job.object_id,
+            )
+            job.statut = 'terminee'
+            job.erreur = ''
+            job.date_traitement = timezone.now()
+            job.save(update_fields=['nb_destinataires', 'statut', 'erreur', 'date_traitement'])
+        return True
+    except Exception as e:
+        max_tentatives = getattr(settings, 'NOTIFICATION_JOBS_MAX_ATTEMPTS', 5)
+        job.erreur = str(e)
+        if job.tentatives >= max_tentatives:
+            job.statut = 'echec'
+        else:
+            job.statut = 'en_attente'
+            job.date_disponible = timezone.now() + timedelta(seconds=30 * 2 ** job.tentatives)
+        job.save(update_fields=['statut', 'erreur', 'date_disponible'])
+        return False
@@ -0,0 +1,142 @@
+"""
+Version et diffusion en temps réel des notifications par utilisateur.
+
+Le numéro de version est stocké dans la ligne CompteurNotification du
+destinataire et incrémenté, dans la même transaction, dès qu'une de ses
+notifications est créée, lue ou supprimée. Il sert d'ETag au polling de la
+navbar : tant qu'il ne change pas, get_notifications_json répond 304 sans
+interroger la table notification. Étant en base, il est vu par tous les
+processus (workers web, run_notification_worker, commandes) et jamais avant
+le commit des notifications qu'il décrit.
+
+Sous ASGI, le broker diffuse en plus, après le commit, chaque nouvelle
+notification et chaque changement du nombre de non lues aux flux SSE
+ouverts. Il vit dans le processus : les événements des autres processus
+parviennent aux clients par le polling de secours, maintenu à un rythme
+lent tant que le flux est ouvert.
+"""
+import asyncio
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+
+def get_notification_version(user_id):
+    """Retourne la version courante des notifications d'un utilisateur"""
+    from apps.core.models import CompteurNotification
+    return CompteurNotification.get_version(user_id)
+
+
+def bump_notification_version(*user_ids):
+    """
+    Signale un changement dans les notifications des utilisateurs donnés.
+    À appeler dans la transaction du changement ; inutile après
+    CompteurNotification.ajuster, qui incrémente déjà la version.
+    """
+    from apps.core.models import CompteurNotification
+    if user_ids:
+        CompteurNotification.objects.filter(pk__in=set(user_ids)).update(version=F('version') + 1)
+
+
+def get_notification_etag(user_id):
+    """ETag du flux de notifications d'un utilisateur"""
+    return f'"notifications-{user_id}-{get_notification_version(user_id)}"'
+
+
+# ========== DIFFUSION EN TEMPS RÉEL (SSE) ==========
+
+class NotificationBroker:
+    """
+    Pub/sub en mémoire pour le flux SSE des notifications.
+    
+    Chaque connexion SSE s'abonne avec une asyncio.Queue ; la publication
+    peut se faire depuis n'importe quel thread (vues synchrones, signaux).
+    La diffusion est locale au processus : les événements publiés par un
+    autre processus arrivent aux clients par le polling de secours de la
+    navbar, qui continue (lentement) pendant que le flux est ouvert.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+    
+    def subscribe(self, user_id):
+        """Abonne la boucle asyncio courante aux événements d'un utilisateur"""
+        queue = asyncio.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+    
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({item for item in subscribers if item[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+    
+    def has_subscribers(self, user_id):
+        return bool(self._subscribers.get(user_id))
+    
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, (event, data))
+            except RuntimeError:
+                # Boucle fermée : la connexion sera désabonnée à sa fermeture
+                pass
+    
+    @staticmethod
+    def _put(queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Client trop lent : il se resynchronisera avec l'événement suivant
+            pass
+
+
+broker = NotificationBroker()
+
+
+def serialize_notification(notification):
+    """Représentation JSON d'une notification (navbar et flux SSE)"""
+    return {
+        'id': notification.id,
+        'titre': notification.titre,
+        'message': notification.message,
+        'type': notification.type_notification,
+        'icon_class': notification.get_icon_class(),
+        'time_ago': notification.get_time_ago(),
+        'url_action': notification.url_action,
+        'date_creation': notification.date_creation.isoformat(),
+    }
+
+
+def _publish_unread_count(user_id):
+    if not broker.has_subscribers(user_id):
+        return
+    from apps.core.models import CompteurNotification
+    broker.publish(user_id, 'unread', {'count': CompteurNotification.get_non_lues(user_id)})
+
+
+def _publish_notifications(notifications):
+    destinataires = set()
+    for notification in notifications:
+        if broker.has_subscribers(notification.destinataire_id):
+            broker.publish(notification.destinataire_id, 'notification', serialize_notification(notification))
+            destinataires.add(notification.destinataire_id)
+    for user_id in destinataires:
+        _publish_unread_count(user_id)
+
+
+def publish_unread_count(user_id):
+    """Diffuse, après le commit, le nombre de non lues si l'utilisateur est connecté au flux"""
+    transaction.on_commit(lambda: _publish_unread_count(user_id))
+
+
+def publish_notifications(notifications):
+    """Diffuse, après le commit, des notifications nouvellement créées à leurs destinataires connectés"""
+    notifications = list(notifications)
+    transaction.on_commit(lambda: _publish_notifications(notifications))
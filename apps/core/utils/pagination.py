@@ -0,0 +1,126 @@
+"""
+Pagination par curseur (keyset) sur (date_creation, id), du plus récent au plus ancien.
+
+Contrairement à Paginator, aucune requête COUNT(*) ni OFFSET : chaque page est
+une lecture d'index bornée par la dernière ligne affichée, la page N coûte
+donc autant que la première. Les curseurs sont signés (opaques pour le client) ;
+un curseur invalide ou périmé (lignes supprimées entre-temps) ramène à la
+première page.
+"""
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+SALT = 'core.pagination'
+
+
+class KeysetPage:
+    """Page de résultats, compatible avec l'usage de page_obj dans les templates"""
+
+    def __init__(self, object_list, has_next, has_previous, paginator):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[-1], 'n')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[0], 'p')
+        return None
+
+
+class KeysetPaginator:
+    """Pagine un queryset sur (date_creation, id) décroissants"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def encode_cursor(self, obj, direction):
+        return signing.dumps([direction, obj.date_creation.isoformat(), obj.pk], salt=SALT)
+
+    def decode_cursor(self, cursor):
+        """Retourne (direction, date_creation, id), ou None si le curseur est absent ou invalide"""
+        if not cursor:
+            return None
+        try:
+            direction, date_creation, pk = signing.loads(cursor, salt=SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        date_creation = parse_datetime(date_creation)
+        if direction not in ('n', 'p') or date_creation is None:
+            return None
+        return direction, date_creation, pk
+
+    def page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        limite = self.per_page + 1
+
+        if position is None:
+            lignes = list(self.queryset.order_by('-date_creation', '-id')[:limite])
+            return KeysetPage(lignes[:self.per_page], len(lignes) > self.per_page, False, self)
+
+        direction, date_creation, pk = position
+        if direction == 'n':
+            # Le filtre date_creation__lte borne le parcours de l'index
+            lignes = list(
+                self.queryset.filter(date_creation__lte=date_creation)
+                .filter(Q(date_creation__lt=date_creation) | Q(id__lt=pk))
+                .order_by('-date_creation', '-id')[:limite]
+            )
+            if not lignes:
+                # Plus rien après le curseur : page vide sans lien de retour
+                return self.page()
+            return KeysetPage(lignes[:self.per_page], len(lignes) > self.per_page, True, self)
+
+        # Page précédente : parcours ascendant puis remise dans l'ordre d'affichage
+        lignes = list(
+            self.queryset.filter(date_creation__gte=date_creation)
+            .filter(Q(date_creation__gt=date_creation) | Q(id__gt=pk))
+            .order_by('date_creation', 'id')[:limite]
+        )
+        has_previous = len(lignes) > self.per_page
+        if not has_previous:
+            # Début de la liste atteint (ou aucune ligne) : c'est la première page, complète
+            return self.page()
+        return KeysetPage(lignes[:self.per_page][::-1], True, has_previous, self)
+
+
+class KeysetPaginationMixin:
+    """Remplace la pagination par numéro de page des ListView par des curseurs"""
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Filtres courants, à reprendre dans les liens de pagination
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        context['filter_querystring'] = params.urlencode()
+        return context
@@ -0,0 +1,218 @@
+"""
+Partitionnement mensuel de la table activite (PostgreSQL, optionnel).
+
+Activé par ACTIVITE_PARTITIONING. La commande manage_activite_partitions
+convertit une fois la table en table partitionnée par plage de date_creation
+(une partition par mois : activite_AAAA_MM, plus activite_default pour les
+dates hors plage), puis crée les partitions à venir et supprime (ou détache)
+celles entièrement antérieures à ACTIVITIES_RETENTION_DAYS. Si
+ACTIVITIES_ARCHIVE_ENABLED, la suppression passe par purge_activities : les
+lignes sont archivées et vérifiées avant que leurs partitions ne disparaissent.
+
+La clé primaire de la table partitionnée devient (id, date_creation), comme
+l'impose PostgreSQL ; id reste unique grâce à sa séquence.
+
+Si des lignes d'un mois sont tombées dans activite_default (cron manqué),
+PostgreSQL refuse de créer la partition de ce mois : elles sont alors
+déplacées dans une table créée à part, attachée ensuite comme partition.
+"""
+from datetime import date, datetime, time as dt_time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLE = 'activite'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def partitioning_enabled():
+    return getattr(settings, 'ACTIVITE_PARTITIONING', False) and connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    """Vérifie si la table activite est déjà partitionnée"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(debut):
+    return f'{TABLE}_{debut.year:04d}_{debut.month:02d}'
+
+
+def _bound(day):
+    """Borne de partition : minuit heure locale, pour des mois alignés sur TIME_ZONE"""
+    return timezone.make_aware(datetime.combine(day, dt_time.min))
+
+
+def partition_bounds(debut):
+    """Bornes [début, fin) de la partition du mois commençant à `debut`"""
+    return _bound(debut), _bound(add_months(debut, 1))
+
+
+def _exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+    return cursor.fetchone()[0]
+
+
+def _create_partition(cursor, debut):
+    """Crée la partition du mois (à appeler dans une transaction)"""
+    name = partition_name(debut)
+    bornes = list(partition_bounds(debut))
+    if _exists(cursor, name):
+        return name
+
+    if _exists(cursor, DEFAULT_PARTITION):
+        # Aucune insertion dans la partition par défaut pendant le déplacement
+        cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" '
+            f'WHERE "date_creation" >= %s AND "date_creation" < %s)',
+            bornes,
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            cursor.execute(
+                f'WITH deplacees AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                f'WHERE "date_creation" >= %s AND "date_creation" < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM deplacees',
+                bornes,
+            )
+            # Les index de la table mère sont créés sur la partition à l'attachement
+            cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bornes)
+            return name
+
+    cursor.execute(
+        f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+        bornes,
+    )
+    return name
+
+
+def list_partitions():
+    """Partitions mensuelles existantes : [(premier jour du mois, nom)] triées"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        try:
+            annee, mois = name[len(TABLE) + 1:].split('_')
+            partitions.append((date(int(annee), int(mois), 1), name))
+        except ValueError:
+            # activite_default
+            continue
+    return sorted(partitions)
+
+
+def ensure_partitions(months_ahead=None):
+    """Crée les partitions du mois courant et des mois à venir ; retourne les noms créés ou existants"""
+    months_ahead = getattr(settings, 'ACTIVITE_PARTITIONS_AHEAD', 3) if months_ahead is None else months_ahead
+    debut = month_start(timezone.localdate())
+    noms = []
+    for i in range(months_ahead + 1):
+        with transaction.atomic(), connection.cursor() as cursor:
+            noms.append(_create_partition(cursor, add_months(debut, i)))
+    return noms
+
+
+def expired_partitions(limite):
+    """Partitions dont tout le mois est antérieur à la date limite"""
+    return [
+        (debut, name) for debut, name in list_partitions()
+        if partition_bounds(debut)[1] <= limite
+    ]
+
+
+def drop_expired_partitions(limite, detach_only=False):
+    """
+    Détache les partitions entièrement expirées puis les supprime (sauf detach_only,
+    pour les archiver avant suppression). Retourne [(nom, nombre de lignes)].
+    """
+    resultats = []
+    for _, name in expired_partitions(limite):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{name}"')
+            nb = cursor.fetchone()[0]
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            if not detach_only:
+                cursor.execute(f'DROP TABLE "{name}"')
+        resultats.append((name, nb))
+    return resultats
+
+
+def convert_to_partitioned(months_ahead=None):
+    """
+    Convertit la table activite en table partitionnée (opération unique, à faire
+    hors production active : les lignes sont recopiées dans une transaction).
+    """
+    from apps.core.models import Activite
+
+    months_ahead = getattr(settings, 'ACTIVITE_PARTITIONS_AHEAD', 3) if months_ahead is None else months_ahead
+    legacy = f'{TABLE}_legacy'
+    opts = Activite._meta
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        # LIKE copie colonnes et NOT NULL, pas l'identité de id (incompatible avec le partitionnement)
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{legacy}") PARTITION BY RANGE ("date_creation")'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY ("id", "date_creation")')
+
+        # Une partition par mois depuis la plus ancienne activité
+        cursor.execute(f'SELECT min("date_creation") FROM "{legacy}"')
+        plus_ancienne = cursor.fetchone()[0]
+        debut = month_start(timezone.localtime(plus_ancienne).date() if plus_ancienne else timezone.localdate())
+        fin = add_months(month_start(timezone.localdate()), months_ahead)
+        while debut <= fin:
+            _create_partition(cursor, debut)
+            debut = add_months(debut, 1)
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+        # Séquence de id
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{TABLE}_id_seq"\')')
+        cursor.execute(f'SELECT setval(\'"{TABLE}_id_seq"\', COALESCE(max("id"), 0) + 1, false) FROM "{TABLE}"')
+
+        # Clés étrangères (différées, comme celles créées par Django)
+        for field_name in ('utilisateur', 'content_type'):
+            field = opts.get_field(field_name)
+            cible = field.related_model._meta
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_{field.column}_fk" '
+                f'FOREIGN KEY ("{field.column}") REFERENCES "{cible.db_table}" ("{cible.pk.column}") '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+
+    # Trigger de search_vector (non copié par LIKE, supprimé avec l'ancienne table)
+    from apps.core.utils.search import ACTIVITE_TRIGGER_SQL
+    with connection.cursor() as cursor:
+        cursor.execute(ACTIVITE_TRIGGER_SQL)
+
+    # Index déclarés dans Activite.Meta, créés sur la table mère et propagés aux partitions
+    with connection.schema_editor() as schema_editor:
+        for index in opts.indexes:
+            schema_editor.add_index(Activite, index)
@@ -0,0 +1,61 @@
+"""
+Cache partagé des permissions des rôles.
+
+Chaque rôle est stocké sous forme de masque de bits (voir PERMISSION_BITS)
+dans le backend de cache Django désigné par PERMISSIONS_CACHE_ALIAS. Les clés
+sont préfixées par un numéro de version : l'invalidation consiste simplement
+à incrémenter ce numéro, ce qui rend toutes les anciennes entrées obsolètes
+pour tous les processus qui partagent le backend (Redis, Memcached...).
+
+Un cache en mémoire locale (LocMemCache) n'est pas partagé : le numéro de
+version est alors stocké en base (voir utils.cache_versions) et relu au plus
+toutes les CACHE_VERSION_CHECK_INTERVAL secondes. Un changement de
+permissions atteint les autres workers dans ce délai.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.core.utils.cache_versions import bump_version, get_version, is_process_local
+
+VERSION_KEY = 'core:permissions:version'
+
+
+def _get_cache():
+    return caches[getattr(settings, 'PERMISSIONS_CACHE_ALIAS', 'default')]
+
+
+def _get_version(cache):
+    if is_process_local(cache):
+        return get_version(VERSION_KEY)
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Un horodatage évite de réutiliser des clés d'une version évincée
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_role_permission_mask(role_id):
+    """Retourne le masque de permissions d'un rôle, depuis le cache si possible"""
+    from apps.core.models import Role
+    cache = _get_cache()
+    key = f'core:permissions:{_get_version(cache)}:role:{role_id}'
+    mask = cache.get(key)
+    if mask is None:
+        mask = Role.objects.filter(pk=role_id).values_list('permissions_mask', flat=True).first() or 0
+        cache.set(key, mask, getattr(settings, 'PERMISSIONS_CACHE_TIMEOUT', 3600))
+    return mask
+
+
+def invalidate_role_permissions():
+    """Invalide les permissions en cache de tous les rôles"""
+    cache = _get_cache()
+    if is_process_local(cache):
+        bump_version(VERSION_KEY)
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
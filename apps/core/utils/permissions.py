@@ -203,9 +203,11 @@ def permission_required(module, action, ajax_support=True):
                     }, status=403)
                 
                 messages.error(request, "Vous n'avez pas les permissions nécessaires pour cette action.")
-                return redirect('dashboard')
+                return redirect('core:dashboard')
             
             return view_func(request, *args, **kwargs)
         
+        # Exposé pour PermissionMiddleware (table URL → permission)
+        _wrapped_view.required_permission = (module, action)
         return _wrapped_view
     return decorator
\ No newline at end of file
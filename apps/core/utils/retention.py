@@ -0,0 +1,234 @@
+"""
+Limitation du volume des notifications et des activités.
+
+Au-delà de MAX_NOTIFICATIONS_PER_USER, les notifications lues les plus
+anciennes d'un utilisateur sont supprimées ; les non lues sont toujours
+conservées. Les durées de conservation (NOTIFICATIONS_RETENTION_DAYS,
+NOTIFICATIONS_UNREAD_RETENTION_DAYS, ACTIVITIES_RETENTION_DAYS,
+QUERY_PROFILES_RETENTION_DAYS pour les ProfilRequete) sont
+appliquées par tranches de clés primaires, chacune dans sa propre transaction :
+un nettoyage interrompu reprend simplement à la plus petite clé restante.
+
+Les suppressions se font sans charger les objets ni envoyer de signaux : les
+compteurs et la version des notifications sont ajustés ici.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+
+def _raw_delete(queryset):
+    """DELETE direct, sans collecteur ni signaux (aucune clé étrangère ne vise notification ni activite)"""
+    return queryset._raw_delete(queryset.db)
+
+
+# Nombre maximal de clés par DELETE ... WHERE id IN (...) du plafonnement
+TRIM_DELETE_CHUNK_SIZE = 1000
+
+
+def trim_notifications(user_ids, cap=None):
+    """
+    Supprime les notifications lues au-delà du plafond pour les utilisateurs donnés,
+    par DELETE d'au plus TRIM_DELETE_CHUNK_SIZE clés.
+    Retourne le nombre de notifications supprimées.
+    """
+    from apps.core.models import CompteurNotification, Notification
+
+    cap = cap or getattr(settings, 'MAX_NOTIFICATIONS_PER_USER', 100)
+    # Le compteur dénormalisé évite tout travail pour les utilisateurs sous le plafond
+    depassements = list(
+        CompteurNotification.objects.filter(pk__in=set(user_ids), total__gt=cap).values_list('pk', flat=True)
+    )
+    if not depassements:
+        return 0
+
+    with transaction.atomic():
+        classement = Notification.objects.filter(destinataire_id__in=depassements).annotate(
+            rang=Window(
+                RowNumber(),
+                partition_by=F('destinataire_id'),
+                order_by=[F('date_creation').desc(), F('id').desc()],
+            )
+        )
+        a_supprimer = list(classement.filter(rang__gt=cap, lu=True).values_list('pk', 'destinataire_id'))
+        if not a_supprimer:
+            return 0
+
+        for debut in range(0, len(a_supprimer), TRIM_DELETE_CHUNK_SIZE):
+            tranche = a_supprimer[debut:debut + TRIM_DELETE_CHUNK_SIZE]
+            _raw_delete(Notification.objects.filter(pk__in=[pk for pk, _ in tranche]))
+
+        supprimees = {}
+        for _, destinataire_id in a_supprimer:
+            supprimees[destinataire_id] = supprimees.get(destinataire_id, 0) + 1
+        CompteurNotification.ajuster({pk: (-nb, 0) for pk, nb in supprimees.items()})
+
+    return len(a_supprimer)
+
+
+def trim_all_notifications(batch_size=500, cap=None):
+    """Applique le plafond à tous les utilisateurs qui le dépassent, par lots"""
+    from apps.core.models import CompteurNotification
+
+    cap = cap or getattr(settings, 'MAX_NOTIFICATIONS_PER_USER', 100)
+    user_ids = list(CompteurNotification.objects.filter(total__gt=cap).values_list('pk', flat=True))
+    total = 0
+    for start in range(0, len(user_ids), batch_size):
+        total += trim_notifications(user_ids[start:start + batch_size], cap=cap)
+    return total
+
+
+def purge_chunked(queryset, chunk_size=5000, pause=0, progress=None, delete=_raw_delete):
+    """
+    Supprime les lignes du queryset par tranches d'au plus chunk_size clés primaires.
+    delete(tranche) supprime une tranche dans sa transaction et retourne le nombre
+    de lignes supprimées ; progress(derniere_pk, nb_tranche, nb_total) est appelé
+    après son commit. Retourne le nombre de lignes supprimées.
+    """
+    queryset = queryset.order_by()
+    total = 0
+    debut = None
+    while True:
+        restantes = queryset if debut is None else queryset.filter(pk__gt=debut)
+        # Parcours de l'index de la clé primaire : bornes de la prochaine tranche
+        pks = list(restantes.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return total
+
+        with transaction.atomic():
+            nb = delete(queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]))
+        total += nb
+        debut = pks[-1]
+
+        if progress:
+            progress(debut, nb, total)
+        if pause:
+            time.sleep(pause)
+
+
+def _supprimer_notifications(tranche):
+    """Supprime une tranche de notifications et la retire des compteurs de ses destinataires"""
+    from apps.core.models import CompteurNotification
+
+    deltas = {
+        ligne['destinataire_id']: (-ligne['total'], -ligne['non_lues'])
+        for ligne in tranche.values('destinataire_id').annotate(
+            total=Count('id'), non_lues=Count('id', filter=Q(lu=False))
+        ).order_by()
+    }
+    nb = _raw_delete(tranche)
+    # Après la suppression : un compteur manquant est recompté sans la tranche
+    CompteurNotification.ajuster(deltas)
+    return nb
+
+
+def get_notification_purge_querysets(now=None):
+    """Notifications à supprimer selon les durées de conservation, par catégorie"""
+    from apps.core.models import Notification
+
+    now = now or timezone.now()
+    jours_lues = getattr(settings, 'NOTIFICATIONS_RETENTION_DAYS', 30)
+    jours_non_lues = getattr(settings, 'NOTIFICATIONS_UNREAD_RETENTION_DAYS', 90)
+    return {
+        'notifications_lues_supprimees': Notification.objects.filter(
+            lu=True, date_lecture__lt=now - timedelta(days=jours_lues)
+        ),
+        'notifications_non_lues_supprimees': Notification.objects.filter(
+            lu=False, date_creation__lt=now - timedelta(days=jours_non_lues)
+        ),
+        'notifications_expirees_supprimees': Notification.objects.filter(
+            date_expiration__lt=now
+        ),
+    }
+
+
+def get_activity_retention_limit(now=None):
+    """Date avant laquelle les activités ne sont plus conservées"""
+    now = now or timezone.now()
+    return now - timedelta(days=getattr(settings, 'ACTIVITIES_RETENTION_DAYS', 180))
+
+
+def get_activity_purge_queryset(now=None):
+    """Activités plus anciennes que ACTIVITIES_RETENTION_DAYS"""
+    from apps.core.models import Activite
+
+    return Activite.objects.filter(date_creation__lt=get_activity_retention_limit(now))
+
+
+def get_profil_purge_queryset(now=None):
+    """Profils de requêtes (QueryBudgetMiddleware) plus anciens que QUERY_PROFILES_RETENTION_DAYS"""
+    from apps.core.models import ProfilRequete
+
+    now = now or timezone.now()
+    jours = getattr(settings, 'QUERY_PROFILES_RETENTION_DAYS', 7)
+    return ProfilRequete.objects.filter(date_creation__lt=now - timedelta(days=jours))
+
+
+def purge_profils(chunk_size=5000, pause=0, progress=None):
+    """Applique la durée de conservation des profils de requêtes ; retourne le nombre supprimé"""
+    return purge_chunked(
+        get_profil_purge_queryset(),
+        chunk_size=chunk_size,
+        pause=pause,
+        progress=(lambda pk, nb, total: progress('profils_supprimes', pk, nb, total)) if progress else None,
+    )
+
+
+def purge_notifications(chunk_size=5000, pause=0, progress=None):
+    """Applique les durées de conservation des notifications ; retourne le nombre supprimé par catégorie"""
+    resultats = {}
+    for categorie, queryset in get_notification_purge_querysets().items():
+        resultats[categorie] = purge_chunked(
+            queryset,
+            chunk_size=chunk_size,
+            pause=pause,
+            progress=(lambda pk, nb, total, categorie=categorie: progress(categorie, pk, nb, total)) if progress else None,
+            delete=_supprimer_notifications,
+        )
+    return resultats
+
+
+def purge_activities(chunk_size=5000, pause=0, progress=None, archive=None, compression=None):
+    """
+    Applique la durée de conservation des activités ; retourne le nombre supprimé.
+    Si ACTIVITIES_ARCHIVE_ENABLED (ou archive=True), les activités expirées sont
+    d'abord écrites dans l'archive à froid ; en cas d'échec, rien n'est supprimé.
+    Si la table est partitionnée, les mois entièrement expirés sont supprimés
+    d'un bloc et seul le reliquat du mois limite est effacé ligne à ligne.
+    """
+    from apps.core.models import Activite
+    from apps.core.utils.partitions import drop_expired_partitions, is_partitioned, partitioning_enabled
+
+    limite = get_activity_retention_limit()
+    queryset = Activite.objects.filter(date_creation__lt=limite)
+
+    if archive is None:
+        archive = getattr(settings, 'ACTIVITIES_ARCHIVE_ENABLED', False)
+    if archive:
+        from apps.core.utils.archives import archive_activities
+        entrees, dernier_id = archive_activities(limite, compression=compression)
+        if progress:
+            for entree in entrees:
+                progress(f"archive {entree['fichier']}", None, entree['nb_lignes'], entree['nb_lignes'])
+        # Seules les lignes effectivement archivées peuvent être supprimées
+        queryset = queryset.filter(pk__lte=dernier_id) if dernier_id is not None else queryset.none()
+
+    nb_partitions = 0
+    # Toutes les lignes expirées sont archivées à ce stade : les partitions peuvent partir
+    if partitioning_enabled() and is_partitioned():
+        for name, nb in drop_expired_partitions(limite):
+            nb_partitions += nb
+            if progress:
+                progress(f'partition {name}', None, nb, nb_partitions)
+
+    return nb_partitions + purge_chunked(
+        queryset,
+        chunk_size=chunk_size,
+        pause=pause,
+        progress=(lambda pk, nb, total: progress('activites_supprimees', pk, nb, total)) if progress else None,
+    )
@@ -0,0 +1,67 @@
+"""
+Recherche dans les activités et les notifications.
+
+SEARCH_MODE choisit la stratégie (PostgreSQL) :
+
+- 'fulltext' : recherche plein texte (configuration french) sur la colonne
+  search_vector, tenue à jour par un trigger et indexée en GIN, complétée
+  par la recherche de sous-chaînes (index trigrammes) pour que les codes et
+  numéros ("LC-2025", "AFF-12") continuent d'être trouvés ;
+- 'trigram' : recherche de sous-chaînes (ILIKE) accélérée par les index
+  GIN gin_trgm_ops, pour les codes et fragments de mots ;
+- 'icontains' : ILIKE simple (autres bases de données).
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Q
+
+SEARCH_CONFIG = 'french'
+
+# Triggers qui calculent search_vector à l'écriture (y compris bulk_create et update())
+ACTIVITE_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION activite_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, ''));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS activite_search_vector_trigger ON activite;
+CREATE TRIGGER activite_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF description ON activite
+    FOR EACH ROW EXECUTE FUNCTION activite_search_vector_update();
+"""
+
+NOTIFICATION_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notification_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.titre, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.message, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS notification_search_vector_trigger ON notification;
+CREATE TRIGGER notification_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF titre, message ON notification
+    FOR EACH ROW EXECUTE FUNCTION notification_search_vector_update();
+"""
+
+
+def get_search_mode():
+    if connection.vendor != 'postgresql':
+        return 'icontains'
+    return getattr(settings, 'SEARCH_MODE', 'fulltext')
+
+
+def search_queryset(queryset, terme, fields):
+    """Filtre le queryset sur `terme` selon SEARCH_MODE ; `fields` sert à la recherche par sous-chaîne"""
+    # ILIKE '%terme%' : utilise les index gin_trgm_ops sous PostgreSQL
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': terme})
+
+    if get_search_mode() == 'fulltext':
+        # Les deux conditions sont indexées (GIN) : PostgreSQL combine les index (BitmapOr)
+        condition |= Q(search_vector=SearchQuery(terme, config=SEARCH_CONFIG, search_type='websearch'))
+    return queryset.filter(condition)
@@ -0,0 +1,80 @@
+"""
+Suivi des modifications de champs sans relecture en base.
+
+FieldTrackerMixin mémorise les valeurs des champs suivis au chargement de
+l'instance (Model.from_db passe par __init__), après chaque save() et après
+refresh_from_db() (y compris le chargement d'un champ différé). Les
+signaux comparent l'instance à cet instantané via changed_fields() au lieu
+de relire la ligne dans un pre_save. Les clés étrangères sont comparées par
+identifiant (atelier_id, ...), sans requête sur les objets liés.
+"""
+
+
+class FieldTrackerMixin:
+    """Mixin de modèle exposant changed_fields() ; tracked_fields = None suit tous les champs"""
+    tracked_fields = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._snapshot_fields()
+
+    def _tracked(self):
+        """[(nom du champ, attname)] des champs concrets suivis"""
+        return [
+            (field.name, field.attname)
+            for field in self._meta.concrete_fields
+            if self.tracked_fields is None or field.name in self.tracked_fields
+        ]
+
+    def _snapshot_fields(self, update_fields=None):
+        if update_fields is None:
+            self._initial_values = {}
+        for name, attname in self._tracked():
+            if update_fields is not None and name not in update_fields and attname not in update_fields:
+                continue
+            # Les champs différés (only/defer) ne sont pas chargés : ils ne sont pas suivis
+            if attname in self.__dict__:
+                self._initial_values[name] = self.__dict__[attname]
+
+    def changed_fields(self, update_fields=None):
+        """
+        Champs modifiés depuis le chargement : {nom: (ancienne valeur, nouvelle valeur)}.
+        Avec update_fields (celui de save()), seuls ces champs sont considérés.
+        """
+        if self._state.adding:
+            return {}
+        changes = {}
+        for name, attname in self._tracked():
+            if update_fields is not None and name not in update_fields and attname not in update_fields:
+                continue
+            if name not in self._initial_values or attname not in self.__dict__:
+                continue
+            ancienne, nouvelle = self._initial_values[name], self.__dict__[attname]
+            if ancienne != nouvelle:
+                changes[name] = (ancienne, nouvelle)
+        return changes
+
+    def has_changed(self, name, update_fields=None):
+        return name in self.changed_fields(update_fields)
+
+    def get_initial_value(self, name):
+        return self._initial_values.get(name)
+
+    def get_initial_related(self, name):
+        """Objet lié initial d'une clé étrangère (une requête, à n'utiliser que si elle a changé)"""
+        pk = self._initial_values.get(name)
+        if pk is None:
+            return None
+        model = self._meta.get_field(name).related_model
+        return model._default_manager.filter(pk=pk).first()
+
+    def save(self, *args, **kwargs):
+        # Les signaux post_save voient encore l'ancien instantané
+        super().save(*args, **kwargs)
+        self._snapshot_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # Les valeurs relues deviennent la référence : sinon le save() suivant
+        # signalerait comme modifiés les champs changés en base entre-temps
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_fields(fields)
@@ -7,14 +7,26 @@ from .models import Role, Permission , Affaire
 from apps.collaborateurs.models import Collaborateur
 from .forms import RoleForm, AffaireForm
 from .utils.permissions import permission_required, get_permission_matrix
+from .utils.pagination import KeysetPaginator, KeysetPaginationMixin
+from .utils.search import search_queryset
+from .stats import get_lancement_counters
+from .utils.notifications import (
+    broker, get_notification_etag,
+    publish_unread_count, serialize_notification,
+)
 import json
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+import asyncio
+from asgiref.sync import sync_to_async
 from django.db import transaction , models
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.views.generic import ListView
 from django.utils.decorators import method_decorator
-from .models import Notification, Activite
+from .models import Notification, CompteurNotification, Activite
 from django.core.paginator import Paginator
 from django.db.models import Q
 
@@ -531,37 +543,22 @@ def affaire_detail(request, affaire_id):
         'atelier', 'categorie', 'collaborateur'
     ).order_by('-date_lancement')
     
-    # Statistiques de l'affaire
+    # Statistiques et poids de l'affaire (une seule requête d'agrégation)
+    counters = get_lancement_counters(affaire.lancements.all())
     lancements_stats = {
-        'total': lancements.count(),
-        'en_cours': lancements.filter(statut='en_cours').count(),
-        'termines': lancements.filter(statut='termine').count(),
-        'suspendus': lancements.filter(statut='suspendu').count(),
+        'total': counters['total'],
+        'en_cours': counters['en_cours'],
+        'termines': counters['termines'],
     }
     
-    # NOUVEAU CALCUL POIDS ADAPTÉ AUX NOUVEAUX CHAMPS
-    # Utiliser la nouvelle méthode get_poids_total() du modèle
     poids_total = {
-        'assemblage': 0,
-        'debitage_1': 0,
-        'debitage_2': 0,
-        'debitage_total': 0,
-        'global_total': 0
+        'assemblage': counters['poids_assemblage'],
+        'debitage_1': counters['poids_debitage_1'],
+        'debitage_2': counters['poids_debitage_2'],
+        'debitage_total': counters['poids_debitage'],
+        'global_total': counters['poids_total']
     }
     
-    for lancement in lancements:
-        if lancement.type_production == 'assemblage':
-            poids_assemblage = float(lancement.poids_assemblage or 0)
-            poids_total['assemblage'] += poids_assemblage
-            poids_total['global_total'] += poids_assemblage
-        elif lancement.type_production == 'debitage':
-            poids_deb1 = float(lancement.poids_debitage_1 or 0)
-            poids_deb2 = float(lancement.poids_debitage_2 or 0)
-            poids_total['debitage_1'] += poids_deb1
-            poids_total['debitage_2'] += poids_deb2
-            poids_total['debitage_total'] += (poids_deb1 + poids_deb2)
-            poids_total['global_total'] += (poids_deb1 + poids_deb2)
-    
     # Durée prévue vs réalisée - GESTION DES VALEURS NULL
     from datetime import date
     today = date.today()
@@ -780,11 +777,8 @@ def marquer_notification_lue_alt(request, notification_id):
         
         notification.marquer_comme_lu()
         
-        # Compter les notifications restantes
-        nb_restantes = Notification.objects.filter(
-            destinataire=collaborateur, 
-            lu=False
-        ).count()
+        # Notifications restantes, lues depuis le compteur dénormalisé
+        nb_restantes = CompteurNotification.get_non_lues(collaborateur.pk)
         
         return JsonResponse({
             'success': True,
@@ -809,19 +803,19 @@ def marquer_toutes_notifications_lues(request):
         else:
             collaborateur = request.user
         
-        notifications_non_lues = Notification.objects.filter(
-            destinataire=collaborateur,
-            lu=False
-        )
-        
-        count = notifications_non_lues.count()
-        
         # Marquer toutes comme lues
         from django.utils import timezone
-        notifications_non_lues.update(
-            lu=True,
-            date_lecture=timezone.now()
-        )
+        with transaction.atomic():
+            count = Notification.objects.filter(
+                destinataire=collaborateur,
+                lu=False
+            ).update(
+                lu=True,
+                date_lecture=timezone.now()
+            )
+            # update() n'envoie pas post_save
+            CompteurNotification.ajuster({collaborateur.pk: (0, -count)})
+            publish_unread_count(collaborateur.pk)
         
         return JsonResponse({
             'success': True,
@@ -838,36 +832,41 @@ def marquer_toutes_notifications_lues(request):
 
 @login_required
 def get_notifications_json(request):
-    """Récupère les notifications en JSON pour mise à jour dynamique"""
+    """
+    Récupère les notifications en JSON pour mise à jour dynamique.
+    Répond 304 si l'ETag envoyé (If-None-Match) correspond à la version
+    courante des notifications de l'utilisateur.
+    """
     try:
         if hasattr(request.user, 'collaborateur'):
             collaborateur = request.user.collaborateur
         else:
             collaborateur = request.user
         
-        notifications = Notification.objects.filter(
-            destinataire=collaborateur,
-            lu=False
-        ).order_by('-date_creation')[:10]
+        # Version lue avant les notifications : un changement concurrent produira un nouvel ETag
+        etag = get_notification_etag(collaborateur.pk)
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            return response
         
-        notifications_data = []
-        for notif in notifications:
-            notifications_data.append({
-                'id': notif.id,
-                'titre': notif.titre,
-                'message': notif.message,
-                'type': notif.type_notification,
-                'icon_class': notif.get_icon_class(),
-                'time_ago': notif.get_time_ago(),
-                'url_action': notif.url_action,
-                'date_creation': notif.date_creation.isoformat(),
-            })
+        # Pages suivantes via le paramètre `cursor` (champ next_cursor de la réponse)
+        page = KeysetPaginator(
+            Notification.objects.filter(destinataire=collaborateur, lu=False).defer('search_vector'), 10
+        ).page(request.GET.get('cursor'))
         
-        return JsonResponse({
+        notifications_data = [serialize_notification(notif) for notif in page.object_list]
+        
+        response = JsonResponse({
             'success': True,
             'notifications': notifications_data,
-            'count': len(notifications_data)
+            'count': CompteurNotification.get_non_lues(collaborateur.pk),
+            'next_cursor': page.next_cursor,
         })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         return JsonResponse({
@@ -876,13 +875,58 @@ def get_notifications_json(request):
         })
 
 
+async def notifications_stream(request):
+    """
+    Flux Server-Sent Events des notifications de l'utilisateur (ASGI uniquement).
+    Envoie le nombre de non lues à la connexion puis chaque nouvelle
+    notification et chaque changement du compteur. Sous WSGI, répond 204 :
+    le navigateur n'insiste pas et la navbar garde le polling.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    keepalive = getattr(settings, 'NOTIFICATIONS_STREAM_KEEPALIVE', 25)
+    queue = broker.subscribe(user.pk)
+    
+    async def event_stream():
+        try:
+            count = await sync_to_async(CompteurNotification.get_non_lues)(user.pk)
+            yield f"event: unread\ndata: {json.dumps({'count': count})}\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    # Commentaire SSE pour garder la connexion ouverte derrière les proxys
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+        finally:
+            broker.unsubscribe(user.pk, queue)
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def get_activites_recentes_json(request):
-    """Récupère les activités récentes en JSON"""
+    """
+    Récupère les activités récentes en JSON.
+    Les pages suivantes s'obtiennent avec le paramètre `cursor` (champ next_cursor de la réponse).
+    """
     try:
-        activites = Activite.objects.select_related(
-            'utilisateur', 'content_type'
-        ).order_by('-date_creation')[:15]
+        try:
+            limite = min(int(request.GET.get('limit', 15)), 100)
+        except ValueError:
+            limite = 15
+        page = KeysetPaginator(
+            Activite.objects.select_related('utilisateur', 'content_type').defer('search_vector'), limite
+        ).page(request.GET.get('cursor'))
+        activites = page.object_list
         
         activites_data = []
         for activite in activites:
@@ -906,7 +950,9 @@ def get_activites_recentes_json(request):
         
         return JsonResponse({
             'success': True,
-            'activites': activites_data
+            'activites': activites_data,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
         })
         
     except Exception as e:
@@ -920,8 +966,8 @@ def get_activites_recentes_json(request):
 # ========== VUES POUR LES PAGES NOTIFICATIONS ==========
 
 @method_decorator(login_required, name='dispatch')
-class NotificationsListView(ListView):
-    """Vue liste des notifications utilisateur"""
+class NotificationsListView(KeysetPaginationMixin, ListView):
+    """Vue liste des notifications utilisateur (pagination par curseur)"""
     model = Notification
     template_name = 'notifications/list.html'
     context_object_name = 'notifications'
@@ -935,9 +981,10 @@ class NotificationsListView(ListView):
         filter_status = self.request.GET.get('status', '')
         search = self.request.GET.get('search', '')
         
+        # search_vector ne sert qu'au filtre : inutile de le transférer pour chaque ligne
         queryset = Notification.objects.filter(
             destinataire=collaborateur
-        ).order_by('-date_creation')
+        ).defer('search_vector').order_by('-date_creation')
         
         if filter_type:
             queryset = queryset.filter(type_notification=filter_type)
@@ -948,10 +995,7 @@ class NotificationsListView(ListView):
             queryset = queryset.filter(lu=True)
         
         if search:
-            queryset = queryset.filter(
-                Q(titre__icontains=search) |
-                Q(message__icontains=search)
-            )
+            queryset = search_queryset(queryset, search, ['titre', 'message'])
         
         return queryset
     
@@ -960,11 +1004,12 @@ class NotificationsListView(ListView):
         
         collaborateur = self.request.user.collaborateur if hasattr(self.request.user, 'collaborateur') else self.request.user
         
-        # Statistiques
+        # Statistiques, lues depuis le compteur dénormalisé
+        total, non_lues = CompteurNotification.get_compteurs(collaborateur.pk)
         context['stats'] = {
-            'total': Notification.objects.filter(destinataire=collaborateur).count(),
-            'non_lues': Notification.objects.filter(destinataire=collaborateur, lu=False).count(),
-            'lues': Notification.objects.filter(destinataire=collaborateur, lu=True).count(),
+            'total': total,
+            'non_lues': non_lues,
+            'lues': total - non_lues,
         }
         
         # Filtres actuels
@@ -979,8 +1024,8 @@ class NotificationsListView(ListView):
 
 
 @method_decorator(login_required, name='dispatch')
-class ActivitesListView(ListView):
-    """Vue liste des activités système"""
+class ActivitesListView(KeysetPaginationMixin, ListView):
+    """Vue liste des activités système (pagination par curseur)"""
     model = Activite
     template_name = 'activites/list.html'
     context_object_name = 'activites'
@@ -995,7 +1040,7 @@ class ActivitesListView(ListView):
         
         queryset = Activite.objects.select_related(
             'utilisateur', 'content_type'
-        ).order_by('-date_creation')
+        ).defer('search_vector').order_by('-date_creation')
         
         if filter_module:
             queryset = queryset.filter(module=filter_module)
@@ -1007,9 +1052,7 @@ class ActivitesListView(ListView):
             queryset = queryset.filter(utilisateur_id=filter_user)
         
         if search:
-            queryset = queryset.filter(
-                Q(description__icontains=search)
-            )
+            queryset = search_queryset(queryset, search, ['description'])
         
         return queryset
     
@@ -1035,6 +1078,55 @@ class ActivitesListView(ListView):
         return context
 
 
+@permission_required('administration', 'read')
+def activites_archivees(request):
+    """
+    Consultation en lecture seule d'un fichier de l'archive des activités.
+    Le fichier est parcouru à la demande et seules les premières correspondances sont affichées.
+    """
+    from itertools import islice
+    from django.utils.dateparse import parse_datetime
+    from .utils.archives import iter_archived_activities, load_manifest
+    
+    limite = 200
+    fichiers = load_manifest()
+    fichier = request.GET.get('fichier', '')
+    filtres = {
+        'module': request.GET.get('module', ''),
+        'action': request.GET.get('action', ''),
+        'utilisateur_id': request.GET.get('user', ''),
+        'search': request.GET.get('search', ''),
+    }
+    
+    activites = []
+    if fichier:
+        try:
+            activites = list(islice(iter_archived_activities(fichier, **filtres), limite + 1))
+        except FileNotFoundError:
+            messages.error(request, "Fichier d'archive introuvable.")
+    
+    modules, actions = dict(Activite.MODULES), dict(Activite.ACTIONS)
+    for activite in activites:
+        activite['date_creation'] = parse_datetime(activite['date_creation'])
+        activite['module_display'] = modules.get(activite['module'], activite['module'])
+        activite['action_display'] = actions.get(activite['action'], activite['action'])
+    
+    context = {
+        'fichiers': fichiers,
+        'fichier': fichier,
+        'activites': activites[:limite],
+        'resultats_tronques': len(activites) > limite,
+        'limite': limite,
+        'modules': Activite.MODULES,
+        'actions': Activite.ACTIONS,
+        'filter_module': filtres['module'],
+        'filter_action': filtres['action'],
+        'filter_user': filtres['utilisateur_id'],
+        'search': filtres['search'],
+    }
+    return render(request, 'activites/archives.html', context)
+
+
 # ========== VUES POUR LE DASHBOARD AMÉLIORÉ ==========
 
 def dashboard_with_stats(request):
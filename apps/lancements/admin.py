@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Lancement
+from .models import Lancement, CompteurLancement
 
 @admin.register(Lancement)
 class LancementAdmin(admin.ModelAdmin):
@@ -91,4 +91,10 @@ class LancementAdmin(admin.ModelAdmin):
             # (nécessiterait du JavaScript côté client)
             pass
             
-        return form
\ No newline at end of file
+        return form
+
+@admin.register(CompteurLancement)
+class CompteurLancementAdmin(admin.ModelAdmin):
+    """Compteurs mensuels de la numérotation LC-AAAAMM-NNN"""
+    list_display = ('periode', 'dernier_numero')
+    ordering = ('-periode',)
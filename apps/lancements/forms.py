@@ -2,9 +2,10 @@
 
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
 from decimal import Decimal, InvalidOperation
-from .models import Lancement
+from .models import Lancement, CompteurLancement
 from apps.ateliers.models import Atelier, Categorie
 from apps.core.models import Affaire
 from apps.collaborateurs.models import Collaborateur
@@ -231,9 +232,11 @@ class LancementForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
+        # Sans numéro saisi, save() l'attribue depuis CompteurLancement
+        self.fields['num_lanc'].required = False
+        
         # Configuration pour la modification
         if self.instance.pk:
-            self.fields['num_lanc'].required = False
             self.fields['num_lanc'].widget.attrs.update({
                 'readonly': True,
                 'class': 'form-control',
@@ -305,7 +308,8 @@ class LancementForm(forms.ModelForm):
             return num_lanc
         
         if not self.instance.pk and not num_lanc:
-            return self.generate_lancement_number()
+            # Attribué à l'enregistrement : une saisie invalide ne consomme pas de numéro
+            return ''
         
         # UNICITÉ SUPPRIMÉE : on accepte les doublons
         return num_lanc
@@ -446,16 +450,7 @@ class LancementForm(forms.ModelForm):
             categorie = cleaned_data.get('categorie')
             
             if affaire and categorie:
-                # Vérifier si cette catégorie est associée à l'affaire
-                association_exists = AffaireCategorie.objects.filter(
-                    affaire=affaire,
-                    categorie=categorie
-                ).exists()
-                
-                # Si aucune association existe pour cette affaire, c'est OK (pas de restriction)
-                affaire_has_categories = AffaireCategorie.objects.filter(affaire=affaire).exists()
-                
-                if affaire_has_categories and not association_exists:
+                if not self.categorie_autorisee(affaire, categorie):
                     self.add_error(
                         'categorie',
                         f"La catégorie '{categorie.nom_categorie}' n'est pas associée à l'affaire '{affaire.code_affaire}'. "
@@ -470,17 +465,32 @@ class LancementForm(forms.ModelForm):
         
         return cleaned_data
 
+    def categorie_autorisee(self, affaire, categorie):
+        """Vérifie que la catégorie est associée à l'affaire (sans association : pas de restriction)"""
+        association_exists = AffaireCategorie.objects.filter(
+            affaire=affaire,
+            categorie=categorie
+        ).exists()
+        
+        # Si aucune association existe pour cette affaire, c'est OK (pas de restriction)
+        affaire_has_categories = AffaireCategorie.objects.filter(affaire=affaire).exists()
+        
+        return association_exists or not affaire_has_categories
+
     def save(self, commit=True):
         """Sauvegarde personnalisée du lancement"""
         try:
             lancement = super().save(commit=False)
             
-            # Générer un numéro automatique si nécessaire
-            if not lancement.pk and not lancement.num_lanc:
-                lancement.num_lanc = self.generate_lancement_number()
-            
             if commit:
-                lancement.save()
+                # Le numéro réservé revient au compteur si l'enregistrement échoue
+                with transaction.atomic():
+                    if not lancement.pk and not lancement.num_lanc:
+                        lancement.num_lanc = self.generate_lancement_number()
+                    lancement.save()
+            elif not lancement.pk and not lancement.num_lanc:
+                # Générer un numéro automatique si nécessaire
+                lancement.num_lanc = self.generate_lancement_number()
             
             return lancement
             
@@ -488,22 +498,9 @@ class LancementForm(forms.ModelForm):
             raise ValidationError(f"[SAUVEGARDE] Erreur lors de la sauvegarde: {str(e)}")
 
     def generate_lancement_number(self):
-        """Génère automatiquement un numéro de lancement unique"""
+        """Génère automatiquement le numéro de lancement suivant du mois (CompteurLancement)"""
         try:
-            from datetime import datetime
-            
-            year = datetime.now().year
-            month = datetime.now().month
-            
-            count = Lancement.objects.filter(
-                created_at__year=year,
-                created_at__month=month
-            ).count() + 1
-            
-            base_number = f"LC-{year}{month:02d}-{count:03d}"
-            
-            # UNICITÉ SUPPRIMÉE : on ne vérifie plus l'existence
-            return base_number
+            return CompteurLancement.allouer()[0]
             
         except Exception as e:
             import uuid
@@ -564,4 +561,30 @@ class LancementFilterForm(forms.Form):
             'type': 'date'
         }),
         label='Date de fin'
-    )
\ No newline at end of file
+    )
+
+class LancementImportFileForm(forms.Form):
+    """
+    Formulaire d'envoi d'un fichier de lancements à importer (CSV ou XLSX)
+    """
+    fichier = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xlsx'
+        }),
+        label='Fichier',
+        help_text='CSV (séparateur ; ou ,) ou XLSX, avec une ligne d\'en-têtes'
+    )
+    
+    simulation = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+        label='Simulation',
+        help_text='Valide le fichier et produit le rapport d\'erreurs sans rien enregistrer'
+    )
+    
+    def clean_fichier(self):
+        fichier = self.cleaned_data.get('fichier')
+        if fichier and not fichier.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError("Format de fichier non supporté : CSV ou XLSX attendu.")
+        return fichier
@@ -0,0 +1,476 @@
+"""
+Import en masse de lancements depuis un planning (CSV ou XLSX).
+
+Les lignes sont lues en flux (csv.reader, openpyxl en lecture seule). Les
+affaires, ateliers, catégories et collaborateurs sont résolus par clé
+naturelle (code, nom, email) dans des dictionnaires chargés une fois pour
+tout l'import. Chaque ligne est validée par LancementImportForm, qui applique
+les règles de LancementForm sans requête par ligne.
+
+Les lancements valides sont insérés par lots : un bulk_create, un seul upsert
+des associations (Lancement.create_associations_bulk), une activité et des
+notifications récapitulatives par lot. Les lignes rejetées sont écrites dans
+un rapport CSV sous LANCEMENTS_IMPORT_DIR (hors MEDIA_ROOT : jamais servi
+statiquement). Le nom du rapport porte l'identifiant de son auteur, seul à
+pouvoir le télécharger ; les rapports expirés sont supprimés à l'écriture
+des suivants.
+"""
+import csv
+import io
+import os
+import re
+import time
+import uuid
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from django.forms.models import construct_instance
+from django.utils import timezone
+
+from apps.associations.models import AffaireCategorie
+from apps.ateliers.models import Atelier, Categorie
+from apps.collaborateurs.models import Collaborateur
+from apps.core.models import Affaire
+from .forms import LancementForm
+from .models import Lancement, CompteurLancement
+
+try:
+    import openpyxl
+except ImportError:  # dépendance optionnelle (fichiers .xlsx)
+    openpyxl = None
+
+# Clé présente pour plusieurs objets : la ligne doit être corrigée
+AMBIGU = object()
+
+# En-têtes acceptés pour chaque champ de LancementForm (comparés sans casse)
+COLONNES = {
+    'num_lanc': ('num_lanc', 'numero', 'numéro', 'numéro de lancement', 'numero de lancement'),
+    'affaire': ('affaire', 'code_affaire', 'code affaire'),
+    'sous_livrable': ('sous_livrable', 'sous-livrable', 'sous livrable'),
+    'date_reception': ('date_reception', 'date de réception', 'date reception'),
+    'date_lancement': ('date_lancement', 'date de lancement', 'date lancement'),
+    'atelier': ('atelier', 'nom_atelier'),
+    'categorie': ('categorie', 'catégorie', 'nom_categorie'),
+    'collaborateur': ('collaborateur', 'collaborateur responsable', 'email'),
+    'type_production': ('type_production', 'type de production'),
+    'poids_assemblage': ('poids_assemblage', 'poids assemblage', 'poids assemblage (kg)'),
+    'poids_debitage_1': ('poids_debitage_1', 'poids débitage 1', 'poids débitage 1 (kg)'),
+    'poids_debitage_2': ('poids_debitage_2', 'poids débitage 2', 'poids débitage 2 (kg)'),
+    'observations': ('observations',),
+    'statut': ('statut',),
+}
+ALIAS = {alias: champ for champ, aliases in COLONNES.items() for alias in aliases}
+COLONNES_REQUISES = {'affaire', 'sous_livrable', 'date_reception', 'atelier', 'categorie', 'collaborateur', 'type_production'}
+
+# rapport_import_<pk de l'auteur, 0 sans auteur>_<horodatage>_<aléa>.csv
+RAPPORT_RE = re.compile(r'^rapport_import_(\d+)_\d{14}_[0-9a-f]{8}\.csv$')
+
+
+def normaliser_cle(valeur):
+    if valeur is None:
+        return ''
+    return ' '.join(str(valeur).split()).lower()
+
+
+def _indexer(objets, cles):
+    """Index {clé normalisée: objet} ; une clé partagée par plusieurs objets vaut AMBIGU"""
+    index = {}
+    for objet in objets:
+        for cle in {normaliser_cle(cle) for cle in cles(objet)} - {''}:
+            index[cle] = AMBIGU if cle in index else objet
+    return index
+
+
+def _choix(choices):
+    """Accepte la valeur ou le libellé d'un choix"""
+    correspondances = {}
+    for valeur, libelle in choices:
+        correspondances[normaliser_cle(valeur)] = valeur
+        correspondances[normaliser_cle(libelle)] = valeur
+    return correspondances
+
+
+class References:
+    """Objets référencés par les lignes, chargés en quelques requêtes pour tout l'import"""
+
+    def __init__(self):
+        # Mêmes restrictions que LancementForm en création
+        self.affaires = _indexer(
+            Affaire.objects.filter(statut__in=['en_cours', 'planifie']),
+            lambda affaire: [affaire.code_affaire],
+        )
+        self.ateliers = _indexer(
+            Atelier.objects.select_related('responsable_atelier'),
+            lambda atelier: [atelier.nom_atelier],
+        )
+        self.categories = _indexer(
+            Categorie.objects.all(),
+            lambda categorie: [categorie.nom_categorie],
+        )
+        self.collaborateurs = _indexer(
+            Collaborateur.objects.filter(is_active=True),
+            lambda collaborateur: [
+                collaborateur.email,
+                collaborateur.get_full_name(),
+                f"{collaborateur.prenom_collaborateur} {collaborateur.nom_collaborateur}",
+            ],
+        )
+        self.categories_par_affaire = {}
+        for affaire_id, categorie_id in AffaireCategorie.objects.values_list('affaire_id', 'categorie_id'):
+            self.categories_par_affaire.setdefault(affaire_id, set()).add(categorie_id)
+        self.types_production = _choix(Lancement.TYPE_PRODUCTION_CHOICES)
+        self.statuts = _choix(Lancement._meta.get_field('statut').choices)
+
+
+class CleNaturelleField(forms.Field):
+    """Résout une clé naturelle dans un index préchargé, sans requête"""
+
+    def __init__(self, index, **kwargs):
+        self.index = index
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        objet = self.index.get(normaliser_cle(value))
+        if objet is None:
+            raise ValidationError(f"{self.label} introuvable : {value}", code='invalid_choice')
+        if objet is AMBIGU:
+            raise ValidationError(f"{self.label} ambigu(e) : plusieurs correspondances pour {value}", code='ambiguous')
+        return objet
+
+
+class LancementImportForm(LancementForm):
+    """
+    LancementForm appliqué à une ligne d'import : clés étrangères résolues par
+    les References, cohérence affaire-catégorie vérifiée sur les associations préchargées
+    """
+
+    def __init__(self, *args, references, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.references = references
+        for champ, index in (
+            ('affaire', references.affaires),
+            ('atelier', references.ateliers),
+            ('categorie', references.categories),
+            ('collaborateur', references.collaborateurs),
+        ):
+            self.fields[champ] = CleNaturelleField(index, label=self.fields[champ].label)
+        # Numéro attribué à l'insertion du lot s'il est absent
+        self.fields['num_lanc'].required = False
+
+    def clean_num_lanc(self):
+        return self.cleaned_data.get('num_lanc') or ''
+
+    def categorie_autorisee(self, affaire, categorie):
+        categories = self.references.categories_par_affaire.get(affaire.pk)
+        return not categories or categorie.pk in categories
+
+    def _post_clean(self):
+        # Pas de Model.full_clean() : il relirait chaque clé étrangère (une requête par champ)
+        self.instance = construct_instance(self, self.instance, self._meta.fields, self._meta.exclude)
+
+
+# ===== LECTURE DES FICHIERS =====
+
+def _lire_csv(fichier):
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    echantillon = texte.read(4096)
+    texte.seek(0)
+    try:
+        reader = csv.reader(texte, csv.Sniffer().sniff(echantillon, delimiters=';,\t'))
+    except csv.Error:
+        # Séparateur des exports CSV de l'application
+        reader = csv.reader(texte, delimiter=';')
+    try:
+        yield from reader
+    finally:
+        # Le flux binaire appartient à l'appelant
+        texte.detach()
+
+
+def _lire_xlsx(fichier):
+    if openpyxl is None:
+        raise ImproperlyConfigured("L'import de fichiers XLSX nécessite le paquet 'openpyxl'.")
+    classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        yield from classeur.active.iter_rows(values_only=True)
+    finally:
+        classeur.close()
+
+
+def lire_lignes(fichier, nom_fichier):
+    """
+    Parcourt un fichier binaire CSV ou XLSX : (numéro de ligne, {champ: valeur}),
+    la première ligne donnant les en-têtes. Les lignes vides sont ignorées.
+    """
+    if nom_fichier.lower().endswith('.xlsx'):
+        lignes = _lire_xlsx(fichier)
+    elif nom_fichier.lower().endswith('.csv'):
+        lignes = _lire_csv(fichier)
+    else:
+        raise ValidationError("Format de fichier non supporté : CSV ou XLSX attendu.")
+
+    entetes = None
+    for numero, valeurs in enumerate(lignes, start=1):
+        if entetes is None:
+            entetes = [ALIAS.get(normaliser_cle(valeur)) for valeur in valeurs]
+            manquantes = COLONNES_REQUISES - set(entetes)
+            if manquantes:
+                raise ValidationError(f"Colonnes manquantes : {', '.join(sorted(manquantes))}")
+            continue
+        if all(valeur in (None, '') for valeur in valeurs):
+            continue
+        yield numero, {champ: valeur for champ, valeur in zip(entetes, valeurs) if champ}
+
+
+def _preparer(donnees, references):
+    """Données de formulaire d'une ligne : textes nettoyés, choix par valeur ou libellé"""
+    data = {}
+    for champ, valeur in donnees.items():
+        if isinstance(valeur, str):
+            valeur = valeur.strip()
+        if hasattr(valeur, 'date') and champ.startswith('date_'):
+            # Cellule XLSX datetime
+            valeur = valeur.date()
+        data[champ] = '' if valeur is None else valeur
+    data['type_production'] = references.types_production.get(
+        normaliser_cle(data.get('type_production')), data.get('type_production', '')
+    )
+    data['statut'] = references.statuts.get(normaliser_cle(data.get('statut')), data.get('statut') or 'planifie')
+    return data
+
+
+# ===== INSERTION PAR LOTS =====
+
+def numeroter(lancements):
+    """Attribue aux lancements sans numéro un bloc de numéros du compteur mensuel"""
+    sans_numero = [lancement for lancement in lancements if not lancement.num_lanc]
+    if not sans_numero:
+        return
+    for lancement, numero in zip(sans_numero, CompteurLancement.allouer(len(sans_numero))):
+        lancement.num_lanc = numero
+
+
+def _notifier_lot(lancements, utilisateur):
+    """Une notification par destinataire et par lot, au lieu d'une par lancement"""
+    from apps.core.models import Notification
+    from apps.core.signals import NotificationService
+
+    assignes, ateliers = {}, {}
+    for lancement in lancements:
+        if lancement.collaborateur_id != getattr(utilisateur, 'pk', None):
+            assignes.setdefault(lancement.collaborateur_id, []).append(lancement.num_lanc)
+        responsable_id = lancement.atelier.responsable_atelier_id
+        if responsable_id:
+            ateliers.setdefault(responsable_id, []).append(lancement.num_lanc)
+
+    def apercu(numeros):
+        suite = f" (+{len(numeros) - 5})" if len(numeros) > 5 else ''
+        return ', '.join(numeros[:5]) + suite
+
+    notifications = [
+        Notification(
+            destinataire_id=destinataire_id,
+            type_notification='success',
+            titre='Nouveaux lancements assignés',
+            message=f'{len(numeros)} lancement(s) importé(s) vous ont été assignés : {apercu(numeros)}',
+            url_action='/lancements/',
+        )
+        for destinataire_id, numeros in assignes.items()
+    ] + [
+        Notification(
+            destinataire_id=destinataire_id,
+            type_notification='info',
+            titre='Nouveaux lancements dans votre atelier',
+            message=f'{len(numeros)} lancement(s) importé(s) ont été assignés à votre atelier : {apercu(numeros)}',
+            url_action='/lancements/',
+        )
+        for destinataire_id, numeros in ateliers.items()
+    ]
+    NotificationService.creer_notifications(notifications)
+
+    importants = [lancement.num_lanc for lancement in lancements if lancement.get_poids_total() > 1000]
+    if importants:
+        NotificationService.creer_notification_pour_role(
+            role_name='Manager',
+            type_notif='warning',
+            titre='Lancements importants importés',
+            message=f'{len(importants)} lancement(s) importé(s) dépassent une tonne : {apercu(importants)}',
+            url_action='/lancements/',
+        )
+
+
+def inserer_lot(lancements, nom_fichier, utilisateur=None, request=None):
+    """Insère un lot de lancements validés avec ses associations, son activité et ses notifications"""
+    from apps.core.signals import log_import_activity
+    from apps.core.stats import invalidate_dashboard_stats
+
+    # Bloc de numéros réservé hors de la transaction du lot : le compteur
+    # n'est pas verrouillé pendant l'insertion (un lot annulé laisse un trou)
+    numeroter(lancements)
+    with transaction.atomic():
+        Lancement.objects.bulk_create(lancements)
+        Lancement.create_associations_bulk(lancements)
+        log_import_activity(
+            utilisateur,
+            'lancements',
+            f"Import de {len(lancements)} lancement(s) depuis {nom_fichier} : "
+            f"{lancements[0].num_lanc} à {lancements[-1].num_lanc}",
+            request=request,
+        )
+        _notifier_lot(lancements, utilisateur)
+    # bulk_create n'envoie pas post_save
+    invalidate_dashboard_stats()
+
+
+# ===== RAPPORT D'ERREURS =====
+
+def get_import_dir():
+    return str(getattr(
+        settings, 'LANCEMENTS_IMPORT_DIR', os.path.join(settings.BASE_DIR, 'private', 'imports', 'lancements')
+    ))
+
+
+def get_rapport_path(nom, utilisateur=None):
+    """
+    Chemin d'un rapport existant appartenant à `utilisateur` (None si le nom ne
+    désigne pas un rapport d'import ou si le rapport est celui d'un autre)
+    """
+    correspondance = RAPPORT_RE.match(nom or '')
+    if not correspondance:
+        return None
+    if utilisateur is not None and int(correspondance.group(1)) != utilisateur.pk:
+        return None
+    chemin = os.path.join(get_import_dir(), nom)
+    return chemin if os.path.exists(chemin) else None
+
+
+def purger_rapports(jours=None):
+    """Supprime les rapports plus anciens que LANCEMENTS_IMPORT_REPORT_RETENTION_DAYS ; retourne leur nombre"""
+    if jours is None:
+        jours = getattr(settings, 'LANCEMENTS_IMPORT_REPORT_RETENTION_DAYS', 7)
+    dossier = get_import_dir()
+    if not os.path.isdir(dossier):
+        return 0
+    limite = time.time() - jours * 86400
+    nb = 0
+    for nom in os.listdir(dossier):
+        chemin = os.path.join(dossier, nom)
+        try:
+            if RAPPORT_RE.match(nom) and os.path.getmtime(chemin) < limite:
+                os.remove(chemin)
+                nb += 1
+        except FileNotFoundError:
+            # Supprimé entre-temps par un autre import
+            pass
+    return nb
+
+
+def ecrire_rapport(erreurs, utilisateur=None):
+    """Écrit les lignes rejetées (CSV ;) et retourne le nom du rapport"""
+    purger_rapports()
+    os.makedirs(get_import_dir(), exist_ok=True)
+    auteur = getattr(utilisateur, 'pk', None) or 0
+    nom = f"rapport_import_{auteur}_{timezone.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.csv"
+    colonnes = list(COLONNES)
+    with open(os.path.join(get_import_dir(), nom), 'w', encoding='utf-8-sig', newline='') as fichier:
+        writer = csv.writer(fichier, delimiter=';')
+        writer.writerow(['Ligne', 'Erreurs'] + colonnes)
+        for numero, messages, donnees in erreurs:
+            writer.writerow(
+                [numero, ' | '.join(messages)]
+                + ['' if donnees.get(colonne) is None else donnees.get(colonne) for colonne in colonnes]
+            )
+    return nom
+
+
+def _messages_erreur(form):
+    messages = []
+    for champ, erreurs in form.errors.items():
+        libelle = form.fields[champ].label if champ in form.fields else None
+        for erreur in erreurs:
+            messages.append(f"{libelle}: {erreur}" if libelle else erreur)
+    return messages
+
+
+class ImportInterrompu(Exception):
+    """Échec de l'insertion d'un lot : les lots précédents restent enregistrés"""
+
+    def __init__(self, resultat, premiere_ligne, derniere_ligne, cause):
+        self.resultat = resultat
+        self.premiere_ligne = premiere_ligne
+        self.derniere_ligne = derniere_ligne
+        super().__init__(
+            f"échec de l'insertion du lot des lignes {premiere_ligne} à {derniere_ligne} ({cause}). "
+            f"{resultat.nb_crees} lancement(s) des lignes précédentes restent enregistrés ; "
+            f"les lignes à partir de la ligne {premiere_ligne} n'ont pas été importées."
+        )
+
+
+class ResultatImport:
+    """Bilan d'un import"""
+
+    def __init__(self, nom_fichier, simulation=False):
+        self.nom_fichier = nom_fichier
+        self.simulation = simulation
+        self.nb_lignes = 0
+        self.nb_valides = 0
+        self.nb_crees = 0
+        self.nb_lots = 0
+        self.erreurs = []
+        self.rapport = None
+
+    @property
+    def nb_erreurs(self):
+        return len(self.erreurs)
+
+
+def importer_lancements(fichier, nom_fichier, utilisateur=None, request=None, chunk_size=None,
+                        simulation=False, progress=None):
+    """
+    Importe les lancements d'un fichier CSV/XLSX (flux binaire) ; retourne un ResultatImport.
+    Avec simulation, les lignes sont seulement validées. `progress` reçoit le
+    ResultatImport après chaque lot inséré.
+    Chaque lot est validé séparément : si l'un échoue, ImportInterrompu porte le
+    bilan partiel (lots déjà enregistrés, rapport des lignes rejetées jusque-là).
+    """
+    chunk_size = chunk_size or getattr(settings, 'LANCEMENTS_IMPORT_CHUNK_SIZE', 500)
+    references = References()
+    resultat = ResultatImport(nom_fichier, simulation)
+    lot = []
+    lignes_lot = []
+
+    def vider():
+        if lot and not simulation:
+            try:
+                inserer_lot(lot, nom_fichier, utilisateur, request)
+            except Exception as e:
+                if resultat.erreurs:
+                    resultat.rapport = ecrire_rapport(resultat.erreurs, utilisateur)
+                raise ImportInterrompu(resultat, lignes_lot[0], lignes_lot[-1], e) from e
+            resultat.nb_crees += len(lot)
+            resultat.nb_lots += 1
+            if progress:
+                progress(resultat)
+        lot.clear()
+        lignes_lot.clear()
+
+    for numero, donnees in lire_lignes(fichier, nom_fichier):
+        resultat.nb_lignes += 1
+        form = LancementImportForm(data=_preparer(donnees, references), references=references)
+        if form.is_valid():
+            resultat.nb_valides += 1
+            lot.append(form.instance)
+            lignes_lot.append(numero)
+            if len(lot) >= chunk_size:
+                vider()
+        else:
+            resultat.erreurs.append((numero, _messages_erreur(form), donnees))
+    vider()
+
+    if resultat.erreurs:
+        resultat.rapport = ecrire_rapport(resultat.erreurs, utilisateur)
+    return resultat
@@ -0,0 +1,88 @@
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.collaborateurs.models import Collaborateur
+from apps.core.utils.activity_writer import activity_buffer
+from apps.lancements.imports import ImportInterrompu, get_import_dir, importer_lancements
+
+
+class Command(BaseCommand):
+    help = (
+        'Importe des lancements depuis un planning CSV ou XLSX : validation ligne par ligne, '
+        'insertion par lots et rapport des lignes rejetées'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help='Chemin du fichier .csv ou .xlsx')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=getattr(settings, 'LANCEMENTS_IMPORT_CHUNK_SIZE', 500),
+            help='Nombre de lancements insérés par lot (défaut: LANCEMENTS_IMPORT_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email du collaborateur à qui attribuer l\'import dans le journal des activités',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Valider le fichier et produire le rapport d\'erreurs sans rien enregistrer',
+        )
+
+    def progress(self, resultat):
+        if self.verbosity >= 2:
+            self.stdout.write(f'  lot {resultat.nb_lots} : {resultat.nb_crees} lancement(s) créés au total')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        chemin = options['fichier']
+        if not os.path.exists(chemin):
+            raise CommandError(f'Fichier introuvable : {chemin}')
+
+        utilisateur = None
+        if options['user']:
+            utilisateur = Collaborateur.objects.filter(email=options['user']).first()
+            if utilisateur is None:
+                raise CommandError(f'Collaborateur introuvable : {options["user"]}')
+
+        try:
+            # Activités des lots écrites en un seul INSERT, comme dans une requête
+            with activity_buffer(), open(chemin, 'rb') as fichier:
+                resultat = importer_lancements(
+                    fichier,
+                    os.path.basename(chemin),
+                    utilisateur=utilisateur,
+                    chunk_size=options['chunk_size'],
+                    simulation=options['dry_run'],
+                    progress=self.progress,
+                )
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+        except ImportInterrompu as e:
+            if e.resultat.rapport:
+                self.stdout.write(self.style.WARNING(
+                    f'{e.resultat.nb_erreurs} ligne(s) rejetée(s) avant l\'interruption, rapport : '
+                    f'{os.path.join(get_import_dir(), e.resultat.rapport)}'
+                ))
+            raise CommandError(f'Import interrompu : {e}')
+
+        if resultat.simulation:
+            self.stdout.write(f'{resultat.nb_valides} ligne(s) valide(s) sur {resultat.nb_lignes} (simulation)')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{resultat.nb_crees} lancement(s) importé(s) sur {resultat.nb_lignes} ligne(s) '
+                f'en {resultat.nb_lots} lot(s)'
+            ))
+
+        if resultat.nb_erreurs:
+            if self.verbosity >= 2:
+                for numero, messages, _ in resultat.erreurs:
+                    self.stdout.write(f'  ligne {numero} : {" | ".join(messages)}')
+            self.stdout.write(self.style.WARNING(
+                f'{resultat.nb_erreurs} ligne(s) rejetée(s), rapport : '
+                f'{os.path.join(get_import_dir(), resultat.rapport)}'
+            ))
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lancements', '0006_remove_lancement_poids_debitage_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurLancement',
+            fields=[
+                ('periode', models.CharField(max_length=6, primary_key=True, serialize=False, verbose_name='Période (AAAAMM)')),
+                ('dernier_numero', models.PositiveIntegerField(default=0, verbose_name='Dernier numéro attribué')),
+            ],
+            options={
+                'verbose_name': 'Compteur de lancements',
+                'verbose_name_plural': 'Compteurs de lancements',
+                'db_table': 'compteur_lancement',
+            },
+        ),
+    ]
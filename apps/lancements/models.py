@@ -1,15 +1,17 @@
 # apps/lancements/models.py - MODIFIÉ avec nouveaux champs de poids
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from apps.collaborateurs.models import Collaborateur
 from apps.ateliers.models import Atelier, Categorie
 from apps.core.models import Affaire
+from apps.core.utils.tracking import FieldTrackerMixin
 import logging
 
 # Configuration du logger
 logger = logging.getLogger(__name__)
 
-class Lancement(models.Model):
+class Lancement(FieldTrackerMixin, models.Model):
     """
     Modèle central représentant un lancement de production.
     C'est la table principale qui lie tous les autres éléments :
@@ -148,6 +150,15 @@ class Lancement(models.Model):
             return False
         return self.date_lancement < timezone.now().date()
 
+    # Clés étrangères dont dérivent les associations
+    ASSOCIATION_FIELDS = ('collaborateur', 'atelier', 'categorie')
+
+    # Champs comparés par les signaux (FieldTrackerMixin)
+    tracked_fields = (
+        'num_lanc', 'statut', 'atelier', 'collaborateur', 'categorie',
+        'poids_assemblage', 'poids_debitage_1', 'poids_debitage_2',
+    )
+
     def create_associations(self):
         """
         Crée automatiquement les associations dans les tables :
@@ -155,75 +166,62 @@ class Lancement(models.Model):
         - CollaborateurCategorie  
         - AtelierCategorie
         """
-        try:
-            # Import des modèles d'association
-            from apps.ateliers.models import (
-                CollaborateurAtelier, 
-                CollaborateurCategorie, 
-                AtelierCategorie
-            )
-            
-            # Vérifier que tous les éléments nécessaires sont présents
-            if not all([self.collaborateur_id, self.atelier_id, self.categorie_id]):
-                logger.warning(f"⚠️ Données manquantes pour créer les associations du lancement {self.num_lanc}")
-                return
-            
-            associations_created = 0
-            
-            # 1. ASSOCIATION COLLABORATEUR-ATELIER
-            try:
-                collab_atelier, created = CollaborateurAtelier.objects.get_or_create(
-                    collaborateur_id=self.collaborateur_id,
-                    atelier_id=self.atelier_id
-                )
-                if created:
-                    associations_created += 1
-                    logger.info(f"✅ Association CollaborateurAtelier créée : "
-                               f"Collaborateur({self.collaborateur_id}) ↔ Atelier({self.atelier_id})")
-            except Exception as e:
-                logger.error(f"❌ Erreur création CollaborateurAtelier : {str(e)}")
-            
-            # 2. ASSOCIATION COLLABORATEUR-CATEGORIE
-            try:
-                collab_categorie, created = CollaborateurCategorie.objects.get_or_create(
-                    collaborateur_id=self.collaborateur_id,
-                    categorie_id=self.categorie_id
-                )
-                if created:
-                    associations_created += 1
-                    logger.info(f"✅ Association CollaborateurCategorie créée : "
-                               f"Collaborateur({self.collaborateur_id}) ↔ Categorie({self.categorie_id})")
-            except Exception as e:
-                logger.error(f"❌ Erreur création CollaborateurCategorie : {str(e)}")
-            
-            # 3. ASSOCIATION ATELIER-CATEGORIE
+        self.create_associations_bulk([self])
+
+    @classmethod
+    def create_associations_bulk(cls, lancements):
+        """
+        Version ensembliste de create_associations pour plusieurs lancements :
+        les couples distincts sont calculés en Python puis insérés avec un seul
+        INSERT ... ON CONFLICT DO NOTHING par table (les couples déjà présents
+        sont ignorés par la contrainte unique_together).
+        """
+        from apps.ateliers.models import (
+            CollaborateurAtelier, 
+            CollaborateurCategorie, 
+            AtelierCategorie
+        )
+
+        triplets = set()
+        for lancement in lancements:
+            triplet = (lancement.collaborateur_id, lancement.atelier_id, lancement.categorie_id)
+            if all(triplet):
+                triplets.add(triplet)
+            else:
+                logger.warning(f"⚠️ Données manquantes pour créer les associations du lancement {lancement.num_lanc}")
+        if not triplets:
+            return
+
+        tables = [
+            (CollaborateurAtelier, {(c, a) for c, a, _ in triplets}, ('collaborateur_id', 'atelier_id')),
+            (CollaborateurCategorie, {(c, cat) for c, _, cat in triplets}, ('collaborateur_id', 'categorie_id')),
+            (AtelierCategorie, {(a, cat) for _, a, cat in triplets}, ('atelier_id', 'categorie_id')),
+        ]
+        for model, couples, champs in tables:
             try:
-                atelier_categorie, created = AtelierCategorie.objects.get_or_create(
-                    atelier_id=self.atelier_id,
-                    categorie_id=self.categorie_id
+                model.objects.bulk_create(
+                    [model(**dict(zip(champs, couple))) for couple in sorted(couples)],
+                    ignore_conflicts=True,
                 )
-                if created:
-                    associations_created += 1
-                    logger.info(f"✅ Association AtelierCategorie créée : "
-                               f"Atelier({self.atelier_id}) ↔ Categorie({self.categorie_id})")
             except Exception as e:
-                logger.error(f"❌ Erreur création AtelierCategorie : {str(e)}")
-            
-            # Log du résumé
-            logger.info(f"📊 Lancement {self.num_lanc} : {associations_created} nouvelles associations créées")
-            
-        except Exception as e:
-            logger.error(f"❌ Erreur générale lors de la création des associations pour {self.num_lanc} : {str(e)}")
+                logger.error(f"❌ Erreur création {model.__name__} : {str(e)}")
+
+        logger.info(f"📊 Associations synchronisées pour {len(triplets)} combinaison(s) collaborateur/atelier/catégorie")
 
     def save(self, *args, **kwargs):
         """
-        Méthode save() personnalisée pour créer automatiquement les associations
+        Méthode save() personnalisée pour créer automatiquement les associations,
+        uniquement si le collaborateur, l'atelier ou la catégorie ont changé
         """
+        changes = self.changed_fields(kwargs.get('update_fields'))
+        a_synchroniser = self._state.adding or any(champ in changes for champ in self.ASSOCIATION_FIELDS)
+
         # Sauvegarder d'abord le lancement
         super().save(*args, **kwargs)
         
         # Puis créer les associations automatiquement
-        self.create_associations()
+        if a_synchroniser:
+            self.create_associations()
 
     class Meta:
         db_table = 'lancement'
@@ -236,4 +234,56 @@ class Lancement(models.Model):
             models.Index(fields=['affaire']),
             models.Index(fields=['atelier']),
             models.Index(fields=['type_production']),
-        ]
\ No newline at end of file
+        ]
+
+
+class CompteurLancement(models.Model):
+    """
+    Compteur mensuel des numéros de lancement (LC-AAAAMM-NNN).
+    Une ligne par mois : attribuer un numéro (ou un bloc de numéros) est un
+    UPDATE de cette ligne, sans comptage des lancements. Le verrou de ligne
+    posé par l'UPDATE sérialise les créations concurrentes jusqu'au commit.
+    """
+    periode = models.CharField(max_length=6, primary_key=True, verbose_name="Période (AAAAMM)")
+    dernier_numero = models.PositiveIntegerField(default=0, verbose_name="Dernier numéro attribué")
+
+    def __str__(self):
+        return f"{self.periode} : {self.dernier_numero}"
+
+    @staticmethod
+    def formater(periode, numero):
+        return f"LC-{periode}-{numero:03d}"
+
+    @classmethod
+    def _initialiser(cls, periode):
+        """Crée la ligne du mois à la suite des numéros déjà attribués (une fois par mois)"""
+        prefixe = cls.formater(periode, 0)[:-3]
+        dernier = 0
+        numeros = Lancement.objects.filter(num_lanc__startswith=prefixe).values_list('num_lanc', flat=True)
+        for num_lanc in numeros.iterator():
+            suffixe = num_lanc[len(prefixe):]
+            if suffixe.isdigit():
+                dernier = max(dernier, int(suffixe))
+        # Deux initialisations concurrentes : la seconde est ignorée
+        cls.objects.bulk_create([cls(periode=periode, dernier_numero=dernier)], ignore_conflicts=True)
+
+    @classmethod
+    def allouer(cls, nombre=1, moment=None):
+        """
+        Réserve `nombre` numéros consécutifs du mois de `moment` (maintenant par
+        défaut) et les retourne. Appelé dans une transaction, le compteur reste
+        verrouillé jusqu'à son commit et revient en arrière avec elle.
+        """
+        periode = timezone.localtime(moment).strftime('%Y%m')
+        compteur = cls.objects.filter(periode=periode)
+        with transaction.atomic():
+            if not compteur.update(dernier_numero=models.F('dernier_numero') + nombre):
+                cls._initialiser(periode)
+                compteur.update(dernier_numero=models.F('dernier_numero') + nombre)
+            dernier = compteur.values_list('dernier_numero', flat=True).get()
+        return [cls.formater(periode, numero) for numero in range(dernier - nombre + 1, dernier + 1)]
+
+    class Meta:
+        db_table = 'compteur_lancement'
+        verbose_name = 'Compteur de lancements'
+        verbose_name_plural = 'Compteurs de lancements'
@@ -1,3 +1,155 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.associations.models import AffaireCategorie
+from apps.ateliers.models import Atelier, Categorie
+from apps.collaborateurs.models import Collaborateur
+from apps.core.models import Activite, Affaire
+from apps.lancements.forms import LancementForm
+from apps.lancements.imports import get_rapport_path, importer_lancements, lire_lignes
+from apps.lancements.models import CompteurLancement, Lancement
+
+
+class CompteurLancementTests(TestCase):
+    """Attribution des numéros de lancement par le compteur mensuel"""
+
+    @staticmethod
+    def _rangs(numeros):
+        return [int(numero.rsplit('-', 1)[1]) for numero in numeros]
+
+    def test_blocs_consecutifs(self):
+        premier_bloc = CompteurLancement.allouer(3)
+        second_bloc = CompteurLancement.allouer(3)
+        rangs = self._rangs(premier_bloc + second_bloc)
+        self.assertEqual(rangs, list(range(rangs[0], rangs[0] + 6)))
+
+    def test_formulaire_invalide_ne_consomme_pas_de_numero(self):
+        form = LancementForm(data={'num_lanc': ''})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.cleaned_data.get('num_lanc'), '')
+        self.assertFalse(CompteurLancement.objects.exists())
+
+
+class ImportLancementsTests(TestCase):
+    """Import en masse (apps.lancements.imports)"""
+
+    ENTETES = (
+        'Code affaire', 'Sous-livrable', 'Date de réception', 'Atelier',
+        'Catégorie', 'Email', 'Type de production', 'Poids assemblage',
+    )
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        reglages = override_settings(LANCEMENTS_IMPORT_DIR=self.dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        self.user = Collaborateur.objects.create_user('import@example.com', 'Bernard', 'Anne', 'secret')
+        self.affaire = Affaire.objects.create(code_affaire='AFF-001', statut='en_cours')
+        self.atelier = Atelier.objects.create(nom_atelier='Atelier Nord', type_atelier='fabrication')
+        self.tolerie = Categorie.objects.create(nom_categorie='Tôlerie')
+        self.peinture = Categorie.objects.create(nom_categorie='Peinture')
+
+    def ligne(self, **valeurs):
+        ligne = {
+            'affaire': 'aff-001', 'sous_livrable': 'Châssis', 'date_reception': '2025-01-15',
+            'atelier': 'atelier nord', 'categorie': 'Tôlerie', 'collaborateur': 'import@example.com',
+            'type_production': 'Assemblage', 'poids_assemblage': '12',
+        }
+        ligne.update(valeurs)
+        return list(ligne.values())
+
+    def fichier(self, lignes, entetes=ENTETES):
+        contenu = '\n'.join(';'.join(ligne) for ligne in [entetes, *lignes])
+        return io.BytesIO(contenu.encode('utf-8'))
+
+    def importer(self, lignes, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return importer_lancements(self.fichier(lignes), 'planning.csv', utilisateur=self.user, **kwargs)
+
+    def test_alias_des_entetes(self):
+        lignes = list(lire_lignes(self.fichier([self.ligne()]), 'planning.csv'))
+        self.assertEqual(lignes[0][0], 2)
+        self.assertEqual(lignes[0][1]['affaire'], 'aff-001')
+        self.assertEqual(lignes[0][1]['collaborateur'], 'import@example.com')
+
+    def test_colonnes_requises_manquantes(self):
+        with self.assertRaisesMessage(ValidationError, 'categorie, collaborateur'):
+            list(lire_lignes(self.fichier([], entetes=self.ENTETES[:4]), 'planning.csv'))
+
+    def test_cles_naturelles(self):
+        resultat = self.importer([self.ligne()])
+        self.assertEqual(resultat.nb_crees, 1)
+        lancement = Lancement.objects.get()
+        self.assertEqual(
+            (lancement.affaire, lancement.atelier, lancement.categorie, lancement.collaborateur),
+            (self.affaire, self.atelier, self.tolerie, self.user),
+        )
+
+    def test_cle_naturelle_ambigue(self):
+        # Deux collaborateurs actifs portent le même nom complet
+        Collaborateur.objects.create_user('homonyme@example.com', 'Bernard', 'Anne', 'secret')
+        resultat = self.importer([self.ligne(collaborateur='Bernard Anne')])
+        self.assertEqual(resultat.nb_crees, 0)
+        self.assertIn('ambigu', ' '.join(resultat.erreurs[0][1]))
+
+    def test_categorie_non_associee_a_l_affaire(self):
+        AffaireCategorie.objects.create(affaire=self.affaire, categorie=self.tolerie)
+        resultat = self.importer([self.ligne(), self.ligne(categorie='Peinture')])
+        self.assertEqual(resultat.nb_crees, 1)
+        self.assertEqual(resultat.erreurs[0][0], 3)
+        self.assertIn("n'est pas associée", ' '.join(resultat.erreurs[0][1]))
+
+    def test_un_insert_et_une_activite_par_lot(self):
+        # Le nombre de requêtes d'un lot ne dépend pas de son nombre de lignes
+        CompteurLancement.allouer()  # ligne du mois déjà créée pour les deux mesures
+        with CaptureQueriesContext(connection) as deux_lignes:
+            self.importer([self.ligne()] * 2, chunk_size=10)
+        with CaptureQueriesContext(connection) as quatre_lignes:
+            resultat = self.importer([self.ligne()] * 4, chunk_size=10)
+        self.assertEqual(len(quatre_lignes), len(deux_lignes))
+        self.assertEqual(resultat.nb_lots, 1)
+
+        Activite.objects.all().delete()
+        with CaptureQueriesContext(connection) as requetes:
+            resultat = self.importer([self.ligne()] * 5, chunk_size=2)
+        inserts = [q for q in requetes.captured_queries if q['sql'].startswith('INSERT INTO "lancement"')]
+        self.assertEqual((resultat.nb_lots, resultat.nb_crees, len(inserts)), (3, 5, 3))
+        self.assertEqual(Activite.objects.filter(action='import', module='lancements').count(), 3)
+
+    def test_rapport_d_erreurs(self):
+        resultat = self.importer([self.ligne(), self.ligne(atelier='Atelier inconnu')])
+        self.assertEqual((resultat.nb_crees, resultat.nb_erreurs), (1, 1))
+        self.assertTrue(resultat.rapport.startswith(f'rapport_import_{self.user.pk}_'))
+
+        chemin = get_rapport_path(resultat.rapport, self.user)
+        with open(chemin, encoding='utf-8-sig', newline='') as rapport:
+            lignes = list(csv.reader(rapport, delimiter=';'))
+        self.assertEqual(lignes[0][:2], ['Ligne', 'Erreurs'])
+        self.assertEqual(lignes[1][0], '3')
+        self.assertIn('Atelier inconnu', lignes[1])
+
+        # Le rapport n'est servi qu'à son auteur
+        autre = Collaborateur.objects.create_user('autre@example.com', 'Petit', 'Marc', 'secret')
+        self.assertIsNone(get_rapport_path(resultat.rapport, autre))
+
+    def test_commande_dry_run(self):
+        chemin = os.path.join(self.dossier, 'planning.csv')
+        with open(chemin, 'wb') as fichier:
+            fichier.write(self.fichier([self.ligne(), self.ligne(categorie='Inconnue')]).getvalue())
+        sortie = io.StringIO()
+        call_command('import_lancements', chemin, '--dry-run', stdout=sortie)
+        self.assertIn('1 ligne(s) valide(s) sur 2 (simulation)', sortie.getvalue())
+        self.assertIn('1 ligne(s) rejetée(s)', sortie.getvalue())
+        self.assertFalse(Lancement.objects.exists())
+        self.assertFalse(CompteurLancement.objects.exists())
@@ -15,6 +15,8 @@ urlpatterns = [
     path('planning/', views.lancement_planning, name='planning'),
     path('statistics/', views.lancement_statistics, name='statistics'),
     path('export/', views.lancement_export, name='export'),
+    path('import/', views.lancement_import, name='import'),
+    path('import/rapport/<str:nom>/', views.lancement_import_rapport, name='import_rapport'),
     
     # APIs et vues AJAX 
     path('api/data/', views.get_lancements_data, name='api_data'),
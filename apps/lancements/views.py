@@ -1,9 +1,10 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, Http404
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
@@ -13,8 +14,10 @@ import logging
 from django.core.serializers.json import DjangoJSONEncoder
 
 from apps.core.utils.permissions import permission_required
+from apps.core.stats import get_lancement_counters
 from .models import Lancement
-from .forms import LancementForm
+from .forms import LancementForm, LancementImportFileForm
+from .imports import ImportInterrompu, importer_lancements, get_rapport_path
 from apps.ateliers.models import Atelier
 from apps.core.models import Affaire
 from apps.collaborateurs.models import Collaborateur 
@@ -66,21 +69,17 @@ def lancement_list(request):
     if date_from:
         lancements = lancements.filter(date_lancement__gte=date_from)
     
-    # Calcul des statistiques MISE À JOUR avec les nouveaux champs
+    # Calcul des statistiques (une seule requête d'agrégation)
+    counters = get_lancement_counters(lancements)
     stats = {
-        'total_lancements': lancements.count(),
-        'en_cours': lancements.filter(statut='en_cours').count(),
-        'termines': lancements.filter(statut='termine').count(),
-        'assemblage': lancements.filter(type_production='assemblage').count(),
-        'debitage': lancements.filter(type_production='debitage').count(),
+        'total_lancements': counters['total'],
+        'en_cours': counters['en_cours'],
+        'termines': counters['termines'],
+        'assemblage': counters['assemblage'],
+        'debitage': counters['debitage'],
+        'poids_total': counters['poids_total'],
     }
     
-    # Calcul du poids total MISE À JOUR
-    poids_total = 0
-    for lancement in lancements:
-        poids_total += lancement.get_poids_total()
-    stats['poids_total'] = poids_total
-    
     # Pagination
     paginator = Paginator(lancements, 20)  # 20 lancements par page
     page_number = request.GET.get('page')
@@ -457,29 +456,19 @@ def lancement_planning(request):
             date_lancement__range=[month_start, month_end]
         )
         
-        # Statistiques du mois (corrigées)
-        total_month = lancements_month.count()
-        en_cours_month = lancements_month.filter(statut='en_cours').count()
-        termines_month = lancements_month.filter(statut='termine').count()
-        planifies_month = lancements_month.filter(statut='planifie').count()
-        en_attente_month = lancements_month.filter(statut='en_attente').count()
-        assemblage_month = lancements_month.filter(type_production='assemblage').count()
-        debitage_month = lancements_month.filter(type_production='debitage').count()
-        
-        # Calcul du poids total du mois (corrigé avec nouvelle méthode)
-        poids_total_month = 0
-        for lancement in lancements_month:
-            poids_total_month += lancement.get_poids_total()
+        # Statistiques du mois (une seule requête d'agrégation)
+        counters = get_lancement_counters(lancements_month)
+        total_month = counters['total']
         
         stats = {
             'total_month': total_month,
-            'en_cours_month': en_cours_month,
-            'termines_month': termines_month,
-            'planifies_month': planifies_month,
-            'en_attente_month': en_attente_month,
-            'assemblage_month': assemblage_month,
-            'debitage_month': debitage_month,
-            'poids_total_month': round(poids_total_month, 2)
+            'en_cours_month': counters['en_cours'],
+            'termines_month': counters['termines'],
+            'planifies_month': counters['planifies'],
+            'en_attente_month': counters['en_attente'],
+            'assemblage_month': counters['assemblage'],
+            'debitage_month': counters['debitage'],
+            'poids_total_month': round(counters['poids_total'], 2)
         }
         
         logger.info(f"📊 Statistiques mois {month}/{year}: {stats}")
@@ -848,6 +837,79 @@ def lancement_export(request):
         return redirect('lancements:list')
     
 
+@login_required
+@permission_required('lancements', 'create')
+def lancement_import(request):
+    """
+    Vue pour importer des lancements en masse depuis un planning CSV ou XLSX
+    """
+    resultat = None
+    
+    if request.method == 'POST':
+        form = LancementImportFileForm(request.POST, request.FILES)
+        if form.is_valid():
+            fichier = form.cleaned_data['fichier']
+            try:
+                resultat = importer_lancements(
+                    fichier,
+                    fichier.name,
+                    utilisateur=request.user,
+                    request=request,
+                    simulation=form.cleaned_data['simulation']
+                )
+            except ValidationError as e:
+                messages.error(request, f"❌ Import impossible : {' '.join(e.messages)}")
+            except ImportInterrompu as e:
+                # Les lots précédents sont enregistrés : afficher le bilan partiel
+                resultat = e.resultat
+                messages.error(request, f"❌ Import interrompu : {str(e)}")
+                logger.error(f"Import {fichier.name} par {request.user} interrompu: {str(e)}", exc_info=True)
+            except Exception as e:
+                messages.error(request, f"❌ Erreur lors de l'import : {str(e)}")
+                logger.error(f"Erreur import lancements {fichier.name} par {request.user}: {str(e)}", exc_info=True)
+            else:
+                if resultat.simulation:
+                    messages.info(
+                        request,
+                        f"Simulation : {resultat.nb_valides} ligne(s) valide(s) sur {resultat.nb_lignes}."
+                    )
+                elif resultat.nb_crees:
+                    messages.success(
+                        request,
+                        f"✅ {resultat.nb_crees} lancement(s) importé(s) sur {resultat.nb_lignes} ligne(s)."
+                    )
+                if resultat.nb_erreurs:
+                    messages.warning(
+                        request,
+                        f"⚠️ {resultat.nb_erreurs} ligne(s) rejetée(s) : téléchargez le rapport d'erreurs."
+                    )
+                logger.info(
+                    f"Import {fichier.name} par {request.user}: {resultat.nb_crees} créés, "
+                    f"{resultat.nb_erreurs} rejetés (simulation={resultat.simulation})"
+                )
+    else:
+        form = LancementImportFileForm()
+    
+    context = {
+        'form': form,
+        'resultat': resultat,
+        'erreurs_apercu': resultat.erreurs[:50] if resultat else [],
+    }
+    return render(request, 'lancements/import.html', context)
+
+
+@login_required
+@permission_required('lancements', 'create')
+def lancement_import_rapport(request, nom):
+    """
+    Téléchargement du rapport des lignes rejetées par un import (par son auteur uniquement)
+    """
+    chemin = get_rapport_path(nom, request.user)
+    if chemin is None:
+        raise Http404("Rapport introuvable")
+    return FileResponse(open(chemin, 'rb'), as_attachment=True, filename=nom, content_type='text/csv')
+
+
 @login_required
 @require_GET
 def get_categories_by_affaire(request):
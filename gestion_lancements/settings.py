@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
         # Local apps
     'apps.core.apps.CoreConfig',
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,6 +83,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'gestion_lancements.wsgi.application'
+ASGI_APPLICATION = 'gestion_lancements.asgi.application'
 
 
 # Database
@@ -165,14 +168,126 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/auth/login/'
 
 
+# Cache (mémoire locale par défaut, remplaçable par Redis/Memcached).
+# LocMemCache est propre à chaque processus : une invalidation n'atteint pas
+# les autres workers. Avec ce backend, les caches des permissions, de
+# l'utilisateur connecté et des préférences de notification sont versionnés en
+# base (voir apps.core.utils.cache_versions) : un changement est vu par tous
+# les workers après CACHE_VERSION_CHECK_INTERVAL secondes au plus.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gestion-lancements',
+    }
+}
+
+# Délai (en secondes) entre deux relectures des versions d'invalidation des
+# caches locaux : au plus une requête SQL par processus et par délai
+CACHE_VERSION_CHECK_INTERVAL = 5
+
+# Cache des permissions des rôles (alias de CACHES et durée en secondes)
+PERMISSIONS_CACHE_ALIAS = 'default'
+PERMISSIONS_CACHE_TIMEOUT = 3600
+
+# Durée de vie (en secondes) de l'instantané collaborateur/rôle servi par
+# CollaborateurBackend.get_user (0 pour désactiver). Avec LocMemCache, un
+# collaborateur désactivé reste authentifié sur les autres workers pendant
+# CACHE_VERSION_CHECK_INTERVAL secondes au plus
+AUTH_USER_CACHE_TIMEOUT = 300
+
+# Durée de vie (en secondes) des statistiques du dashboard en cache
+DASHBOARD_STATS_CACHE_TIMEOUT = 60
+
+# Instrumentation SQL par requête (QueryBudgetMiddleware, désactivée par défaut)
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=False, cast=bool)
+# Fraction des requêtes enregistrées en base pour la page d'administration
+QUERY_BUDGET_SAMPLE_RATE = 0.01
+# Durée de conservation des ProfilRequete (en jours, voir clean_notifications)
+QUERY_PROFILES_RETENTION_DAYS = 7
+# Nombre maximal de requêtes SQL par vue avant avertissement
+QUERY_BUDGET_DEFAULT = 50
+QUERY_BUDGETS = {
+    'core:home': 30,
+    'lancements:list': 20,
+}
+
+
+# Plafond de notifications par utilisateur : au-delà, les plus anciennes
+# notifications lues sont supprimées (voir enforce_notification_cap)
 MAX_NOTIFICATIONS_PER_USER = 100
 
-# Durée de conservation des notifications (en jours)
+# Diffusion des notifications par rôle via la file TacheNotification, traitée
+# par `manage.py run_notification_worker` : processus OBLIGATOIRE, à lancer en
+# plus des workers web (il produit aussi les résumés). Les tâches survivent
+# aux redémarrages et la requête web ne dépend plus du nombre de destinataires.
+# Le worker n'atteint pas les flux SSE des workers web : ses notifications
+# apparaissent au polling de secours (la version des notifications est en base).
+# False = diffusion au commit dans le processus web (développement uniquement)
+NOTIFICATION_JOBS_ENABLED = config('NOTIFICATION_JOBS_ENABLED', default=True, cast=bool)
+NOTIFICATION_JOBS_MAX_ATTEMPTS = 5
+# Délai (en secondes) après lequel une tâche 'en_cours' est considérée abandonnée
+NOTIFICATION_JOBS_LOCK_TIMEOUT = 300
+
+# Résumés de notifications (PreferenceNotification.frequence_resume), produits
+# par run_notification_worker ou par `manage.py send_notification_digests`
+# (cron, par exemple toutes les 5 minutes). Actif par défaut seulement avec le
+# worker : sinon les notifications mises en attente ne seraient jamais envoyées
+NOTIFICATIONS_DIGEST_ENABLED = config(
+    'NOTIFICATIONS_DIGEST_ENABLED', default=NOTIFICATION_JOBS_ENABLED, cast=bool
+)
+# Types toujours envoyés immédiatement, hors résumé
+NOTIFICATIONS_IMMEDIATE_TYPES = ('warning', 'error')
+NOTIFICATIONS_DIGEST_MAX_LINES = 10
+# Intervalle (en secondes) entre deux passages de run_notification_worker sur les résumés
+NOTIFICATIONS_DIGEST_INTERVAL = 60
+# Durée de vie (en secondes) des préférences de notification en cache
+NOTIFICATIONS_PREFERENCES_CACHE_TIMEOUT = 3600
+
+# Intervalle (en secondes) des messages keepalive du flux SSE des notifications
+NOTIFICATIONS_STREAM_KEEPALIVE = 25
+
+# Durée de conservation des notifications lues (en jours)
 NOTIFICATIONS_RETENTION_DAYS = 30
 
+# Durée de conservation des notifications non lues (en jours)
+NOTIFICATIONS_UNREAD_RETENTION_DAYS = 90
+
+# Écriture du journal d'activités : 'sync', 'buffered' (lot en fin de requête)
+# ou 'thread' (thread d'arrière-plan alimenté par une file bornée)
+ACTIVITY_LOG_MODE = config('ACTIVITY_LOG_MODE', default='buffered')
+ACTIVITY_LOG_BATCH_SIZE = 500
+ACTIVITY_LOG_QUEUE_SIZE = 10000
+ACTIVITY_LOG_FLUSH_INTERVAL = 2.0
+
 # Durée de conservation des activités (en jours)  
 ACTIVITIES_RETENTION_DAYS = 180
 
+# Archivage à froid des activités expirées (voir `manage.py archive_activites`) :
+# si activé, le nettoyage archive les activités avant de les supprimer
+ACTIVITIES_ARCHIVE_ENABLED = config('ACTIVITIES_ARCHIVE_ENABLED', default=False, cast=bool)
+# Archives hors MEDIA_ROOT (non servies statiquement) : consultation uniquement
+# via la vue core:activites_archives
+ACTIVITIES_ARCHIVE_DIR = os.path.join(BASE_DIR, 'private', 'archives', 'activites')
+# 'gzip' ou 'zstd' (paquet zstandard requis)
+ACTIVITIES_ARCHIVE_COMPRESSION = 'gzip'
+
+# Recherche dans les activités et notifications : 'fulltext' (tsvector french + GIN,
+# complété par les sous-chaînes pour les codes comme "LC-2025"),
+# 'trigram' (sous-chaînes seules, index gin_trgm_ops) ou 'icontains'
+SEARCH_MODE = config('SEARCH_MODE', default='fulltext')
+
+# Partitionnement mensuel de la table activite (PostgreSQL) :
+# voir `manage.py manage_activite_partitions --setup`
+ACTIVITE_PARTITIONING = config('ACTIVITE_PARTITIONING', default=False, cast=bool)
+ACTIVITE_PARTITIONS_AHEAD = 3
+
+# Import en masse de lancements (CSV / XLSX, paquet openpyxl requis pour XLSX)
+LANCEMENTS_IMPORT_CHUNK_SIZE = 500
+# Rapports d'erreurs des imports : hors MEDIA_ROOT (non servis statiquement),
+# téléchargeables par leur seul auteur et supprimés après N jours
+LANCEMENTS_IMPORT_DIR = os.path.join(BASE_DIR, 'private', 'imports', 'lancements')
+LANCEMENTS_IMPORT_REPORT_RETENTION_DAYS = 7
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 